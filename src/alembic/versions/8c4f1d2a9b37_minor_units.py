@@ -0,0 +1,248 @@
+"""store amounts in minor units, transaction_id as string
+
+Revision ID: 8c4f1d2a9b37
+Revises: 5116e2de32f2
+Create Date: 2026-10-18 12:00:00.000000
+
+account.balance и payment.payment_amount переводятся из Numeric(12, 2)
+в BigInteger (копейки), payment.transaction_id — из Integer в
+String(64).
+
+Для postgres миграция выполняется без долгих блокировок: новые колонки
+добавляются рядом со старыми, триггер поддерживает их в актуальном
+состоянии для строк, которые пишет работающее приложение, а
+существующие строки переносятся порциями, каждая в своей транзакции.
+Уникальный индекс строится CONCURRENTLY, NOT NULL проверяется через
+CHECK ... NOT VALID. Короткая блокировка таблиц нужна только на замену
+колонок в конце.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c4f1d2a9b37'
+down_revision = '5116e2de32f2'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 10000
+
+MINOR_UNITS_PER_UNIT = 100
+
+TO_MINOR_UNITS = (
+    'CAST(ROUND({source} * %d) AS BIGINT)' % MINOR_UNITS_PER_UNIT
+)
+TO_STRING = 'CAST({source} AS VARCHAR(64))'
+
+# (таблица, старая колонка, новая колонка, выражение для переноса)
+CONVERTED_COLUMNS = (
+    ('account', 'balance', 'balance_minor', TO_MINOR_UNITS),
+    ('payment', 'payment_amount', 'payment_amount_minor', TO_MINOR_UNITS),
+    ('payment', 'transaction_id', 'transaction_ref', TO_STRING),
+)
+
+
+def _is_postgres() -> bool:
+    return op.get_bind().dialect.name == 'postgresql'
+
+
+def _create_sync_triggers():
+    """Триггеры заполняют новые колонки для строк, которые приложение
+    вставляет и обновляет во время переноса."""
+    for table in ('account', 'payment'):
+        assignments = ' '.join(
+            f'NEW.{new_column} := '
+            f'{expression.format(source="NEW." + old_column)};'
+            for table_name, old_column, new_column, expression
+            in CONVERTED_COLUMNS
+            if table_name == table
+        )
+        op.execute(
+            f"""
+            CREATE FUNCTION {table}_minor_units_sync() RETURNS trigger AS $$
+            BEGIN
+                {assignments}
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+            """
+        )
+        op.execute(
+            f'CREATE TRIGGER {table}_minor_units_sync '
+            f'BEFORE INSERT OR UPDATE ON {table} '
+            f'FOR EACH ROW EXECUTE PROCEDURE {table}_minor_units_sync()'
+        )
+
+
+def _drop_sync_triggers():
+    for table in ('account', 'payment'):
+        op.execute(
+            f'DROP TRIGGER IF EXISTS {table}_minor_units_sync ON {table}'
+        )
+        op.execute(f'DROP FUNCTION IF EXISTS {table}_minor_units_sync()')
+
+
+def _backfill(table: str):
+    """Переносит значения порциями по диапазонам id."""
+    bind = op.get_bind()
+    columns = [
+        (new_column, expression.format(source=old_column))
+        for table_name, old_column, new_column, expression
+        in CONVERTED_COLUMNS
+        if table_name == table
+    ]
+    assignments = ', '.join(
+        f'{new_column} = {expression}' for new_column, expression in columns
+    )
+    pending = ' OR '.join(
+        f'{new_column} IS NULL' for new_column, _ in columns
+    )
+
+    max_id = bind.execute(sa.text(f'SELECT MAX(id) FROM {table}')).scalar()
+    for first_id in range(0, (max_id or 0) + 1, BACKFILL_BATCH_SIZE):
+        bind.execute(
+            sa.text(
+                f'UPDATE {table} SET {assignments} '
+                f'WHERE id > :first_id AND id <= :last_id AND ({pending})'
+            ),
+            {
+                'first_id': first_id,
+                'last_id': first_id + BACKFILL_BATCH_SIZE,
+            },
+        )
+
+    # Строки, вставленные после чтения MAX(id).
+    bind.execute(
+        sa.text(f'UPDATE {table} SET {assignments} WHERE {pending}')
+    )
+
+
+def _add_new_columns():
+    op.add_column('account', sa.Column('balance_minor', sa.BigInteger()))
+    op.add_column(
+        'payment', sa.Column('payment_amount_minor', sa.BigInteger())
+    )
+    op.add_column('payment', sa.Column('transaction_ref', sa.String(64)))
+
+
+def _upgrade_postgres():
+    _add_new_columns()
+    _create_sync_triggers()
+
+    with op.get_context().autocommit_block():
+        _backfill('account')
+        _backfill('payment')
+        op.create_index(
+            'ix_payment_transaction_ref',
+            'payment',
+            ['transaction_ref'],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+        for table, _, new_column, _ in CONVERTED_COLUMNS:
+            op.execute(
+                f'ALTER TABLE {table} ADD CONSTRAINT {new_column}_not_null '
+                f'CHECK ({new_column} IS NOT NULL) NOT VALID'
+            )
+            op.execute(
+                f'ALTER TABLE {table} '
+                f'VALIDATE CONSTRAINT {new_column}_not_null'
+            )
+
+    # Замена колонок: короткая транзакция под блокировкой таблиц.
+    op.execute('LOCK TABLE account, payment IN ACCESS EXCLUSIVE MODE')
+    _drop_sync_triggers()
+    op.drop_index('ix_payment_transaction_id', table_name='payment')
+    for table, old_column, new_column, _ in CONVERTED_COLUMNS:
+        op.drop_column(table, old_column)
+        # NOT NULL не сканирует таблицу благодаря проверенному CHECK.
+        op.alter_column(
+            table, new_column, new_column_name=old_column, nullable=False
+        )
+        op.execute(
+            f'ALTER TABLE {table} DROP CONSTRAINT {new_column}_not_null'
+        )
+    op.alter_column('account', 'balance', server_default='0')
+    op.alter_column('payment', 'payment_amount', server_default='0')
+    op.execute(
+        'ALTER INDEX ix_payment_transaction_ref '
+        'RENAME TO ix_payment_transaction_id'
+    )
+
+
+def _upgrade_sqlite():
+    _add_new_columns()
+    _backfill('account')
+    _backfill('payment')
+
+    with op.batch_alter_table('account') as batch_op:
+        batch_op.drop_column('balance')
+        batch_op.alter_column(
+            'balance_minor',
+            new_column_name='balance',
+            nullable=False,
+            server_default='0',
+        )
+    with op.batch_alter_table('payment') as batch_op:
+        batch_op.drop_index('ix_payment_transaction_id')
+        batch_op.drop_column('transaction_id')
+        batch_op.drop_column('payment_amount')
+        batch_op.alter_column(
+            'transaction_ref',
+            new_column_name='transaction_id',
+            existing_type=sa.String(64),
+            nullable=False,
+        )
+        batch_op.alter_column(
+            'payment_amount_minor',
+            new_column_name='payment_amount',
+            nullable=False,
+            server_default='0',
+        )
+    op.create_index(
+        'ix_payment_transaction_id', 'payment', ['transaction_id'], unique=True
+    )
+
+
+def upgrade():
+    if _is_postgres():
+        _upgrade_postgres()
+    else:
+        _upgrade_sqlite()
+
+
+def downgrade():
+    # Обратное преобразование выполняется одной транзакцией. Строковые
+    # transaction_id, не являющиеся числами, перенести нельзя.
+    with op.batch_alter_table('account') as batch_op:
+        batch_op.alter_column(
+            'balance',
+            type_=sa.Numeric(precision=12, scale=2),
+            server_default='0.00',
+            postgresql_using=f'balance::numeric / {MINOR_UNITS_PER_UNIT}',
+        )
+    with op.batch_alter_table('payment') as batch_op:
+        batch_op.alter_column(
+            'payment_amount',
+            type_=sa.Numeric(precision=12, scale=2),
+            server_default='0.00',
+            postgresql_using=(
+                f'payment_amount::numeric / {MINOR_UNITS_PER_UNIT}'
+            ),
+        )
+        batch_op.alter_column(
+            'transaction_id',
+            type_=sa.Integer(),
+            postgresql_using='transaction_id::integer',
+        )
+
+    if not _is_postgres():
+        op.execute(
+            f'UPDATE account SET balance = balance / {MINOR_UNITS_PER_UNIT}.0'
+        )
+        op.execute(
+            'UPDATE payment SET payment_amount = '
+            f'payment_amount / {MINOR_UNITS_PER_UNIT}.0'
+        )
@@ -0,0 +1,49 @@
+"""composite indexes for account and payment listings
+
+Revision ID: b7e3a91c4d20
+Revises: 8c4f1d2a9b37
+Create Date: 2026-10-18 13:00:00.000000
+
+Индексы повторяют форму запросов CRUD:
+- account (user_id, id): список аккаунтов пользователя по курсору;
+- payment (account_id, id): соединение платежей с аккаунтами
+  пользователя и курсор по id;
+- payment (account_id, created_at): выгрузка платежей за период.
+
+На postgres индексы строятся CONCURRENTLY, не блокируя запись.
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e3a91c4d20'
+down_revision = '8c4f1d2a9b37'
+branch_labels = None
+depends_on = None
+
+INDEXES = (
+    ('ix_account_user_id_id', 'account', ['user_id', 'id']),
+    ('ix_payment_account_id_id', 'payment', ['account_id', 'id']),
+    (
+        'ix_payment_account_id_created_at',
+        'payment',
+        ['account_id', 'created_at'],
+    ),
+)
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name, table, columns, postgresql_concurrently=True
+            )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _ in INDEXES:
+            op.drop_index(
+                name, table_name=table, postgresql_concurrently=True
+            )
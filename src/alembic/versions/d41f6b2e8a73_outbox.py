@@ -0,0 +1,65 @@
+"""outbox table for payment events
+
+Revision ID: d41f6b2e8a73
+Revises: b7e3a91c4d20
+Create Date: 2026-10-18 18:00:00.000000
+
+Событие о платеже записывается в outbox в одной транзакции с самим
+платежом, фоновая задача отправляет события и заполняет sent_at.
+Частичный индекс по id покрывает только неотправленные события, поэтому
+выборка очереди не замедляется по мере накопления отправленных.
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41f6b2e8a73'
+down_revision = 'b7e3a91c4d20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'outbox',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column(
+            'created_at',
+            sa.DateTime(),
+            server_default=sa.text('(CURRENT_TIMESTAMP)'),
+            nullable=True,
+            comment='Дата создания',
+        ),
+        sa.Column(
+            'updated_at',
+            sa.DateTime(),
+            server_default=sa.text('(CURRENT_TIMESTAMP)'),
+            nullable=True,
+            comment='Дата обновления',
+        ),
+        sa.Column('event_type', sa.String(length=64), nullable=False),
+        sa.Column('payload', sa.JSON(), nullable=False),
+        sa.Column(
+            'attempts', sa.Integer(), server_default='0', nullable=False
+        ),
+        sa.Column(
+            'sent_at', sa.DateTime(), nullable=True, comment='Дата отправки'
+        ),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_outbox_id'), 'outbox', ['id'], unique=False)
+    op.create_index(
+        'ix_outbox_unsent_id',
+        'outbox',
+        ['id'],
+        postgresql_where=sa.text('sent_at IS NULL'),
+        sqlite_where=sa.text('sent_at IS NULL'),
+    )
+
+
+def downgrade():
+    op.drop_index('ix_outbox_unsent_id', table_name='outbox')
+    op.drop_index(op.f('ix_outbox_id'), table_name='outbox')
+    op.drop_table('outbox')
@@ -1 +1,2 @@
+from .metrics import router as metrics_router  # noqa
 from .user import router as user_router  # noqa
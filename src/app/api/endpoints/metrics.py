@@ -0,0 +1,13 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.core.metrics import REGISTRY
+
+router = APIRouter()
+
+
+@router.get('/metrics', response_class=PlainTextResponse, tags=['metrics'])
+async def get_metrics():
+    return PlainTextResponse(
+        REGISTRY.render(), media_type='text/plain; version=0.0.4'
+    )
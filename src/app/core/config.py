@@ -1,14 +1,25 @@
 # Standart lib imports
+import atexit
 import logging
 import os
+import queue
 import sys
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueListener, RotatingFileHandler
 from pathlib import Path
+from typing import Optional
 
 # Thirdparty imports
 from dotenv import load_dotenv
 from pydantic import BaseSettings
 
+# Projects imports
+from app.core.log import (
+    HOT_PATH_LOGGER,
+    ContextFilter,
+    JsonFormatter,
+    LocalQueueHandler,
+)
+
 load_dotenv()
 
 LOG_DIR = Path('logs')
@@ -28,12 +39,99 @@ class Settings(BaseSettings):
     postgres_password: str = os.getenv('POSTGRES_PASSWORD')
     db_host: str = os.getenv('DB_HOST')
     db_port: str = os.getenv('DB_PORT')
+    # database pool
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = False
+    db_statement_cache_size: int = 100
+    db_pool_warm_up: bool = True
+    # query accounting
+    db_query_stats_enabled: bool = False
+    db_slow_query_ms: float = 100.0
+    db_n_plus_one_threshold: int = 5
+    db_query_budget_strict: bool = False
+    # read replica
+    read_database_url: Optional[str] = None
+    read_your_writes_window: float = 0.0
+    read_your_writes_max_users: int = 100000
     # superuser credentials
     first_superuser_email: str = os.getenv('FIRST_SUPERUSER_EMAIL')
     first_superuser_password: str = os.getenv('FIRST_SUPERUSER_PASSWORD')
     # test user credentials
     test_user_email: str = os.getenv('TEST_USER_EMAIL')
     test_user_password: str = os.getenv('TEST_USER_PASSWORD')
+    # passwords
+    password_bcrypt_rounds: int = 12
+    password_hash_workers: int = 4
+    # user cache
+    user_cache_enabled: bool = False
+    user_cache_ttl: float = 30.0
+    user_cache_max_size: int = 10000
+    # account cache
+    account_cache_enabled: bool = False
+    account_cache_ttl: float = 300.0
+    account_cache_max_size: int = 100000
+    # logging
+    log_level: str = 'INFO'
+    log_format: str = 'text'
+    log_hot_path_level: str = 'INFO'
+    log_hot_path_sample_rate: float = 1.0
+    # profiling
+    profiling_sample_rate: float = 0.0
+    profiling_top_n: int = 30
+    profiling_max_seconds: float = 300.0
+    # pagination
+    page_default_limit: int = 50
+    page_max_limit: int = 500
+    export_chunk_size: int = 1000
+    fast_list_serialization: bool = False
+    # payment
+    payment_batch_max_size: int = 500
+    payment_fast_path: bool = False
+    payment_lanes_enabled: bool = False
+    payment_lanes_count: int = 16
+    payment_lane_queue_size: int = 100
+    payment_group_commit_enabled: bool = False
+    payment_group_commit_window_ms: float = 5.0
+    payment_group_commit_max_size: int = 100
+    # payment lock retry
+    payment_lock_retry_enabled: bool = False
+    payment_lock_timeout_ms: float = 1000.0
+    payment_lock_timeout_min_ms: float = 50.0
+    payment_lock_timeout_max_ms: float = 2000.0
+    payment_lock_retry_base_delay_ms: float = 10.0
+    payment_lock_retry_max_delay_ms: float = 200.0
+    payment_lock_retry_budget_ms: float = 3000.0
+    # payment admission
+    payment_admission_enabled: bool = False
+    payment_admission_max_in_flight: int = 100
+    payment_admission_max_per_account: int = 10
+    payment_admission_queue_size: int = 100
+    payment_admission_queue_timeout: float = 0.5
+    payment_admission_retry_after: int = 1
+    # payment journal
+    payment_journal_enabled: bool = False
+    payment_journal_dir: str = 'journal'
+    payment_journal_segment_size: int = 64 * 1024 * 1024
+    payment_journal_flush_interval_ms: float = 2.0
+    payment_journal_apply_batch_size: int = 100
+    payment_journal_max_attempts: int = 5
+    # outbox
+    outbox_enabled: bool = False
+    outbox_sink: str = 'file'
+    outbox_file_path: str = 'outbox/events.ndjson'
+    outbox_http_url: Optional[str] = None
+    outbox_http_timeout: float = 5.0
+    outbox_batch_size: int = 100
+    outbox_poll_interval: float = 0.5
+    outbox_retention_hours: float = 24.0
+    # idempotency
+    idempotency_enabled: bool = False
+    idempotency_lru_size: int = 100000
+    idempotency_bloom_capacity: int = 1000000
+    idempotency_bloom_error_rate: float = 0.001
 
     class Config:
         env_file: str = '.env'
@@ -52,15 +150,20 @@ class Settings(BaseSettings):
 
 
 def setup_logging():
-    """Настройка логгера."""
+    """Настройка логгера.
 
-    formatter = logging.Formatter(
-        fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S',
-    )
+    Обработчики вывода в консоль и файл работают в фоновом потоке
+    QueueListener: event loop только кладет запись в очередь и не
+    блокируется на вводе-выводе.
+    """
 
-    logger = logging.getLogger()
-    logger.setLevel(logging.INFO)
+    if settings.log_format == 'json':
+        formatter = JsonFormatter(datefmt='%Y-%m-%d %H:%M:%S')
+    else:
+        formatter = logging.Formatter(
+            fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S',
+        )
 
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setFormatter(formatter)
@@ -70,8 +173,19 @@ def setup_logging():
     )
     file_handler.setFormatter(formatter)
 
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
+    log_queue = queue.SimpleQueue()
+    queue_handler = LocalQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+
+    listener = QueueListener(log_queue, console_handler, file_handler)
+    listener.start()
+    atexit.register(listener.stop)
+
+    logger = logging.getLogger()
+    logger.setLevel(settings.log_level)
+    logger.addHandler(queue_handler)
+
+    logging.getLogger(HOT_PATH_LOGGER).setLevel(settings.log_hot_path_level)
 
     return logger
 
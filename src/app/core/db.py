@@ -1,12 +1,23 @@
-from sqlalchemy import Column, DateTime, Integer, func
+import time
+from typing import Optional
+
+from sqlalchemy import Column, DateTime, Integer, event, func
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import (
+    SessionTransaction,
     declarative_base,
     declared_attr,
     sessionmaker,
 )
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
+from app.core.cache import LRUCache
 from app.core.config import settings
+from app.core.metrics import gauge
+from app.core.query_stats import (
+    before_cursor_execute,
+    make_after_cursor_execute,
+)
 
 
 class PreBase:
@@ -29,15 +40,234 @@ class PreBase:
     )
 
 
+class PoolCheckoutStats:
+    """Статистика ожидания выдачи соединения из пула."""
+
+    def __init__(self):
+        self.count = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def observe(self, wait: float):
+        self.count += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    @property
+    def avg_wait(self) -> float:
+        return self.total_wait / self.count if self.count else 0.0
+
+
+pool_checkout_stats = PoolCheckoutStats()
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """Пул соединений, измеряющий время ожидания выдачи соединения."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_checkout_stats.observe(time.perf_counter() - started)
+
+
+def get_engine_options(
+    database_url: str, pool_class: type = TimedAsyncQueuePool
+) -> dict:
+    """Параметры пула соединений и кеша prepared statements.
+
+    Для sqlite SQLAlchemy использует пул без ограничения размера,
+    поэтому параметры пула применяются только к postgres.
+    """
+    if database_url.startswith('sqlite'):
+        return {}
+
+    return {
+        'poolclass': pool_class,
+        'pool_size': settings.db_pool_size,
+        'max_overflow': settings.db_max_overflow,
+        'pool_timeout': settings.db_pool_timeout,
+        'pool_recycle': settings.db_pool_recycle,
+        'pool_pre_ping': settings.db_pool_pre_ping,
+        'connect_args': {
+            'prepared_statement_cache_size': (
+                settings.db_statement_cache_size
+            ),
+        },
+    }
+
+
 Base = declarative_base(cls=PreBase)
-engine = create_async_engine(settings.async_database_url)
+engine = create_async_engine(
+    settings.async_database_url,
+    **get_engine_options(settings.async_database_url),
+)
 
 AsyncSessionLocal = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
 
+if settings.read_database_url:
+    # Пул реплики не учитывается в pool_checkout_stats: статистика
+    # ожидания соединения относится к основной БД.
+    read_engine = create_async_engine(
+        settings.read_database_url,
+        **get_engine_options(
+            settings.read_database_url, pool_class=AsyncAdaptedQueuePool
+        ),
+    )
+    ReadSessionLocal = sessionmaker(
+        read_engine, class_=AsyncSession, expire_on_commit=False
+    )
+else:
+    read_engine = engine
+    ReadSessionLocal = AsyncSessionLocal
+
+# Учет SQL-запросов по HTTP-запросам: число, время, медленные запросы.
+query_stats_enabled = bool(
+    settings.db_query_stats_enabled or settings.debug_mode
+)
+
+
+def install_query_stats(async_engine):
+    """Подключает учет SQL-запросов к событиям движка."""
+    sync_engine = async_engine.sync_engine
+    event.listen(sync_engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(
+        sync_engine,
+        'after_cursor_execute',
+        make_after_cursor_execute(settings.db_slow_query_ms / 1000),
+    )
+
+
+if query_stats_enabled:
+    install_query_stats(engine)
+    if read_engine is not engine:
+        install_query_stats(read_engine)
+
+
+class RecentWriters:
+    """Пользователи, недавно проводившие платежи.
+
+    Реплика отстает от основной БД, поэтому в течение window секунд
+    после своего платежа пользователь читает с основной БД и видит
+    собственные изменения. Учет ведется в памяти процесса.
+    """
+
+    def __init__(self, window: float, max_size: int):
+        self._users = LRUCache(max_size=max_size, ttl=window)
+
+    def mark(self, user_id: int):
+        self._users.set(user_id, True)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._users
+
+
+recent_writers: Optional[RecentWriters] = (
+    RecentWriters(
+        window=settings.read_your_writes_window,
+        max_size=settings.read_your_writes_max_users,
+    )
+    if read_engine is not engine and settings.read_your_writes_window > 0
+    else None
+)
+
+
+def mark_user_write(user_id: int):
+    """Отмечает запись пользователя для чтения своих изменений."""
+    if recent_writers is not None:
+        recent_writers.mark(user_id)
+
+
+def get_read_session_factory(
+    user_id: Optional[int] = None,
+) -> sessionmaker:
+    """Фабрика сессий для чтения: реплика, если пользователь user_id
+    не проводил платежей в последние read_your_writes_window секунд."""
+    if (
+        user_id is not None
+        and recent_writers is not None
+        and user_id in recent_writers
+    ):
+        return AsyncSessionLocal
+    return ReadSessionLocal
+
+
+def get_pool_stats() -> dict:
+    """Текущее состояние пула соединений и время ожидания выдачи."""
+    pool = engine.sync_engine.pool
+    stats = {
+        'pool_class': type(pool).__name__,
+        'checkouts': pool_checkout_stats.count,
+        'avg_checkout_wait': pool_checkout_stats.avg_wait,
+        'max_checkout_wait': pool_checkout_stats.max_wait,
+    }
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+        )
+
+    return stats
+
+
+def _collect_pool_stats():
+    stats = get_pool_stats()
+    return [
+        ((key,), stats.get(key))
+        for key in (
+            'size',
+            'checked_in',
+            'checked_out',
+            'overflow',
+            'checkouts',
+            'avg_checkout_wait',
+            'max_checkout_wait',
+        )
+    ]
+
+
+gauge(
+    'db_pool',
+    'Состояние пула соединений и время ожидания выдачи соединения',
+    callback=_collect_pool_stats,
+    labelnames=('stat',),
+)
+
+
+def get_current_transaction(
+    session: AsyncSession,
+) -> Optional[SessionTransaction]:
+    """Самая внутренняя транзакция сессии: savepoint или корневая."""
+    sync_session = session.sync_session
+    return (
+        sync_session.get_nested_transaction()
+        or sync_session.get_transaction()
+    )
+
+
+def is_within_transaction(
+    transaction: Optional[SessionTransaction], outer: SessionTransaction
+) -> bool:
+    """transaction совпадает с outer или вложена в нее."""
+    while transaction is not None:
+        if transaction is outer:
+            return True
+        transaction = transaction.parent
+    return False
+
 
 async def get_async_session():
     """Генерирует асинхронную сессию для работы с БД."""
     async with AsyncSessionLocal() as async_session:
         yield async_session
+
+
+async def get_read_session():
+    """Генерирует сессию только для чтения, по возможности с реплики."""
+    async with ReadSessionLocal() as async_session:
+        yield async_session
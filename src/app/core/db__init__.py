@@ -1,18 +1,33 @@
+import asyncio
 import contextlib
+import logging
 
 from fastapi_users.exceptions import UserAlreadyExists
 from pydantic import EmailStr
+from sqlalchemy import and_, select, text
 
 from app.core.config import settings
-from app.core.db import get_async_session
+from app.core.db import engine, get_async_session
 from app.core.user import get_user_db, get_user_manager
-from app.services.payment.config import Account
+from app.services.payment.config import Account, Payment
 from app.schemas.user import UserCreate
 
 get_async_session_context = contextlib.asynccontextmanager(get_async_session)
 get_user_db_context = contextlib.asynccontextmanager(get_user_db)
 get_user_manager_context = contextlib.asynccontextmanager(get_user_manager)
 
+logger = logging.getLogger(__name__)
+
+# Запросы платежного пути в том же виде, в каком их строят AccountCRUD и
+# PaymentService: их подготовка на каждом соединении пула заполняет кеш
+# prepared statements asyncpg и кеш компиляции SQLAlchemy.
+WARM_UP_STATEMENTS = (
+    text('SELECT 1'),
+    select(Account).where(and_(Account.user_id == 0, Account.id == 0)),
+    select(Payment).where(Payment.transaction_id == '0'),
+    select(Account).where(Account.id == 0).with_for_update(of=Account),
+)
+
 
 async def create_user(
     email: EmailStr,
@@ -52,3 +67,19 @@ async def create_first_superuser():
             password=settings.first_superuser_password,
             is_superuser=True,
         )
+
+
+async def warm_up_db_pool():
+    """Открывает минимальное число соединений пула и готовит на них
+    горячие запросы платежного пути."""
+    pool = engine.sync_engine.pool
+    size = pool.size() if hasattr(pool, 'size') else 1
+
+    async def prime_connection():
+        async with engine.connect() as connection:
+            for stmt in WARM_UP_STATEMENTS:
+                await connection.execute(stmt)
+
+    logger.info('Прогрев пула соединений: %s', size)
+    await asyncio.gather(*(prime_connection() for _ in range(size)))
+    logger.info('Пул соединений прогрет')
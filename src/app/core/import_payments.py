@@ -0,0 +1,430 @@
+"""Массовый импорт подписанных платежей из NDJSON-файла.
+
+Файл читается порциями строк. Разбор и проверка подписи выполняются в
+пуле процессов по тому же алгоритму, что и в PaymentService, а запись
+в БД идет по порядку: одна транзакция на порцию, в которой платежи
+вставляются пачкой (COPY во временную таблицу на postgres, executemany
+на sqlite), а балансы аккаунтов обновляются один раз на сумму платежей
+аккаунта в порции.
+
+После каждой порции в файл контрольной точки записывается смещение в
+исходном файле, поэтому прерванный импорт продолжается с места
+остановки. Повторная обработка порции безопасна: уже загруженные
+transaction_id пропускаются и не меняют баланс.
+
+С OUTBOX_ENABLED для каждого нового платежа в той же транзакции
+записывается событие payment.completed, как и при обработке платежа
+через API.
+
+Пример запуска из папки `src`:
+
+    python -m app.core.import_payments payments.ndjson --workers 8
+"""
+# Standart lib imports
+import argparse
+import asyncio
+import hmac
+import json
+import logging
+import os
+import sys
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+# Thirdparty imports
+from pydantic import ValidationError
+from sqlalchemy import bindparam, insert, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Projects imports
+from app.core.config import settings
+from app.core.db import AsyncSessionLocal
+from app.core.money import to_minor_units
+from app.services.payment.config import Account, Outbox, Payment
+from app.services.payment.crud import AccountCRUD
+from app.services.payment.outbox import payment_completed_event
+from app.services.payment.schemas import PaymentSchema
+from app.services.payment.utils import generate_signature
+
+logger = logging.getLogger(__name__)
+
+STAGING_TABLE = 'payment_import_staging'
+STAGING_COLUMNS = ('transaction_id', 'account_id', 'payment_amount')
+
+# (transaction_id, user_id, account_id, сумма в минорных единицах)
+ParsedPayment = Tuple[str, int, int, int]
+# (transaction_id, account_id, сумма в минорных единицах)
+PaymentRow = Tuple[str, int, int]
+
+
+@dataclass
+class ImportStats:
+    lines: int = 0
+    malformed: int = 0
+    invalid_signature: int = 0
+    duplicates: int = 0
+    unknown_account: int = 0
+    imported: int = 0
+
+
+def verify_lines(
+    lines: List[bytes], secret_key: str
+) -> Tuple[List[ParsedPayment], int, int]:
+    """Разбирает строки NDJSON и проверяет подписи платежей.
+
+    Выполняется в дочернем процессе. Платеж разбирается PaymentSchema,
+    как в эндпоинте, поэтому подпись считается по тем же значениям.
+    Возвращает валидные платежи, число неразобранных строк и число
+    платежей с неверной подписью.
+    """
+    payments = []
+    malformed = invalid_signature = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            payment = PaymentSchema(**json.loads(line)).dict()
+        except (ValueError, TypeError, ValidationError):
+            malformed += 1
+            continue
+
+        expected = generate_signature(payment, secret_key)
+        if not hmac.compare_digest(expected, payment['signature']):
+            invalid_signature += 1
+            continue
+
+        payments.append(
+            (
+                payment['transaction_id'],
+                payment['user_id'],
+                payment['account_id'],
+                to_minor_units(payment['amount']),
+            )
+        )
+
+    return payments, malformed, invalid_signature
+
+
+def iter_chunks(
+    file: BinaryIO, chunk_size: int
+) -> Iterator[Tuple[List[bytes], int]]:
+    """Отдает порции строк и смещение в файле после каждой порции."""
+    while True:
+        lines = []
+        for _ in range(chunk_size):
+            line = file.readline()
+            if not line:
+                break
+            lines.append(line)
+        if not lines:
+            return
+        yield lines, file.tell()
+
+
+class Checkpoint:
+    """Контрольная точка импорта: смещение в файле и статистика."""
+
+    def __init__(self, path: str, source: str):
+        self.path = path
+        self.source = os.path.abspath(source)
+
+    def load(self) -> Tuple[int, ImportStats]:
+        if not os.path.exists(self.path):
+            return 0, ImportStats()
+
+        with open(self.path, encoding='utf-8') as file:
+            data = json.load(file)
+        if data['source'] != self.source:
+            raise SystemExit(
+                f'Контрольная точка {self.path} относится к файлу '
+                f'{data["source"]}'
+            )
+        return data['offset'], ImportStats(**data['stats'])
+
+    def save(self, offset: int, stats: ImportStats):
+        # Запись через временный файл, чтобы прерывание не оставило
+        # контрольную точку поврежденной.
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(
+                {
+                    'source': self.source,
+                    'offset': offset,
+                    'stats': asdict(stats),
+                },
+                file,
+            )
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class PaymentImporter:
+    """Записывает проверенные платежи в БД порциями."""
+
+    def __init__(self, outbox: bool = False):
+        self.account_crud = AccountCRUD(Account)
+        self.outbox = outbox
+
+    async def _insert_postgres(
+        self, session: AsyncSession, rows: List[PaymentRow]
+    ) -> List[PaymentRow]:
+        await session.execute(
+            text(
+                f'CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} ('
+                'transaction_id VARCHAR(64), '
+                'account_id INTEGER, '
+                'payment_amount BIGINT'
+                ') ON COMMIT DELETE ROWS'
+            )
+        )
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            STAGING_TABLE, records=rows, columns=STAGING_COLUMNS
+        )
+
+        columns = ', '.join(STAGING_COLUMNS)
+        result = await session.execute(
+            text(
+                f'INSERT INTO payment ({columns}) '
+                f'SELECT {columns} FROM {STAGING_TABLE} '
+                'ON CONFLICT (transaction_id) DO NOTHING '
+                f'RETURNING {columns}'
+            )
+        )
+        return result.all()
+
+    async def _insert_sqlite(
+        self, session: AsyncSession, rows: List[PaymentRow]
+    ) -> List[PaymentRow]:
+        existing = await session.execute(
+            select(Payment.transaction_id).where(
+                Payment.transaction_id.in_([row[0] for row in rows])
+            )
+        )
+        existing = set(existing.scalars().all())
+        rows = [row for row in rows if row[0] not in existing]
+        if rows:
+            await session.execute(
+                insert(Payment),
+                [dict(zip(STAGING_COLUMNS, row)) for row in rows],
+            )
+        return rows
+
+    async def _apply_deltas(
+        self, session: AsyncSession, inserted: List[PaymentRow]
+    ) -> Dict[int, int]:
+        deltas: Dict[int, int] = defaultdict(int)
+        for _, account_id, amount in inserted:
+            deltas[account_id] += amount
+
+        # Аккаунты обновляются по возрастанию id, как и в пакетной
+        # обработке, чтобы не попадать в deadlock с рабочим трафиком.
+        await session.execute(
+            update(Account.__table__)
+            .where(Account.__table__.c.id == bindparam('account_id'))
+            .values(balance=Account.__table__.c.balance + bindparam('delta')),
+            [
+                {'account_id': account_id, 'delta': deltas[account_id]}
+                for account_id in sorted(deltas)
+            ],
+        )
+        return deltas
+
+    async def _write_outbox(
+        self,
+        session: AsyncSession,
+        inserted: List[PaymentRow],
+        deltas: Dict[int, int],
+    ):
+        """Записывает события о новых платежах порции.
+
+        Балансы читаются после обновления в той же транзакции, а
+        new_balance каждого платежа считается от баланса до порции в
+        порядке платежей аккаунта в порции.
+        """
+        result = await session.execute(
+            select(Account.id, Account.balance).where(
+                Account.id.in_(list(deltas))
+            )
+        )
+        balances = {
+            account_id: balance - deltas[account_id]
+            for account_id, balance in result.all()
+        }
+
+        events = []
+        for transaction_id, account_id, amount in inserted:
+            balances[account_id] += amount
+            events.append(
+                payment_completed_event(
+                    transaction_id=transaction_id,
+                    account_id=account_id,
+                    amount=amount,
+                    new_balance=balances[account_id],
+                )
+            )
+        await session.execute(insert(Outbox), events)
+
+    async def import_chunk(
+        self, payments: List[ParsedPayment]
+    ) -> Tuple[int, int]:
+        """Записывает порцию платежей.
+
+        Возвращает число новых платежей и число платежей, чей account_id
+        принадлежит другому пользователю.
+        """
+        unique = {}
+        for payment in payments:
+            unique.setdefault(payment[0], payment)
+        if not unique:
+            return 0, 0
+
+        async with AsyncSessionLocal() as session:
+            accounts = await self.account_crud.get_or_create_accounts(
+                session=session,
+                pairs=(
+                    (user_id, account_id)
+                    for _, user_id, account_id, _ in unique.values()
+                ),
+            )
+            rows = [
+                (
+                    transaction_id,
+                    accounts[(user_id, account_id)].id,
+                    amount,
+                )
+                for transaction_id, user_id, account_id, amount
+                in unique.values()
+                if (user_id, account_id) in accounts
+            ]
+            unknown_account = len(unique) - len(rows)
+            if not rows:
+                return 0, unknown_account
+
+            if session.bind.dialect.name == 'postgresql':
+                inserted = await self._insert_postgres(session, rows)
+            else:
+                inserted = await self._insert_sqlite(session, rows)
+            if inserted:
+                deltas = await self._apply_deltas(session, inserted)
+                if self.outbox:
+                    await self._write_outbox(session, inserted, deltas)
+            await session.commit()
+
+        return len(inserted), unknown_account
+
+
+def log_progress(stats: ImportStats, started: float, lines_at_start: int):
+    elapsed = time.monotonic() - started
+    rate = (stats.lines - lines_at_start) / elapsed if elapsed else 0.0
+    logger.info(
+        'Строк: %s, загружено: %s, дубликатов: %s, неверных подписей: %s, '
+        'чужих аккаунтов: %s, ошибок разбора: %s, %.0f строк/с',
+        stats.lines,
+        stats.imported,
+        stats.duplicates,
+        stats.invalid_signature,
+        stats.unknown_account,
+        stats.malformed,
+        rate,
+    )
+
+
+async def import_payments(args: argparse.Namespace) -> ImportStats:
+    checkpoint = Checkpoint(
+        args.checkpoint or args.source + '.checkpoint', args.source
+    )
+    if args.restart:
+        checkpoint.remove()
+    offset, stats = checkpoint.load()
+    if offset:
+        logger.info('Продолжение импорта со смещения %s', offset)
+
+    importer = PaymentImporter(outbox=settings.outbox_enabled)
+    loop = asyncio.get_running_loop()
+    started = last_report = time.monotonic()
+    lines_at_start = stats.lines
+
+    async def apply(future, lines_count: int, end_offset: int):
+        payments, malformed, invalid_signature = await future
+        imported, unknown_account = await importer.import_chunk(payments)
+
+        stats.lines += lines_count
+        stats.malformed += malformed
+        stats.invalid_signature += invalid_signature
+        stats.imported += imported
+        stats.unknown_account += unknown_account
+        stats.duplicates += len(payments) - imported - unknown_account
+        checkpoint.save(end_offset, stats)
+
+    with open(args.source, 'rb') as file, ProcessPoolExecutor(
+        max_workers=args.workers
+    ) as executor:
+        file.seek(offset)
+        # Проверка подписей идет впереди записи в БД не больше чем на
+        # две порции на процесс, чтобы не держать файл в памяти.
+        pending = deque()
+        for lines, end_offset in iter_chunks(file, args.chunk_size):
+            future = loop.run_in_executor(
+                executor, verify_lines, lines, args.secret_key
+            )
+            pending.append((future, len(lines), end_offset))
+            if len(pending) >= args.workers * 2:
+                await apply(*pending.popleft())
+
+            if time.monotonic() - last_report >= args.report_interval:
+                log_progress(stats, started, lines_at_start)
+                last_report = time.monotonic()
+
+        while pending:
+            await apply(*pending.popleft())
+
+    log_progress(stats, started, lines_at_start)
+    logger.info(
+        'Импорт завершен за %.1f с', time.monotonic() - started
+    )
+    return stats
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description='Массовый импорт подписанных платежей из NDJSON'
+    )
+    parser.add_argument('source', help='NDJSON-файл с платежами')
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        '--checkpoint',
+        help='файл контрольной точки, по умолчанию <source>.checkpoint',
+    )
+    parser.add_argument(
+        '--restart',
+        action='store_true',
+        help='начать импорт заново, игнорируя контрольную точку',
+    )
+    parser.add_argument('--secret-key', default=settings.secret_key)
+    parser.add_argument('--report-interval', type=float, default=5.0)
+    parser.add_argument('--log-level', default='INFO')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    logging.basicConfig(
+        level=args.log_level.upper(),
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    )
+    asyncio.run(import_payments(args))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
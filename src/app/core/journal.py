@@ -0,0 +1,345 @@
+# Standart lib imports
+import asyncio
+import json
+import logging
+import mmap
+import os
+import struct
+import zlib
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Заголовок записи: длина данных и их CRC32.
+RECORD_HEADER = struct.Struct('<II')
+SEGMENT_SUFFIX = '.seg'
+CHECKPOINT_FILE = 'checkpoint.json'
+
+# (номер сегмента, смещение в сегменте)
+Position = Tuple[int, int]
+
+
+def _read_record(buffer, offset: int) -> Optional[Tuple[bytes, int]]:
+    """Читает запись по смещению и возвращает данные и смещение следующей.
+
+    Возвращает None в конце сегмента: на нулевом заголовке, на записи,
+    выходящей за границу сегмента, и на записи с неверной CRC, то есть
+    на хвосте, не дописанном до сбоя.
+    """
+    data_offset = offset + RECORD_HEADER.size
+    if data_offset > len(buffer):
+        return None
+
+    length, crc = RECORD_HEADER.unpack_from(buffer, offset)
+    end = data_offset + length
+    if length == 0 or end > len(buffer):
+        return None
+
+    payload = bytes(buffer[data_offset:end])
+    if zlib.crc32(payload) != crc:
+        return None
+    return payload, end
+
+
+def _fsync_directory(path: str):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class WriteAheadJournal:
+    """Журнал предзаписи из сегментов фиксированного размера.
+
+    Сегменты — файлы, отображенные в память; записи добавляются в конец
+    текущего сегмента. append() ждет, пока запись попадет на диск:
+    фоновая задача раз в flush_interval секунд сбрасывает накопленные
+    записи одним msync, поэтому стоимость синхронизации делится между
+    всеми записями пачки. Читатель получает только записи, уже
+    сохраненные на диск, и фиксирует прочитанную позицию через
+    commit(); сегменты до нее удаляются.
+
+    После open() весь файловый ввод-вывод (msync, создание сегментов,
+    чтение, контрольная точка, удаление сегментов) выполняется в пуле
+    потоков, чтобы медленный диск не задерживал event loop.
+    """
+
+    def __init__(
+        self, directory: str, segment_size: int, flush_interval: float
+    ):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.flush_interval = flush_interval
+        self._segment = 0
+        self._offset = 0
+        self._mmap: Optional[mmap.mmap] = None
+        self._sealed: List[mmap.mmap] = []
+        self._waiters: List[asyncio.Future] = []
+        self._durable: Position = (0, 0)
+        self._checkpoint: Position = (0, 0)
+        self._pending: Optional[asyncio.Event] = None
+        self._flushed: Optional[asyncio.Event] = None
+        self._rotate_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def checkpoint(self) -> Position:
+        return self._checkpoint
+
+    @property
+    def durable_position(self) -> Position:
+        return self._durable
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(
+            self.directory, f'{segment:020d}{SEGMENT_SUFFIX}'
+        )
+
+    def _list_segments(self) -> List[int]:
+        return sorted(
+            int(name[: -len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def _map_segment(self, segment: int) -> mmap.mmap:
+        path = self._segment_path(segment)
+        is_new = not os.path.exists(path)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if is_new:
+                os.ftruncate(fd, self.segment_size)
+            return mmap.mmap(fd, os.fstat(fd).st_size)
+        finally:
+            os.close(fd)
+            if is_new:
+                _fsync_directory(self.directory)
+
+    def _load_checkpoint(self) -> Optional[Position]:
+        path = os.path.join(self.directory, CHECKPOINT_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as file:
+            data = json.load(file)
+        return data['segment'], data['offset']
+
+    def _save_checkpoint(self, position: Position):
+        path = os.path.join(self.directory, CHECKPOINT_FILE)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump({'segment': position[0], 'offset': position[1]}, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+        _fsync_directory(self.directory)
+
+    def open(self):
+        """Открывает журнал и восстанавливает его состояние после сбоя.
+
+        Конец журнала ищется проходом по записям последнего сегмента;
+        неполная запись на хвосте затирается нулями. Все записи,
+        оказавшиеся на диске, считаются сохраненными и будут заново
+        отданы читателю начиная с контрольной точки.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        segments = self._list_segments() or [1]
+        self._segment = segments[-1]
+        self._mmap = self._map_segment(self._segment)
+
+        offset = 0
+        records = 0
+        while True:
+            record = _read_record(self._mmap, offset)
+            if record is None:
+                break
+            offset = record[1]
+            records += 1
+
+        tail = self._mmap[offset:offset + RECORD_HEADER.size]
+        if tail.strip(b'\0'):
+            logger.warning(
+                'Неполная запись в конце сегмента %s журнала затерта',
+                self._segment,
+            )
+            self._mmap[offset:] = bytes(len(self._mmap) - offset)
+            self._mmap.flush()
+
+        self._offset = offset
+        self._durable = (self._segment, offset)
+        self._checkpoint = max(
+            self._load_checkpoint() or (0, 0), (segments[0], 0)
+        )
+        logger.info(
+            'Журнал %s открыт: сегментов %s, записей в последнем %s, '
+            'контрольная точка %s',
+            self.directory,
+            len(segments),
+            records,
+            self._checkpoint,
+        )
+
+    def start(self):
+        """Запускает фоновую синхронизацию журнала с диском."""
+        if self._task is not None:
+            return
+
+        self._pending = asyncio.Event()
+        self._flushed = asyncio.Event()
+        self._rotate_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Сбрасывает накопленные записи на диск и закрывает журнал."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        if self._mmap is not None:
+            await self._flush()
+            self._mmap.close()
+            self._mmap = None
+
+    async def _rotate(self, size: int):
+        """Открывает следующий сегмент, если запись size не помещается
+        в текущий.
+
+        Пока новый сегмент создается в пуле потоков, другие записи,
+        которые еще помещаются, продолжают дописываться в текущий.
+        """
+        async with self._rotate_lock:
+            if self._offset + size <= len(self._mmap):
+                return
+            segment = self._segment + 1
+            mapped = await asyncio.get_running_loop().run_in_executor(
+                None, self._map_segment, segment
+            )
+            self._sealed.append(self._mmap)
+            self._segment = segment
+            self._mmap = mapped
+            self._offset = 0
+        logger.info('Открыт сегмент журнала %s', segment)
+
+    async def append(self, payload: bytes):
+        """Добавляет запись и ждет ее сохранения на диск."""
+        size = RECORD_HEADER.size + len(payload)
+        if not payload or size > self.segment_size:
+            raise ValueError(f'Недопустимый размер записи журнала: {size}')
+        while self._offset + size > len(self._mmap):
+            await self._rotate(size)
+
+        start = self._offset
+        self._mmap[start + RECORD_HEADER.size:start + size] = payload
+        RECORD_HEADER.pack_into(
+            self._mmap, start, len(payload), zlib.crc32(payload)
+        )
+        self._offset += size
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self._pending.set()
+        await future
+
+    @staticmethod
+    def _sync(sealed: Tuple[mmap.mmap, ...], current: mmap.mmap):
+        for segment in sealed:
+            segment.flush()
+            segment.close()
+        current.flush()
+
+    async def _flush(self):
+        waiters, self._waiters = self._waiters, []
+        # _sync получает неизменяемую копию: _rotate() может дописать
+        # в self._sealed, пока идет синхронизация.
+        sealed = tuple(self._sealed)
+        self._sealed.clear()
+        position = (self._segment, self._offset)
+
+        try:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self._sync, sealed, self._mmap
+            )
+        except Exception as e:
+            logger.exception('Ошибка синхронизации журнала с диском')
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_exception(e)
+            return
+
+        self._durable = position
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        if self._flushed is not None:
+            self._flushed.set()
+
+    async def _flush_loop(self):
+        while True:
+            await self._pending.wait()
+            self._pending.clear()
+            # Пауза собирает в одну синхронизацию записи, пришедшие
+            # следом за первой.
+            await asyncio.sleep(self.flush_interval)
+            await self._flush()
+
+    async def read(
+        self, position: Position, limit: int
+    ) -> Tuple[List[Tuple[bytes, Position]], Position]:
+        """Читает до limit сохраненных записей начиная с position.
+
+        Возвращает записи вместе с позицией после каждой из них и
+        позицию, с которой продолжать чтение.
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self._read, position, limit, self._durable
+        )
+
+    def _read(
+        self, position: Position, limit: int, durable: Position
+    ) -> Tuple[List[Tuple[bytes, Position]], Position]:
+        records = []
+        segment, offset = position
+
+        while len(records) < limit and (segment, offset) < durable:
+            with open(self._segment_path(segment), 'rb') as file:
+                buffer = mmap.mmap(
+                    file.fileno(), 0, access=mmap.ACCESS_READ
+                )
+            try:
+                while len(records) < limit:
+                    if (segment, offset) >= durable:
+                        break
+                    record = _read_record(buffer, offset)
+                    if record is None:
+                        break
+                    offset = record[1]
+                    records.append((record[0], (segment, offset)))
+            finally:
+                buffer.close()
+
+            if len(records) >= limit or segment >= durable[0]:
+                break
+            segment, offset = segment + 1, 0
+
+        return records, (segment, offset)
+
+    async def wait_for_records(self, position: Position):
+        """Ждет появления сохраненных записей после position."""
+        while self._durable <= position:
+            self._flushed.clear()
+            await self._flushed.wait()
+
+    async def commit(self, position: Position):
+        """Фиксирует позицию читателя и удаляет прочитанные сегменты."""
+        await asyncio.get_running_loop().run_in_executor(
+            None, self._commit, position
+        )
+        self._checkpoint = position
+
+    def _commit(self, position: Position):
+        self._save_checkpoint(position)
+        for segment in self._list_segments():
+            if segment >= position[0]:
+                break
+            os.remove(self._segment_path(segment))
@@ -0,0 +1,127 @@
+# Standart lib imports
+import json
+import logging
+import random
+import uuid
+from contextvars import ContextVar
+from logging.handlers import QueueHandler
+from typing import Optional
+
+CONTEXT_FIELDS = ('request_id', 'account_id', 'transaction_id')
+HOT_PATH_LOGGER = 'app.services.payment'
+REQUEST_ID_HEADER = 'x-request-id'
+
+_context_vars = {
+    field: ContextVar(field, default=None) for field in CONTEXT_FIELDS
+}
+_sampled_var: ContextVar[bool] = ContextVar('log_sampled', default=True)
+
+
+def bind_log_context(**values):
+    """Привязывает идентификаторы к логам текущей задачи asyncio."""
+    for field, value in values.items():
+        _context_vars[field].set(value)
+
+
+def get_log_context() -> dict:
+    return {field: var.get() for field, var in _context_vars.items()}
+
+
+class ContextFilter(logging.Filter):
+    """Добавляет в запись идентификаторы запроса, аккаунта и транзакции.
+
+    INFO-записи платежного пути пропускаются только для запросов,
+    попавших в выборку: решение принимается один раз на запрос, поэтому
+    в лог попадает либо вся цепочка шагов, либо ничего.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if (
+            record.levelno <= logging.INFO
+            and not _sampled_var.get()
+            and record.name.startswith(HOT_PATH_LOGGER)
+        ):
+            return False
+
+        for field, var in _context_vars.items():
+            setattr(record, field, var.get())
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Форматирует запись в одну строку JSON."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'time': self.formatTime(record, self.datefmt),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                payload[field] = value
+        if record.exc_text:
+            payload['exc_info'] = record.exc_text
+
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class LocalQueueHandler(QueueHandler):
+    """QueueHandler для очереди внутри процесса.
+
+    В отличие от базового класса не форматирует запись целиком в потоке
+    event loop: подставляются только аргументы сообщения, а итоговое
+    форматирование выполняет фоновый QueueListener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info
+            )
+            record.exc_info = None
+        return record
+
+
+class RequestContextMiddleware:
+    """ASGI-middleware, назначающее запросу request_id.
+
+    request_id берется из заголовка X-Request-ID или генерируется и
+    возвращается в ответе. Здесь же принимается решение о том, попадет
+    ли запрос в выборку логов платежного пути.
+    """
+
+    def __init__(self, app, sample_rate: float = 1.0):
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        request_id = self._get_request_id(scope) or uuid.uuid4().hex
+        bind_log_context(request_id=request_id)
+        _sampled_var.set(
+            self.sample_rate >= 1.0 or random.random() < self.sample_rate
+        )
+
+        async def send_with_request_id(message):
+            if message['type'] == 'http.response.start':
+                message.setdefault('headers', [])
+                message['headers'] = list(message['headers']) + [
+                    (REQUEST_ID_HEADER.encode(), request_id.encode())
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_request_id)
+
+    @staticmethod
+    def _get_request_id(scope) -> Optional[str]:
+        for name, value in scope.get('headers', ()):
+            if name == REQUEST_ID_HEADER.encode():
+                return value.decode('latin-1')[:64]
+        return None
@@ -0,0 +1,243 @@
+"""Легковесные метрики в текстовом формате Prometheus.
+
+Значения хранятся в обычных словарях процесса без блокировок: все
+изменения происходят в event loop, а стоимость одного наблюдения —
+поиск в словаре и bisect по границам бакетов.
+"""
+# Standart lib imports
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Sequence) -> str:
+    if not labelnames:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace('\\', '\\\\').replace('"', '\\"'),
+        )
+        for name, value in zip(labelnames, labelvalues)
+    )
+    return '{' + pairs + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class _Metric(ABC):
+
+    metric_type: str = ''
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _header(self) -> List[str]:
+        return [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.metric_type}',
+        ]
+
+    @abstractmethod
+    def collect(self) -> List[str]:
+        """Строки метрики в текстовом формате Prometheus."""
+
+
+class _LabeledMetric(_Metric):
+    """Метрика, значения которой накапливаются по наборам меток."""
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._children: Dict[tuple, object] = {}
+
+    @abstractmethod
+    def _new_child(self):
+        """Новое значение метрики для одного набора меток."""
+
+    def labels(self, *labelvalues):
+        """Возвращает (и кеширует) метрику для набора значений меток."""
+        child = self._children.get(labelvalues)
+        if child is None:
+            if len(labelvalues) != len(self.labelnames):
+                raise ValueError(
+                    f'{self.name}: ожидались метки {self.labelnames}'
+                )
+            child = self._children[labelvalues] = self._new_child()
+        return child
+
+
+class _CounterChild:
+
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class Counter(_LabeledMetric):
+
+    metric_type = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def collect(self) -> List[str]:
+        lines = self._header()
+        for labelvalues, child in self._children.items():
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f'{self.name}{labels} {_format_value(child.value)}')
+        return lines
+
+
+class _HistogramChild:
+
+    __slots__ = ('buckets', 'counts', 'sum')
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+
+class Histogram(_LabeledMetric):
+
+    metric_type = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def collect(self) -> List[str]:
+        lines = self._header()
+        bucket_labelnames = self.labelnames + ('le',)
+        for labelvalues, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(
+                self.buckets + (float('inf'),), child.counts
+            ):
+                cumulative += count
+                labels = _format_labels(
+                    bucket_labelnames, labelvalues + (_format_value(bound),)
+                )
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f'{self.name}_sum{labels} {_format_value(child.sum)}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Gauge(_Metric):
+    """Метрика, значения которой вычисляются в момент сбора.
+
+    callback возвращает пары (значения меток, значение).
+    """
+
+    metric_type = 'gauge'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        callback: Callable[[], Iterable[Tuple[tuple, float]]],
+        labelnames: Sequence[str] = (),
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def collect(self) -> List[str]:
+        lines = self._header()
+        for labelvalues, value in self.callback():
+            if value is None:
+                continue
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f'{self.name}{labels} {_format_value(value)}')
+        return lines
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f'Метрика {metric.name} уже зарегистрирована')
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames=()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def histogram(
+    name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS
+) -> Histogram:
+    return REGISTRY.register(
+        Histogram(name, documentation, labelnames, buckets)
+    )
+
+
+def gauge(
+    name: str, documentation: str, callback, labelnames=()
+) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, callback, labelnames))
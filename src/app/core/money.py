@@ -0,0 +1,50 @@
+"""Денежные суммы в целых минорных единицах (копейках).
+
+Балансы и суммы платежей хранятся и складываются как int, а в Decimal
+переводятся только на границе API: при разборе запроса и в схемах
+ответов.
+"""
+# Standart lib imports
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Union
+
+MINOR_UNITS_SCALE: int = 2
+MINOR_UNITS_PER_UNIT: int = 10 ** MINOR_UNITS_SCALE
+
+
+def to_minor_units(amount: Union[Decimal, str, int]) -> int:
+    """Переводит сумму в минорные единицы с округлением до копейки."""
+    return int(
+        Decimal(amount)
+        .scaleb(MINOR_UNITS_SCALE)
+        .to_integral_value(rounding=ROUND_HALF_UP)
+    )
+
+
+def from_minor_units(value: int) -> Decimal:
+    """Переводит минорные единицы в Decimal с двумя знаками."""
+    return Decimal(value).scaleb(-MINOR_UNITS_SCALE)
+
+
+class MoneyAmount(Decimal):
+    """Сумма в схемах ответа.
+
+    Целые значения считаются минорными единицами из БД и переводятся в
+    Decimal, остальные значения разбираются как обычный Decimal.
+    """
+
+    @classmethod
+    def __get_validators__(cls):
+        yield cls.validate
+
+    @classmethod
+    def __modify_schema__(cls, field_schema: dict):
+        field_schema.update(type='number')
+
+    @classmethod
+    def validate(cls, value) -> Decimal:
+        if isinstance(value, int) and not isinstance(value, bool):
+            return from_minor_units(value)
+        if isinstance(value, Decimal):
+            return value
+        return Decimal(str(value))
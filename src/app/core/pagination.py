@@ -0,0 +1,69 @@
+# Standart lib imports
+import base64
+import binascii
+from typing import Optional
+
+# Thirdparty imports
+from fastapi import HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Select
+
+# Projects imports
+from app.core.config import settings
+
+
+def encode_cursor(last_id: int) -> str:
+    """Кодирует id последней записи страницы в непрозрачный курсор."""
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[int]:
+    """Декодирует курсор в id, после которого начинается страница."""
+    if cursor is None:
+        return None
+
+    try:
+        return int(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='Invalid cursor',
+        )
+
+
+class CursorParams:
+    """Параметры keyset-пагинации из query-строки запроса."""
+
+    def __init__(
+        self,
+        limit: int = Query(
+            settings.page_default_limit, ge=1, le=settings.page_max_limit
+        ),
+        cursor: Optional[str] = Query(None),
+    ):
+        self.limit = limit
+        self.after_id = decode_cursor(cursor)
+
+
+async def paginate(
+    session: AsyncSession, stmt: Select, id_column, params: CursorParams
+) -> dict:
+    """Выполняет запрос постранично по возрастанию id.
+
+    Вместо OFFSET используется условие id > курсора, поэтому стоимость
+    запроса не зависит от того, насколько далеко от начала списка
+    находится страница.
+    """
+    if params.after_id is not None:
+        stmt = stmt.where(id_column > params.after_id)
+    stmt = stmt.order_by(id_column).limit(params.limit + 1)
+
+    result = await session.execute(stmt)
+    rows = result.all()
+
+    next_cursor = None
+    if len(rows) > params.limit:
+        rows = rows[:params.limit]
+        next_cursor = encode_cursor(rows[-1].id)
+
+    return {'items': rows, 'next_cursor': next_cursor}
@@ -0,0 +1,50 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from fastapi_users.password import PasswordHelper
+from passlib.context import CryptContext
+
+from app.core.config import settings
+
+
+class AsyncPasswordHelper(PasswordHelper):
+    """Хеширование паролей bcrypt в отдельном пуле потоков.
+
+    bcrypt отпускает GIL на время вычисления хеша, поэтому выполнение в
+    потоках не блокирует event loop, а размер пула ограничивает число
+    одновременно вычисляемых хешей.
+    """
+
+    def __init__(self, rounds: int, max_workers: int):
+        super().__init__(
+            CryptContext(
+                schemes=['bcrypt'],
+                deprecated='auto',
+                bcrypt__rounds=rounds,
+            )
+        )
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='password'
+        )
+
+    async def hash_async(self, password: str) -> str:
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, self.hash, password
+        )
+
+    async def verify_and_update_async(
+        self, plain_password: str, hashed_password: str
+    ) -> Tuple[bool, Optional[str]]:
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor,
+            self.verify_and_update,
+            plain_password,
+            hashed_password,
+        )
+
+
+password_helper = AsyncPasswordHelper(
+    rounds=settings.password_bcrypt_rounds,
+    max_workers=settings.password_hash_workers,
+)
@@ -0,0 +1,175 @@
+# Standart lib imports
+import cProfile
+import io
+import logging
+import marshal
+import pstats
+import random
+import time
+from typing import Dict, List, Optional
+
+# Projects imports
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SORT_KEYS = ('cumulative', 'tottime', 'ncalls')
+
+
+class RequestProfiler:
+    """Профилировщик HTTP-запросов на cProfile.
+
+    Запрос профилируется, если попал в выборку с долей sample_rate или
+    пришел во время окна, открытого start(seconds). cProfile работает
+    на весь поток, поэтому используется один общий профилировщик: он
+    включен, пока обрабатывается хотя бы один выбранный запрос, и
+    накапливает статистику event loop за это время, включая другие
+    корутины, выполнявшиеся параллельно. Синхронные эндпоинты в пуле
+    потоков в статистику не попадают.
+    """
+
+    def __init__(self, sample_rate: float):
+        self.sample_rate = sample_rate
+        self._window_ends_at: Optional[float] = None
+        self._profile = cProfile.Profile()
+        self._active_requests = 0
+        self._started_at = time.time()
+        self._requests: Dict[str, List[float]] = {}
+
+    @property
+    def window_remaining(self) -> float:
+        if self._window_ends_at is None:
+            return 0.0
+        return max(0.0, self._window_ends_at - time.monotonic())
+
+    @property
+    def is_enabled(self) -> bool:
+        """Включен ли профилировщик в принципе: выборка или окно."""
+        return self.sample_rate > 0 or self._window_ends_at is not None
+
+    def should_profile(self) -> bool:
+        if self._window_ends_at is not None:
+            if time.monotonic() < self._window_ends_at:
+                return True
+            logger.info('Окно профилирования закрыто')
+            self._window_ends_at = None
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self, seconds: float, reset: bool = True):
+        """Профилирует все запросы в течение seconds секунд."""
+        if reset:
+            self.reset()
+        self._window_ends_at = time.monotonic() + seconds
+        logger.info('Профилирование всех запросов на %s с', seconds)
+
+    def stop(self):
+        self._window_ends_at = None
+
+    def reset(self):
+        """Сбрасывает накопленную статистику."""
+        if self._active_requests:
+            self._profile.disable()
+        self._profile = cProfile.Profile()
+        if self._active_requests:
+            self._profile.enable()
+        self._started_at = time.time()
+        self._requests = {}
+
+    def begin_request(self):
+        self._active_requests += 1
+        if self._active_requests == 1:
+            self._profile.enable()
+
+    def end_request(self, path: str, duration: float):
+        self._active_requests -= 1
+        if self._active_requests == 0:
+            self._profile.disable()
+        timings = self._requests.setdefault(path, [0, 0.0, 0.0])
+        timings[0] += 1
+        timings[1] += duration
+        timings[2] = max(timings[2], duration)
+
+    def _snapshot(self) -> pstats.Stats:
+        # create_stats() выключает профилировщик, поэтому для запросов,
+        # которые еще обрабатываются, он включается снова.
+        self._profile.create_stats()
+        if self._active_requests:
+            self._profile.enable()
+        return pstats.Stats(self._profile, stream=io.StringIO())
+
+    def dump(self) -> bytes:
+        """Статистика в формате файла pstats (как cProfile -o)."""
+        if not self._requests:
+            return marshal.dumps({})
+        return marshal.dumps(self._snapshot().stats)
+
+    def summary(self, top: int, sort: str) -> dict:
+        """Сводка: время запросов по путям и top функций по sort."""
+        functions = []
+        if self._requests:
+            stats = self._snapshot()
+            stats.sort_stats(sort)
+            for func in stats.fcn_list[:top]:
+                calls, ncalls, tottime, cumtime, _ = stats.stats[func]
+                filename, line, name = func
+                functions.append(
+                    {
+                        'function': f'{filename}:{line}({name})',
+                        'ncalls': ncalls,
+                        'primitive_calls': calls,
+                        'tottime': tottime,
+                        'cumtime': cumtime,
+                    }
+                )
+
+        return {
+            'sample_rate': self.sample_rate,
+            'window_remaining': self.window_remaining,
+            'collecting_since': self._started_at,
+            'requests': [
+                {
+                    'path': path,
+                    'count': count,
+                    'total_time': total,
+                    'max_time': max_time,
+                }
+                for path, (count, total, max_time) in sorted(
+                    self._requests.items(),
+                    key=lambda item: item[1][1],
+                    reverse=True,
+                )
+            ],
+            'functions': functions,
+        }
+
+
+class ProfilingMiddleware:
+    """ASGI-middleware, профилирующее выбранные запросы.
+
+    Пока выборка и окно профилирования выключены, запрос проходит без
+    дополнительных действий.
+    """
+
+    def __init__(self, app, profiler: RequestProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope['type'] != 'http'
+            or not self.profiler.is_enabled
+            or not self.profiler.should_profile()
+        ):
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        self.profiler.begin_request()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.profiler.end_request(
+                scope['path'], time.perf_counter() - started
+            )
+
+
+request_profiler = RequestProfiler(sample_rate=settings.profiling_sample_rate)
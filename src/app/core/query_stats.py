@@ -0,0 +1,230 @@
+# Standart lib imports
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+# Projects imports
+from app.core.metrics import counter, histogram
+
+logger = logging.getLogger(__name__)
+
+QUERY_COUNT_HEADER = 'x-db-query-count'
+QUERY_TIME_HEADER = 'x-db-query-time-ms'
+# Сколько символов SQL попадает в лог медленных запросов и N+1.
+LOG_STATEMENT_MAX_LENGTH = 500
+QUERIES_PER_REQUEST_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 500)
+
+DB_QUERIES_PER_REQUEST = histogram(
+    'db_queries_per_request',
+    'Число SQL-запросов за один HTTP-запрос',
+    buckets=QUERIES_PER_REQUEST_BUCKETS,
+)
+DB_SLOW_QUERIES = counter(
+    'db_slow_queries_total', 'SQL-запросы дольше порога медленного запроса'
+)
+DB_N_PLUS_ONE = counter(
+    'db_n_plus_one_total', 'HTTP-запросы с подозрением на N+1'
+)
+
+_query_stats_var: ContextVar[Optional['QueryStats']] = ContextVar(
+    'query_stats', default=None
+)
+
+
+class QueryBudgetExceeded(Exception):
+    """Запрос выполнил больше SQL-запросов, чем разрешено бюджетом."""
+
+
+def _shorten(statement: str) -> str:
+    statement = ' '.join(statement.split())
+    if len(statement) > LOG_STATEMENT_MAX_LENGTH:
+        return statement[:LOG_STATEMENT_MAX_LENGTH] + '...'
+    return statement
+
+
+def parameters_shape(parameters, executemany: bool = False) -> str:
+    """Описание параметров запроса без значений: только их типы."""
+    if executemany:
+        if not parameters:
+            return '[]'
+        return f'{len(parameters)} x {parameters_shape(parameters[0])}'
+    if isinstance(parameters, dict):
+        return '{%s}' % ', '.join(
+            f'{key}: {type(value).__name__}'
+            for key, value in parameters.items()
+        )
+    if isinstance(parameters, (list, tuple)):
+        return '(%s)' % ', '.join(
+            type(value).__name__ for value in parameters
+        )
+    return type(parameters).__name__
+
+
+class QueryStats:
+    """SQL-запросы одного HTTP-запроса: число, время в БД и повторы
+    одинаковых шаблонов запросов."""
+
+    def __init__(self, strict_budget: bool = False):
+        self.count = 0
+        self.total_time = 0.0
+        self.statements = Counter()
+        self.budget: Optional[int] = None
+        self.strict_budget = strict_budget
+
+    def before_query(self):
+        self.count += 1
+        if (
+            self.strict_budget
+            and self.budget is not None
+            and self.count > self.budget
+        ):
+            raise QueryBudgetExceeded(
+                f'Бюджет {self.budget} SQL-запросов превышен'
+            )
+
+    def after_query(self, statement: str, duration: float):
+        self.total_time += duration
+        self.statements[statement] += 1
+
+    def repeated_statements(self, threshold: int):
+        return [
+            (statement, count)
+            for statement, count in self.statements.most_common()
+            if count >= threshold
+        ]
+
+
+def get_query_stats() -> Optional[QueryStats]:
+    return _query_stats_var.get()
+
+
+def before_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+):
+    # Время начала хранится в контексте выполнения, а не в conn.info:
+    # для упавшего запроса after_cursor_execute не вызывается, и контекст
+    # уходит вместе с ним.
+    if context is not None:
+        context.query_started = time.perf_counter()
+    stats = _query_stats_var.get()
+    if stats is not None:
+        stats.before_query()
+
+
+def make_after_cursor_execute(slow_query_threshold: float):
+    """Обработчик окончания SQL-запроса: учитывает его в статистике
+    HTTP-запроса и пишет в лог запросы дольше slow_query_threshold."""
+
+    def after_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        started = getattr(context, 'query_started', None)
+        if started is None:
+            return
+        duration = time.perf_counter() - started
+        stats = _query_stats_var.get()
+        if stats is not None:
+            stats.after_query(statement, duration)
+
+        if duration >= slow_query_threshold:
+            DB_SLOW_QUERIES.inc()
+            logger.warning(
+                'Медленный SQL-запрос %.1f мс: %s; параметры: %s',
+                duration * 1000,
+                _shorten(statement),
+                parameters_shape(parameters, executemany),
+            )
+
+    return after_cursor_execute
+
+
+def query_budget(limit: int):
+    """Зависимость эндпоинта: ограничивает число SQL-запросов.
+
+    При превышении в лог пишется предупреждение, а в строгом режиме
+    (DB_QUERY_BUDGET_STRICT, для тестов) запрос, вышедший за бюджет,
+    завершается ошибкой QueryBudgetExceeded.
+    """
+
+    async def set_query_budget():
+        stats = _query_stats_var.get()
+        if stats is not None:
+            stats.budget = limit
+
+    return set_query_budget
+
+
+class QueryStatsMiddleware:
+    """ASGI-middleware, собирающее статистику SQL-запросов запроса.
+
+    С add_headers число запросов и время в БД до начала ответа
+    возвращаются в заголовках X-DB-Query-Count и X-DB-Query-Time-Ms.
+    После ответа в лог попадают шаблоны запросов, выполненные не менее
+    n_plus_one_threshold раз (вероятный N+1), и превышение бюджета.
+    """
+
+    def __init__(
+        self,
+        app,
+        add_headers: bool,
+        n_plus_one_threshold: int,
+        strict_budget: bool,
+    ):
+        self.app = app
+        self.add_headers = add_headers
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.strict_budget = strict_budget
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        stats = QueryStats(strict_budget=self.strict_budget)
+        token = _query_stats_var.set(stats)
+
+        async def send_with_query_stats(message):
+            if message['type'] == 'http.response.start':
+                message['headers'] = list(message.get('headers', ())) + [
+                    (QUERY_COUNT_HEADER.encode(), str(stats.count).encode()),
+                    (
+                        QUERY_TIME_HEADER.encode(),
+                        f'{stats.total_time * 1000:.2f}'.encode(),
+                    ),
+                ]
+            await send(message)
+
+        try:
+            await self.app(
+                scope,
+                receive,
+                send_with_query_stats if self.add_headers else send,
+            )
+        finally:
+            _query_stats_var.reset(token)
+            self._report(scope, stats)
+
+    def _report(self, scope, stats: QueryStats):
+        DB_QUERIES_PER_REQUEST.observe(stats.count)
+        if stats.budget is not None and stats.count > stats.budget:
+            logger.warning(
+                'Бюджет SQL-запросов превышен: %s %s, запросов %s '
+                'при бюджете %s',
+                scope['method'],
+                scope['path'],
+                stats.count,
+                stats.budget,
+            )
+
+        repeated = stats.repeated_statements(self.n_plus_one_threshold)
+        if repeated:
+            DB_N_PLUS_ONE.inc()
+        for statement, count in repeated:
+            logger.warning(
+                'Возможен N+1: %s %s выполнил %s раз запрос %s',
+                scope['method'],
+                scope['path'],
+                count,
+                _shorten(statement),
+            )
@@ -1,17 +1,28 @@
-from typing import Optional, Union
+from typing import Any, Dict, Optional, Union
 
+import jwt
 from fastapi import Depends, Request
+from fastapi.security import OAuth2PasswordRequestForm
 from fastapi_users import (
-    BaseUserManager, FastAPIUsers, IntegerIDMixin, InvalidPasswordException
+    BaseUserManager,
+    FastAPIUsers,
+    IntegerIDMixin,
+    InvalidPasswordException,
+    exceptions,
+    schemas,
 )
 from fastapi_users.authentication import (
     AuthenticationBackend, BearerTransport, JWTStrategy
 )
+from fastapi_users.jwt import decode_jwt
 from fastapi_users_db_sqlalchemy import SQLAlchemyUserDatabase
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 
+from app.core.cache import LRUCache
 from app.core.config import settings
-from app.core.db import get_async_session
+from app.core.db import get_async_session, get_read_session_factory
+from app.core.password import AsyncPasswordHelper, password_helper
 from app.models.user import User
 from app.schemas.user import UserCreate
 
@@ -23,7 +34,102 @@ async def get_user_db(session: AsyncSession = Depends(get_async_session)):
 bearer_transport = BearerTransport(tokenUrl='api/auth/jwt/login')
 
 
+class UserCache:
+    """TTL-кеш пользователей, найденных по JWT.
+
+    Хранит значения колонок, а не сам ORM-объект: на каждое попадание
+    собирается отдельный detached-экземпляр, поэтому параллельные
+    запросы не делят один объект между сессиями. Инвалидация локальна
+    для процесса, в остальных воркерах запись устаревает по ttl.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self._users = LRUCache(max_size=max_size, ttl=ttl)
+        self._columns = [column.key for column in User.__table__.columns]
+        self.version = 0
+
+    def get(self, user_id: int) -> Optional[User]:
+        values = self._users.get(user_id)
+        if values is None:
+            return None
+        user = User(**values)
+        make_transient_to_detached(user)
+        return user
+
+    def set(self, user: User, version: int):
+        # Пока пользователь читался из БД, его могли изменить и
+        # инвалидировать кеш: такую запись сохранять нельзя.
+        if version != self.version:
+            return
+        self._users.set(
+            user.id, {key: getattr(user, key) for key in self._columns}
+        )
+
+    def invalidate(self, user_id: int):
+        self.version += 1
+        self._users.pop(user_id)
+
+
+class CachedJWTStrategy(JWTStrategy):
+    """JWT-стратегия, которая берет пользователя из UserCache.
+
+    Подпись и срок действия токена проверяются на каждый запрос, из
+    кеша берется только строка пользователя.
+    """
+
+    def __init__(self, user_cache: UserCache, **kwargs):
+        super().__init__(**kwargs)
+        self.user_cache = user_cache
+
+    async def read_token(
+        self, token: Optional[str], user_manager: BaseUserManager
+    ) -> Optional[User]:
+        if token is None:
+            return None
+
+        try:
+            data = decode_jwt(
+                token,
+                self.decode_key,
+                self.token_audience,
+                algorithms=[self.algorithm],
+            )
+            user_id = data.get('user_id')
+            if user_id is None:
+                return None
+            parsed_id = user_manager.parse_id(user_id)
+        except (jwt.PyJWTError, exceptions.InvalidID):
+            return None
+
+        user = self.user_cache.get(parsed_id)
+        if user is not None:
+            return user
+
+        version = self.user_cache.version
+        try:
+            user = await user_manager.get(parsed_id)
+        except exceptions.UserNotExists:
+            return None
+        self.user_cache.set(user, version)
+        return user
+
+
+user_cache: Optional[UserCache] = (
+    UserCache(
+        max_size=settings.user_cache_max_size, ttl=settings.user_cache_ttl
+    )
+    if settings.user_cache_enabled
+    else None
+)
+
+
 def get_jwt_strategy() -> JWTStrategy:
+    if user_cache is not None:
+        return CachedJWTStrategy(
+            user_cache,
+            secret=settings.secret_key,
+            lifetime_seconds=3600,
+        )
     return JWTStrategy(secret=settings.secret_key, lifetime_seconds=3600)
 
 
@@ -35,6 +141,89 @@ auth_backend = AuthenticationBackend(
 
 
 class UserManager(IntegerIDMixin, BaseUserManager[User, int]):
+    """Менеджер пользователей.
+
+    create, authenticate и смена пароля переопределены так, чтобы
+    bcrypt выполнялся в пуле потоков AsyncPasswordHelper, а не в event
+    loop. _update и delete сбрасывают пользователя в UserCache.
+    """
+
+    password_helper: AsyncPasswordHelper
+
+    async def create(
+        self,
+        user_create: schemas.UC,
+        safe: bool = False,
+        request: Optional[Request] = None,
+    ) -> User:
+        await self.validate_password(user_create.password, user_create)
+
+        existing_user = await self.user_db.get_by_email(user_create.email)
+        if existing_user is not None:
+            raise exceptions.UserAlreadyExists()
+
+        user_dict = (
+            user_create.create_update_dict()
+            if safe
+            else user_create.create_update_dict_superuser()
+        )
+        password = user_dict.pop('password')
+        user_dict['hashed_password'] = (
+            await self.password_helper.hash_async(password)
+        )
+
+        created_user = await self.user_db.create(user_dict)
+        await self.on_after_register(created_user, request)
+
+        return created_user
+
+    async def authenticate(
+        self, credentials: OAuth2PasswordRequestForm
+    ) -> Optional[User]:
+        try:
+            user = await self.get_by_email(credentials.username)
+        except exceptions.UserNotExists:
+            # Хеш все равно вычисляется, чтобы время ответа не выдавало
+            # существование пользователя.
+            await self.password_helper.hash_async(credentials.password)
+            return None
+
+        verified, updated_password_hash = (
+            await self.password_helper.verify_and_update_async(
+                credentials.password, user.hashed_password
+            )
+        )
+        if not verified:
+            return None
+        if updated_password_hash is not None:
+            await self.user_db.update(
+                user, {'hashed_password': updated_password_hash}
+            )
+            self._invalidate_cached_user(user)
+
+        return user
+
+    async def _update(self, user: User, update_dict: Dict[str, Any]) -> User:
+        if 'password' in update_dict:
+            update_dict = dict(update_dict)
+            password = update_dict.pop('password')
+            await self.validate_password(password, user)
+            update_dict['hashed_password'] = (
+                await self.password_helper.hash_async(password)
+            )
+
+        updated_user = await super()._update(user, update_dict)
+        self._invalidate_cached_user(updated_user)
+        return updated_user
+
+    async def delete(self, user: User) -> None:
+        await super().delete(user)
+        self._invalidate_cached_user(user)
+
+    @staticmethod
+    def _invalidate_cached_user(user: User):
+        if user_cache is not None:
+            user_cache.invalidate(user.id)
 
     async def validate_password(
         self,
@@ -57,7 +246,7 @@ class UserManager(IntegerIDMixin, BaseUserManager[User, int]):
 
 
 async def get_user_manager(user_db=Depends(get_user_db)):
-    yield UserManager(user_db)
+    yield UserManager(user_db, password_helper)
 
 
 fastapi_users = FastAPIUsers[User, int](
@@ -67,3 +256,13 @@ fastapi_users = FastAPIUsers[User, int](
 
 current_user = fastapi_users.current_user(active=True)
 current_superuser = fastapi_users.current_user(active=True, superuser=True)
+
+
+async def get_user_read_session(user: User = Depends(current_user)):
+    """Сессия для чтения данных текущего пользователя.
+
+    Сразу после собственного платежа пользователь читает с основной
+    БД, иначе — с реплики (см. app.core.db.recent_writers).
+    """
+    async with get_read_session_factory(user.id)() as async_session:
+        yield async_session
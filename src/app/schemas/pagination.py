@@ -0,0 +1,12 @@
+from typing import Generic, List, Optional, TypeVar
+
+from pydantic.generics import GenericModel
+
+ItemT = TypeVar('ItemT')
+
+
+class CursorPage(GenericModel, Generic[ItemT]):
+    """Страница списка с курсором на следующую страницу."""
+
+    items: List[ItemT]
+    next_cursor: Optional[str]
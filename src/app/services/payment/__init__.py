@@ -1,3 +1,3 @@
 from .admin_endpoints import router as admin_router  # noqa
 from .endpoints import router as payment_router  # noqa
-from .config import Account, Payment  # noqa
+from .config import Account, Outbox, Payment  # noqa
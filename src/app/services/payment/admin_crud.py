@@ -1,6 +1,5 @@
 # Standart lib imports
 import logging
-from typing import List
 
 # Thirdparty imports
 from fastapi import Depends, status
@@ -11,6 +10,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from app.models import User
 
 # Projects imports
+from app.core.pagination import CursorParams, paginate
 from app.core.user import get_user_manager, UserManager
 from app.schemas.user import UserCreate, UserRead
 from app.services.payment.config import Account
@@ -30,7 +30,7 @@ class AdminCRUD:
         logger.info('ADMIN! Создание пользователя')
         try:
             user = await self.user_manager.create(user_data)
-            logger.info(f'ADMIN! Пользователь {user.email} успешно создан')
+            logger.info('ADMIN! Пользователь %s успешно создан', user.email)
 
             return user
 
@@ -41,23 +41,45 @@ class AdminCRUD:
                 status_code=status.HTTP_400_BAD_REQUEST,
             )
 
-    async def get_user_list(self, session: AsyncSession) -> List:
+    async def get_user_list(
+        self, session: AsyncSession, params: CursorParams
+    ) -> dict:
         logger.info('ADMIN! Получение списка пользователей')
-        result = await session.execute(select(User))
+        page = await paginate(
+            session=session,
+            stmt=select(
+                User.id,
+                User.email,
+                User.is_active,
+                User.is_superuser,
+                User.is_verified,
+            ),
+            id_column=User.id,
+            params=params,
+        )
 
         logger.info('ADMIN! Список получен')
-        return result.scalars().all()
+        return page
 
     async def get_user_accounts(
-        self, session: AsyncSession, user_id: int
-    ) -> List:
+        self, session: AsyncSession, user_id: int, params: CursorParams
+    ) -> dict:
         logger.info('ADMIN! Получение списка аккаунтов')
-        result = await session.execute(
-            select(Account).where(Account.user_id == user_id)
+        page = await paginate(
+            session=session,
+            stmt=select(
+                Account.id,
+                Account.user_id,
+                Account.balance,
+                Account.created_at,
+                Account.updated_at,
+            ).where(Account.user_id == user_id),
+            id_column=Account.id,
+            params=params,
         )
 
         logger.info('ADMIN! Список получен')
-        return result.scalars().all()
+        return page
 
 
 async def get_admin_crud(user_manager=Depends(get_user_manager)) -> AdminCRUD:
@@ -1,13 +1,30 @@
 import logging
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import Response
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.db import get_async_session
+from app.core.config import settings
+from app.core.db import get_pool_stats, get_read_session
+from app.core.pagination import CursorParams
+from app.core.profiling import PROFILE_SORT_KEYS, request_profiler
+from app.core.query_stats import query_budget
+from app.core.serialization import serialize_page
 from app.core.user import current_superuser
+from app.schemas.pagination import CursorPage
 from app.schemas.user import UserCreate, UserRead
 from app.services.payment.admin_crud import AdminCRUD, get_admin_crud
-from app.services.payment.schemas import ReturnAccountSchema
+from app.services.payment.admission import admission_controller
+from app.services.payment.lanes import lane_scheduler
+from app.services.payment.schemas import (
+    DatabasePoolStats,
+    PaymentAdmissionLimits,
+    PaymentAdmissionStats,
+    PaymentLaneStats,
+    ProfileStart,
+    ProfileSummary,
+    ReturnAccountSchema,
+)
 
 router = APIRouter(prefix='/admin')
 
@@ -29,28 +46,139 @@ async def create_user(
 
 @router.get(
     '/users',
-    dependencies=(Depends(current_superuser),),
-    response_model=list[UserRead],
+    dependencies=(Depends(current_superuser), Depends(query_budget(3))),
+    response_model=CursorPage[UserRead],
 )
 async def get_user_list(
-    session: AsyncSession = Depends(get_async_session),
+    params: CursorParams = Depends(),
+    session: AsyncSession = Depends(get_read_session),
     admin_crud: AdminCRUD = Depends(get_admin_crud),
 ):
     logger.info('ADMIN! Запрос на получение списка пользователей принят')
-    return await admin_crud.get_user_list(session)
+    page = await admin_crud.get_user_list(session=session, params=params)
+    return serialize_page(page, UserRead)
 
 
 @router.get(
     '/users/{user_id}/accounts',
-    dependencies=(Depends(current_superuser),),
-    response_model=list[ReturnAccountSchema],
+    dependencies=(Depends(current_superuser), Depends(query_budget(3))),
+    response_model=CursorPage[ReturnAccountSchema],
 )
-async def get_user_list(
+async def get_user_accounts(
     user_id: int,
-    session: AsyncSession = Depends(get_async_session),
+    params: CursorParams = Depends(),
+    session: AsyncSession = Depends(get_read_session),
     admin_crud: AdminCRUD = Depends(get_admin_crud),
 ):
     logger.info(
         'ADMIN! Запрос на получение списка аккаунтов пользователя принят'
     )
-    return await admin_crud.get_user_accounts(session=session, user_id=user_id)
+    page = await admin_crud.get_user_accounts(
+        session=session, user_id=user_id, params=params
+    )
+    return serialize_page(page, ReturnAccountSchema)
+
+
+@router.get(
+    '/payment-lanes',
+    dependencies=(Depends(current_superuser),),
+    response_model=list[PaymentLaneStats],
+)
+async def get_payment_lanes_stats():
+    logger.info('ADMIN! Запрос на получение статистики дорожек платежей')
+    return lane_scheduler.stats()
+
+
+@router.get(
+    '/db-pool',
+    dependencies=(Depends(current_superuser),),
+    response_model=DatabasePoolStats,
+)
+async def get_db_pool_stats():
+    logger.info('ADMIN! Запрос на получение статистики пула соединений')
+    return get_pool_stats()
+
+
+def _get_admission_controller():
+    if admission_controller is None:
+        raise HTTPException(
+            status.HTTP_404_NOT_FOUND, 'Payment admission is disabled'
+        )
+    return admission_controller
+
+
+@router.get(
+    '/payment-admission',
+    dependencies=(Depends(current_superuser),),
+    response_model=PaymentAdmissionStats,
+)
+async def get_payment_admission_stats():
+    logger.info('ADMIN! Запрос на получение статистики контроля допуска')
+    return _get_admission_controller().stats()
+
+
+@router.patch(
+    '/payment-admission',
+    dependencies=(Depends(current_superuser),),
+    response_model=PaymentAdmissionStats,
+)
+async def update_payment_admission_limits(limits: PaymentAdmissionLimits):
+    logger.info('ADMIN! Запрос на изменение лимитов контроля допуска')
+    controller = _get_admission_controller()
+    controller.update_limits(**limits.dict(exclude_unset=True))
+    return controller.stats()
+
+
+@router.post(
+    '/profile',
+    dependencies=(Depends(current_superuser),),
+    response_model=ProfileSummary,
+)
+async def start_profiling(profile: ProfileStart):
+    logger.info('ADMIN! Запрос на профилирование запросов принят')
+    request_profiler.start(
+        seconds=min(profile.seconds, settings.profiling_max_seconds),
+        reset=profile.reset,
+    )
+    return request_profiler.summary(top=0, sort=PROFILE_SORT_KEYS[0])
+
+
+@router.get(
+    '/profile',
+    dependencies=(Depends(current_superuser),),
+    response_model=ProfileSummary,
+)
+async def get_profile_summary(
+    top: int = Query(settings.profiling_top_n, ge=1),
+    sort: str = Query(
+        PROFILE_SORT_KEYS[0], regex=f'^({"|".join(PROFILE_SORT_KEYS)})$'
+    ),
+):
+    logger.info('ADMIN! Запрос на получение сводки профилирования принят')
+    return request_profiler.summary(top=top, sort=sort)
+
+
+@router.get(
+    '/profile/dump',
+    dependencies=(Depends(current_superuser),),
+    response_class=Response,
+)
+async def download_profile():
+    logger.info('ADMIN! Запрос на выгрузку профиля принят')
+    return Response(
+        content=request_profiler.dump(),
+        media_type='application/octet-stream',
+        headers={'Content-Disposition': 'attachment; filename="api.prof"'},
+    )
+
+
+@router.delete(
+    '/profile',
+    dependencies=(Depends(current_superuser),),
+    status_code=status.HTTP_204_NO_CONTENT,
+    response_class=Response,
+)
+async def stop_profiling():
+    logger.info('ADMIN! Запрос на остановку профилирования принят')
+    request_profiler.stop()
+    request_profiler.reset()
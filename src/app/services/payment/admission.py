@@ -0,0 +1,195 @@
+# Standart lib imports
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+
+# Thirdparty imports
+from fastapi import HTTPException, status
+
+# Projects imports
+from app.core.config import settings
+from app.core.metrics import counter, gauge
+from app.services.payment.metrics import (
+    PAYMENT_OUTCOME_OVERLOADED,
+    count_outcome,
+)
+from app.services.payment.schemas import PaymentSchema
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_ADMISSION_REJECTED = counter(
+    'payment_admission_rejected_total',
+    'Платежи, отклоненные контролем допуска',
+    labelnames=('reason',),
+)
+
+REJECT_ACCOUNT_LIMIT = 'account_limit'
+REJECT_QUEUE_FULL = 'queue_full'
+REJECT_QUEUE_TIMEOUT = 'queue_timeout'
+
+
+class AdmissionController:
+    """Ограничивает число платежей, обрабатываемых одновременно.
+
+    Платеж допускается, если не превышены общий лимит max_in_flight и
+    лимит max_per_account на один аккаунт. Сверх общего лимита платеж
+    ждет в очереди из не более чем queue_size мест не дольше
+    queue_timeout секунд; освободившееся место передается первому в
+    очереди. Остальные платежи сразу получают 429 с Retry-After, не
+    занимая соединение с БД. Лимиты можно менять во время работы.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        max_per_account: int,
+        queue_size: int,
+        queue_timeout: float,
+        retry_after: int,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_per_account = max_per_account
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._in_flight = 0
+        self._per_account: Dict[int, int] = {}
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._admitted = 0
+        self._rejected = 0
+
+    def _reject(self, reason: str):
+        self._rejected += 1
+        PAYMENT_ADMISSION_REJECTED.labels(reason).inc()
+        count_outcome(PAYMENT_OUTCOME_OVERLOADED)
+        logger.warning('Платеж отклонен контролем допуска: %s', reason)
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail='Too many payments in progress',
+            headers={'Retry-After': str(self.retry_after)},
+        )
+
+    def _wake_waiters(self):
+        while self._waiters and self._in_flight < self.max_in_flight:
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            # Место сразу занимается за ожидающим, чтобы его не перехватил
+            # новый запрос.
+            self._in_flight += 1
+            waiter.set_result(None)
+
+    async def _acquire(self):
+        if self._in_flight < self.max_in_flight and not self._waiters:
+            self._in_flight += 1
+            return
+
+        if len(self._waiters) >= self.queue_size:
+            self._reject(REJECT_QUEUE_FULL)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._reject(REJECT_QUEUE_TIMEOUT)
+        except asyncio.CancelledError:
+            # Запрос отменен, когда место уже было за ним закреплено.
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            raise
+
+    def _release(self):
+        self._in_flight -= 1
+        self._wake_waiters()
+
+    @asynccontextmanager
+    async def admit(self, account_id: int):
+        """Занимает место для платежа аккаунта на время обработки."""
+        account_in_flight = self._per_account.get(account_id, 0)
+        if account_in_flight >= self.max_per_account:
+            self._reject(REJECT_ACCOUNT_LIMIT)
+
+        self._per_account[account_id] = account_in_flight + 1
+        try:
+            await self._acquire()
+            self._admitted += 1
+            try:
+                yield
+            finally:
+                self._release()
+        finally:
+            remaining = self._per_account[account_id] - 1
+            if remaining:
+                self._per_account[account_id] = remaining
+            else:
+                del self._per_account[account_id]
+
+    def update_limits(self, **limits):
+        """Меняет лимиты; ожидающие платежи допускаются сразу, если
+        общий лимит увеличен."""
+        for name, value in limits.items():
+            if value is not None:
+                setattr(self, name, value)
+        logger.info('Лимиты контроля допуска изменены: %s', self.limits())
+        self._wake_waiters()
+
+    def limits(self) -> dict:
+        return {
+            'max_in_flight': self.max_in_flight,
+            'max_per_account': self.max_per_account,
+            'queue_size': self.queue_size,
+            'queue_timeout': self.queue_timeout,
+            'retry_after': self.retry_after,
+        }
+
+    def stats(self) -> dict:
+        return {
+            **self.limits(),
+            'in_flight': self._in_flight,
+            'queued': sum(not waiter.done() for waiter in self._waiters),
+            'accounts_in_flight': len(self._per_account),
+            'admitted': self._admitted,
+            'rejected': self._rejected,
+        }
+
+
+admission_controller: Optional[AdmissionController] = (
+    AdmissionController(
+        max_in_flight=settings.payment_admission_max_in_flight,
+        max_per_account=settings.payment_admission_max_per_account,
+        queue_size=settings.payment_admission_queue_size,
+        queue_timeout=settings.payment_admission_queue_timeout,
+        retry_after=settings.payment_admission_retry_after,
+    )
+    if settings.payment_admission_enabled
+    else None
+)
+
+
+async def admit_payment(payment_data: PaymentSchema):
+    """Зависимость эндпоинта платежа: допускает платеж до получения
+    соединения с БД или отвечает 429."""
+    if admission_controller is None:
+        yield
+        return
+
+    async with admission_controller.admit(payment_data.account_id):
+        yield
+
+
+def _collect_admission_stats():
+    if admission_controller is None:
+        return []
+    stats = admission_controller.stats()
+    return [((key,), stats[key]) for key in ('in_flight', 'queued')]
+
+
+gauge(
+    'payment_admission',
+    'Платежи в обработке и в очереди контроля допуска',
+    callback=_collect_admission_stats,
+    labelnames=('state',),
+)
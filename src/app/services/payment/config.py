@@ -1,22 +1,43 @@
-from decimal import Decimal
-
-from sqlalchemy import Column, ForeignKey, Integer, Numeric
+from sqlalchemy import (
+    JSON,
+    BigInteger,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    text,
+)
 from sqlalchemy.orm import relationship
 
 from app.core.db import Base
 
-DEFAULT_ACCOUNT_BALANCE = Decimal('0.00')
-BALANCE_PRECISION: int = 12
-BALANCE_SCALE: int = 2
+# Суммы хранятся в минорных единицах, см. app.core.money.
+DEFAULT_ACCOUNT_BALANCE: int = 0
+TRANSACTION_ID_MAX_LENGTH: int = 64
+
+PAYMENT_STATUS_ACCEPTED = 'accepted'
+PAYMENT_STATUS_ACCOUNT_NOT_FOUND = 'account_not_found'
+PAYMENT_STATUS_COMPLETED = 'completed'
+PAYMENT_STATUS_DUPLICATE = 'duplicate'
+PAYMENT_STATUS_INVALID_SIGNATURE = 'invalid_signature'
+PAYMENT_STATUS_LOCKED = 'locked'
+
+OUTBOX_EVENT_PAYMENT_COMPLETED = 'payment.completed'
 
 
 class Account(Base):
     """Модель финансового аккаунта пользователя."""
 
+    # Список аккаунтов пользователя: WHERE user_id = ? AND id > ?
+    # ORDER BY id.
+    __table_args__ = (Index('ix_account_user_id_id', 'user_id', 'id'),)
+
     balance = Column(
-        Numeric(BALANCE_PRECISION, BALANCE_SCALE, asdecimal=True),
+        BigInteger,
         default=DEFAULT_ACCOUNT_BALANCE,
-        server_default='0.00',
+        server_default='0',
         nullable=False,
     )
     user_id = Column(ForeignKey('user.id'))
@@ -30,12 +51,44 @@ class Account(Base):
 class Payment(Base):
     """Модель 'Платежа' пользователя."""
 
-    transaction_id = Column(Integer, unique=True, nullable=False, index=True)
+    # Платежи аккаунтов пользователя постранично по id и выгрузка за
+    # период по created_at.
+    __table_args__ = (
+        Index('ix_payment_account_id_id', 'account_id', 'id'),
+        Index('ix_payment_account_id_created_at', 'account_id', 'created_at'),
+    )
+
+    transaction_id = Column(
+        String(TRANSACTION_ID_MAX_LENGTH),
+        unique=True,
+        nullable=False,
+        index=True,
+    )
     account_id = Column(ForeignKey('account.id'))
     account = relationship('Account', back_populates='payments')
     payment_amount = Column(
-        Numeric(BALANCE_PRECISION, BALANCE_SCALE, asdecimal=True),
+        BigInteger,
         default=DEFAULT_ACCOUNT_BALANCE,
-        server_default='0.00',
+        server_default='0',
         nullable=False,
     )
+
+
+class Outbox(Base):
+    """Событие для внешних систем, записанное в одной транзакции с
+    изменением, которое его породило."""
+
+    # Очередь неотправленных событий: WHERE sent_at IS NULL ORDER BY id.
+    __table_args__ = (
+        Index(
+            'ix_outbox_unsent_id',
+            'id',
+            postgresql_where=text('sent_at IS NULL'),
+            sqlite_where=text('sent_at IS NULL'),
+        ),
+    )
+
+    event_type = Column(String(64), nullable=False)
+    payload = Column(JSON, nullable=False)
+    attempts = Column(Integer, default=0, server_default='0', nullable=False)
+    sent_at = Column(DateTime, comment='Дата отправки')
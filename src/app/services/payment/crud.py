@@ -1,43 +1,175 @@
 # Standart lib imports
 import logging
-from typing import List, Union
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
 
 # Thirdparty imports
-from sqlalchemy import and_, select
+from fastapi import HTTPException, status
+from sqlalchemy import and_, event, select, text
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, SessionTransaction
 from sqlalchemy.sql import Select
 
 # Projects imports
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.core.db import get_current_transaction, is_within_transaction
+from app.core.pagination import CursorParams, paginate
 from app.services.payment.config import Account, Payment
+from app.services.payment.metrics import stage_timer
 
 logger = logging.getLogger(__name__)
 
+# Ключ advisory-блокировки, под которой сдвигается последовательность id
+# аккаунтов после вставки с явным id.
+ACCOUNT_ID_SEQUENCE_LOCK = 7410
+ADVANCE_ACCOUNT_ID_SEQUENCE = text(
+    "SELECT setval(pg_get_serial_sequence('account', 'id'), :account_id) "
+    "WHERE :account_id > COALESCE(pg_sequence_last_value("
+    "pg_get_serial_sequence('account', 'id')::regclass), 0)"
+)
+# Ключ Session.info со списком (транзакция, кеш, пара) аккаунтов, которые
+# попадут в account_cache после commit.
+PENDING_ACCOUNTS_KEY = 'pending_cached_accounts'
+
+
+@event.listens_for(Session, 'after_commit')
+def _cache_committed_accounts(session: Session):
+    for _, cache, key in session.info.pop(PENDING_ACCOUNTS_KEY, ()):
+        cache.set(key, True)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _forget_rolled_back_accounts(
+    session: Session, previous_transaction: SessionTransaction
+):
+    pending = session.info.get(PENDING_ACCOUNTS_KEY)
+    if pending:
+        session.info[PENDING_ACCOUNTS_KEY] = [
+            entry
+            for entry in pending
+            if not is_within_transaction(entry[0], previous_transaction)
+        ]
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _forget_uncommitted_accounts(
+    session: Session, transaction: SessionTransaction
+):
+    # Транзакция сессии закончилась без commit (например, при close).
+    if transaction.parent is None:
+        session.info.pop(PENDING_ACCOUNTS_KEY, None)
+
 
 class BaseCRUD:
 
     def __init__(self, model):
         self.model = model
 
-    async def _get_all(self, session: AsyncSession, stmt: Select) -> List:
-        result = await session.execute(stmt)
+    async def _get_page(
+        self, session: AsyncSession, stmt: Select, params: CursorParams
+    ) -> dict:
+        page = await paginate(
+            session=session, stmt=stmt, id_column=self.model.id, params=params
+        )
         logger.info('Список получен')
-        return result.scalars().all()
+        return page
 
 
 class AccountCRUD(BaseCRUD):
+    """CRUD аккаунтов.
 
-    async def get_accounts(self, session: AsyncSession, user_id: int) -> List:
-        stmt = select(self.model).where(self.model.user_id == user_id)
+    Если передан account_cache, проверенные пары (user_id, account_id)
+    запоминаются, и повторный платеж на тот же аккаунт не выполняет
+    SELECT: владелец аккаунта не меняется. Пара попадает в кеш только
+    после commit транзакции, в которой аккаунт найден или создан:
+    откат (в том числе savepoint) не должен оставить в кеше аккаунт,
+    которого нет в БД.
+    """
+
+    def __init__(self, model, account_cache: Optional[LRUCache] = None):
+        super().__init__(model)
+        self.account_cache = account_cache
+
+    def _remember_account(self, session: AsyncSession, account: Account):
+        if self.account_cache is None:
+            return
+        session.info.setdefault(PENDING_ACCOUNTS_KEY, []).append(
+            (
+                get_current_transaction(session),
+                self.account_cache,
+                (account.user_id, account.id),
+            )
+        )
+
+    async def get_accounts(
+        self, session: AsyncSession, user_id: int, params: CursorParams
+    ) -> dict:
+        stmt = select(
+            self.model.id,
+            self.model.user_id,
+            self.model.balance,
+            self.model.created_at,
+            self.model.updated_at,
+        ).where(self.model.user_id == user_id)
         logger.info('Получение списка аккаунтов')
-        return await self._get_all(session=session, stmt=stmt)
+        return await self._get_page(session=session, stmt=stmt, params=params)
+
+    async def create(
+        self, session: AsyncSession, user_id: int, account_id: int
+    ) -> Optional[Account]:
+        """Метод создает аккаунт пользователя с заданным id.
 
-    async def create(self, session: AsyncSession, user_id: int):
+        Вставка выполняется через INSERT ... ON CONFLICT (id) DO NOTHING,
+        поэтому параллельные первые платежи на один аккаунт создают его
+        ровно один раз. Возвращает None, если аккаунт с таким id
+        принадлежит другому пользователю.
+
+        На postgres явный id не двигает последовательность account_id_seq,
+        и аккаунт, созданный без id (например, при создании
+        пользователя), получил бы уже занятый id. Поэтому после вставки
+        последовательность сдвигается до account_id. Сдвиги выполняются
+        под advisory-блокировкой транзакции, чтобы параллельные вставки
+        не откатили последовательность назад.
+        """
         logger.info('Создание нового аккаунта')
-        instance = self.model(user_id=user_id)
-        session.add(instance)
-        await session.flush()
+        is_postgres = session.bind.dialect.name == 'postgresql'
+        dialect_insert = postgresql.insert if is_postgres else sqlite.insert
+        stmt = (
+            dialect_insert(self.model)
+            .values(id=account_id, user_id=user_id)
+            .on_conflict_do_nothing(index_elements=[self.model.id])
+        )
+        if is_postgres:
+            result = await session.execute(stmt.returning(self.model.id))
+            if result.scalar() is not None:
+                await session.execute(
+                    text('SELECT pg_advisory_xact_lock(:key)'),
+                    {'key': ACCOUNT_ID_SEQUENCE_LOCK},
+                )
+                await session.execute(
+                    ADVANCE_ACCOUNT_ID_SEQUENCE, {'account_id': account_id}
+                )
+        else:
+            # sqlite выдает новый id как max(id) + 1, сдвиг не нужен.
+            await session.execute(stmt)
+
+        result = await session.execute(
+            select(self.model).where(
+                and_(
+                    self.model.user_id == user_id,
+                    self.model.id == account_id,
+                )
+            )
+        )
+        instance = result.scalars().first()
+        if instance is None:
+            logger.warning('Аккаунт принадлежит другому пользователю')
+            return None
 
         logger.info('Аккаунт создан')
+        self._remember_account(session, instance)
         return instance
 
     async def get_or_create_account(
@@ -45,41 +177,153 @@ class AccountCRUD(BaseCRUD):
         user_id: int,
         session: AsyncSession,
         account_id: int,
-    ) -> Union[Account, Payment]:
-        """Метод получает или создает аккаунт пользователя."""
+    ) -> Account:
+        """Метод получает или создает аккаунт пользователя.
+
+        При попадании в account_cache запрос к БД не выполняется и
+        возвращается несвязанный с сессией Account, в котором заполнены
+        только id и user_id.
+        """
+        if (
+            self.account_cache is not None
+            and (user_id, account_id) in self.account_cache
+        ):
+            return self.model(id=account_id, user_id=user_id)
+
         logger.info('Получение аккаунта пользователя')
-        result = await session.execute(
-            select(self.model).where(
-                and_(
-                    self.model.user_id == user_id,
-                    self.model.id == account_id,
+        with stage_timer('account_lookup'):
+            result = await session.execute(
+                select(self.model).where(
+                    and_(
+                        self.model.user_id == user_id,
+                        self.model.id == account_id,
+                    )
                 )
             )
-        )
-        instance = result.scalars().first()
+            instance = result.scalars().first()
 
         if not instance:
             logger.info('Аккаунт не найден')
-            return await self.create(session=session, user_id=user_id)
+            with stage_timer('account_create'):
+                instance = await self.create(
+                    session=session, user_id=user_id, account_id=account_id
+                )
+            if instance is None:
+                raise HTTPException(
+                    status.HTTP_404_NOT_FOUND, 'Account not found'
+                )
+            return instance
 
         logger.info('Аккаунт найден.')
+        self._remember_account(session, instance)
         return instance
 
+    async def get_or_create_accounts(
+        self,
+        session: AsyncSession,
+        pairs: Iterable[Tuple[int, int]],
+    ) -> Dict[Tuple[int, int], Account]:
+        """Метод получает или создает аккаунты для пакета платежей.
+
+        Принимает пары (user_id, account_id) и возвращает словарь,
+        где каждой паре сопоставлен аккаунт. Все существующие аккаунты
+        получаются одним запросом. Пары, чей account_id принадлежит
+        другому пользователю, в словарь не попадают.
+        """
+        pairs = set(pairs)
+        logger.info('Получение аккаунтов для пакета платежей')
+        result = await session.execute(
+            select(self.model).where(
+                self.model.id.in_({account_id for _, account_id in pairs})
+            )
+        )
+        found = {
+            (instance.user_id, instance.id): instance
+            for instance in result.scalars().all()
+        }
+
+        accounts = {}
+        for pair in sorted(pairs):
+            if pair not in found:
+                logger.info('Аккаунт не найден')
+                found[pair] = await self.create(
+                    session=session, user_id=pair[0], account_id=pair[1]
+                )
+            if found[pair] is not None:
+                self._remember_account(session, found[pair])
+                accounts[pair] = found[pair]
+
+        return accounts
+
 
 class PaymentCRUD(BaseCRUD):
 
-    async def get_payments(self, session: AsyncSession, user_id: int) -> List:
+    async def get_payments(
+        self, session: AsyncSession, user_id: int, params: CursorParams
+    ) -> dict:
         stmt = (
-            select(self.model)
-            .join(self.model.account)
+            select(
+                self.model.id,
+                self.model.transaction_id,
+                self.model.account_id,
+                self.model.payment_amount,
+            )
+            .join(Account, self.model.account_id == Account.id)
             .where(Account.user_id == user_id)
         )
         logger.info('Получение списка платежей')
-        return await self._get_all(session=session, stmt=stmt)
+        return await self._get_page(session=session, stmt=stmt, params=params)
+
+    async def stream_payments(
+        self,
+        session: AsyncSession,
+        user_id: int,
+        chunk_size: int,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+    ) -> AsyncIterator[List]:
+        """Метод отдает платежи пользователя порциями по chunk_size.
+
+        Строки читаются через серверный курсор, поэтому в памяти
+        одновременно находится не больше одной порции.
+        """
+        stmt = (
+            select(
+                self.model.id,
+                self.model.transaction_id,
+                self.model.account_id,
+                self.model.payment_amount,
+                self.model.created_at,
+            )
+            .join(Account, self.model.account_id == Account.id)
+            .where(Account.user_id == user_id)
+            .order_by(self.model.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        if date_from is not None:
+            stmt = stmt.where(self.model.created_at >= date_from)
+        if date_to is not None:
+            stmt = stmt.where(self.model.created_at < date_to)
+
+        logger.info('Выгрузка платежей')
+        result = await session.stream(stmt)
+        async for rows in result.partitions(chunk_size):
+            yield rows
+        logger.info('Выгрузка платежей завершена')
+
+
+account_cache: Optional[LRUCache] = (
+    LRUCache(
+        max_size=settings.account_cache_max_size,
+        ttl=settings.account_cache_ttl,
+    )
+    if settings.account_cache_enabled
+    else None
+)
 
 
 async def get_account_crud() -> AccountCRUD:
-    return AccountCRUD(Account)
+    return AccountCRUD(Account, account_cache=account_cache)
 
 
 async def get_payment_crud() -> PaymentCRUD:
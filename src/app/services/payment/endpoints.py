@@ -1,19 +1,59 @@
+import asyncio
 import logging
-from typing import List
+from datetime import datetime
+from typing import List, Optional, Union
 
-from fastapi import APIRouter, Depends
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    Response,
+    status,
+)
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.db import get_async_session
-from app.core.user import current_user
+from app.core.config import settings
+from app.core.db import (
+    AsyncSessionLocal,
+    get_async_session,
+    mark_user_write,
+)
+from app.core.log import bind_log_context
+from app.core.pagination import CursorParams
+from app.core.query_stats import query_budget
+from app.core.serialization import serialize_page
+from app.core.user import current_user, get_user_read_session
 from app.models import User
+from app.schemas.pagination import CursorPage
+from app.services.payment.config import (
+    PAYMENT_STATUS_ACCEPTED,
+    PAYMENT_STATUS_COMPLETED,
+)
+from app.services.payment.admission import admit_payment
 from app.services.payment.crud import (
     AccountCRUD,
     PaymentCRUD,
     get_account_crud,
     get_payment_crud,
 )
+from app.services.payment.export import (
+    EXPORT_ENCODERS,
+    EXPORT_FORMAT_NDJSON,
+    EXPORT_MEDIA_TYPES,
+)
+from app.services.payment.group_commit import group_committer
+from app.services.payment.journal import payment_journal
+from app.services.payment.lanes import lane_scheduler
+from app.services.payment.metrics import (
+    count_outcome,
+    outcome_from_exception,
+    stage_timer,
+)
 from app.services.payment.schemas import (
+    PaymentAcceptedResponse,
+    PaymentBatchResponse,
     PaymentResponse,
     PaymentSchema,
     ReturnAccountSchema,
@@ -26,50 +66,204 @@ router = APIRouter()
 logger = logging.getLogger(__name__)
 
 
-@router.post('/payment')
+@router.post('/payment', dependencies=(Depends(admit_payment),))
 async def handle_payment(
     payment_data: PaymentSchema,
+    http_response: Response,
     service: PaymentService = Depends(get_payment_service),
     crud: AccountCRUD = Depends(get_account_crud),
     session: AsyncSession = Depends(get_async_session),
-) -> PaymentResponse:
-    logging.info('Обработка нового платежа')
+) -> Union[PaymentResponse, PaymentAcceptedResponse]:
     payment_dict = payment_data.dict()
-
-    account = await crud.get_or_create_account(
-        session=session,
-        user_id=payment_dict['user_id'],
+    bind_log_context(
         account_id=payment_dict['account_id'],
+        transaction_id=payment_dict['transaction_id'],
     )
+    logger.info('Обработка нового платежа')
+    await service.reject_known_duplicate(payment_dict)
+
+    if payment_journal is not None:
+        try:
+            with stage_timer('signature'):
+                await service.verify_signature(payment_dict)
+            with stage_timer('journal'):
+                await payment_journal.append(payment_dict)
+        except HTTPException as e:
+            count_outcome(outcome_from_exception(e))
+            raise
+
+        count_outcome(PAYMENT_STATUS_ACCEPTED)
+        mark_user_write(payment_dict['user_id'])
+        http_response.status_code = status.HTTP_202_ACCEPTED
+        return PaymentAcceptedResponse(
+            status=PAYMENT_STATUS_ACCEPTED,
+            transaction_id=payment_dict['transaction_id'],
+        )
+
+    async def apply_payment(group_session: AsyncSession) -> PaymentResponse:
+        account = await crud.get_or_create_account(
+            session=group_session,
+            user_id=payment_dict['user_id'],
+            account_id=payment_dict['account_id'],
+        )
+        return await service.apply_transaction(
+            session=group_session, payment_dict=payment_dict, account=account
+        )
+
+    async def enqueue_payment() -> asyncio.Future:
+        return group_committer.enqueue(
+            account_id=payment_dict['account_id'], func=apply_payment
+        )
+
+    async def process_payment(
+        payment_session: AsyncSession,
+    ) -> PaymentResponse:
+        if group_committer is not None:
+            with stage_timer('signature'):
+                await service.verify_signature(payment_dict)
+            if settings.payment_lanes_enabled:
+                # Дорожка только ставит платеж в группу в порядке
+                # аккаунта и не ждет общего commit, иначе группа была бы
+                # не больше числа дорожек.
+                commit = await lane_scheduler.submit(
+                    account_id=payment_dict['account_id'],
+                    func=enqueue_payment,
+                )
+            else:
+                commit = await enqueue_payment()
+            response = await commit
+            service.remember_transaction(payment_dict['transaction_id'])
+            return response
+
+        account = await crud.get_or_create_account(
+            session=payment_session,
+            user_id=payment_dict['user_id'],
+            account_id=payment_dict['account_id'],
+        )
+
+        return await service.process_transaction(
+            session=payment_session,
+            payment_dict=payment_dict,
+            account=account,
+        )
+
+    async def process_payment_in_lane() -> PaymentResponse:
+        # Задание дорожки может выполняться и после отмены запроса,
+        # когда сессия запроса уже закрыта, поэтому сессия у него своя.
+        async with AsyncSessionLocal() as lane_session:
+            return await process_payment(lane_session)
+
+    try:
+        if settings.payment_lanes_enabled and group_committer is None:
+            response = await lane_scheduler.submit(
+                account_id=payment_dict['account_id'],
+                func=process_payment_in_lane,
+            )
+        else:
+            response = await process_payment(session)
+    except HTTPException as e:
+        count_outcome(outcome_from_exception(e))
+        raise
+
+    count_outcome(PAYMENT_STATUS_COMPLETED)
+    mark_user_write(payment_dict['user_id'])
+    return response
+
 
-    return await service.process_transaction(
+@router.post('/payment/batch', response_model=PaymentBatchResponse)
+async def handle_payment_batch(
+    payments: List[PaymentSchema],
+    service: PaymentService = Depends(get_payment_service),
+    crud: AccountCRUD = Depends(get_account_crud),
+    session: AsyncSession = Depends(get_async_session),
+) -> PaymentBatchResponse:
+    logger.info('Обработка пакета платежей: %s', len(payments))
+    if len(payments) > settings.payment_batch_max_size:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=(
+                'Batch size should not exceed '
+                f'{settings.payment_batch_max_size} payments'
+            ),
+        )
+
+    response = await service.process_batch(
         session=session,
-        payment_dict=payment_dict,
-        account=account,
+        payment_dicts=[payment.dict() for payment in payments],
+        crud=crud,
     )
+    for payment, result in zip(payments, response.results):
+        count_outcome(result.status)
+        if result.status == PAYMENT_STATUS_COMPLETED:
+            mark_user_write(payment.user_id)
+
+    return response
 
 
 @router.get(
     '/payment',
-    response_model=List[ReturnPaymentSchema],
+    dependencies=(Depends(query_budget(3)),),
+    response_model=CursorPage[ReturnPaymentSchema],
 )
 async def get_user_payments(
-    session: AsyncSession = Depends(get_async_session),
+    params: CursorParams = Depends(),
+    session: AsyncSession = Depends(get_user_read_session),
     payment_crud: PaymentCRUD = Depends(get_payment_crud),
     user: User = Depends(current_user),
-) -> List[ReturnPaymentSchema]:
+) -> CursorPage[ReturnPaymentSchema]:
     logger.info('Запрос на получение списка платежей принят')
-    return await payment_crud.get_payments(session=session, user_id=user.id)
+    page = await payment_crud.get_payments(
+        session=session, user_id=user.id, params=params
+    )
+    return serialize_page(page, ReturnPaymentSchema)
+
+
+@router.get('/payment/export', response_class=StreamingResponse)
+async def export_user_payments(
+    export_format: str = Query(
+        EXPORT_FORMAT_NDJSON,
+        alias='format',
+        regex='^(' + '|'.join(EXPORT_ENCODERS) + ')$',
+    ),
+    date_from: Optional[datetime] = Query(None, alias='from'),
+    date_to: Optional[datetime] = Query(None, alias='to'),
+    session: AsyncSession = Depends(get_user_read_session),
+    payment_crud: PaymentCRUD = Depends(get_payment_crud),
+    user: User = Depends(current_user),
+) -> StreamingResponse:
+    logger.info('Запрос на выгрузку платежей принят')
+    chunks = payment_crud.stream_payments(
+        session=session,
+        user_id=user.id,
+        chunk_size=settings.export_chunk_size,
+        date_from=date_from,
+        date_to=date_to,
+    )
+
+    return StreamingResponse(
+        EXPORT_ENCODERS[export_format](chunks),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={
+            'Content-Disposition': (
+                f'attachment; filename=payments.{export_format}'
+            )
+        },
+    )
 
 
 @router.get(
     '/account',
-    response_model=List[ReturnAccountSchema],
+    dependencies=(Depends(query_budget(3)),),
+    response_model=CursorPage[ReturnAccountSchema],
 )
 async def get_user_accounts(
-    session: AsyncSession = Depends(get_async_session),
+    params: CursorParams = Depends(),
+    session: AsyncSession = Depends(get_user_read_session),
     account_crud: AccountCRUD = Depends(get_account_crud),
     user: User = Depends(current_user),
-) -> List[ReturnAccountSchema]:
+) -> CursorPage[ReturnAccountSchema]:
     logger.info('Запрос на получение списка аккаунтов принят')
-    return await account_crud.get_accounts(session=session, user_id=user.id)
+    page = await account_crud.get_accounts(
+        session=session, user_id=user.id, params=params
+    )
+    return serialize_page(page, ReturnAccountSchema)
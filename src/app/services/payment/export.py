@@ -0,0 +1,67 @@
+# Standart lib imports
+import csv
+import io
+import json
+from typing import AsyncIterator, List, Sequence
+
+# Projects imports
+from app.core.money import from_minor_units
+
+EXPORT_FORMAT_NDJSON = 'ndjson'
+EXPORT_FORMAT_CSV = 'csv'
+EXPORT_MEDIA_TYPES = {
+    EXPORT_FORMAT_NDJSON: 'application/x-ndjson',
+    EXPORT_FORMAT_CSV: 'text/csv',
+}
+EXPORT_COLUMNS: List[str] = [
+    'id',
+    'transaction_id',
+    'account_id',
+    'payment_amount',
+    'created_at',
+]
+
+
+def _format_row(row: Sequence) -> dict:
+    """Приводит строку выгрузки к JSON/CSV-совместимым значениям.
+
+    Суммы хранятся в минорных единицах и выгружаются строкой с двумя
+    знаками после запятой.
+    """
+    id_, transaction_id, account_id, payment_amount, created_at = row
+    return {
+        'id': id_,
+        'transaction_id': transaction_id,
+        'account_id': account_id,
+        'payment_amount': str(from_minor_units(payment_amount)),
+        'created_at': created_at.isoformat() if created_at else None,
+    }
+
+
+async def iter_ndjson(chunks: AsyncIterator[List]) -> AsyncIterator[bytes]:
+    """Кодирует порции строк в NDJSON, по одному куску на порцию."""
+    async for rows in chunks:
+        yield ''.join(
+            json.dumps(_format_row(row), ensure_ascii=False) + '\n'
+            for row in rows
+        ).encode()
+
+
+async def iter_csv(chunks: AsyncIterator[List]) -> AsyncIterator[bytes]:
+    """Кодирует порции строк в CSV с заголовком в первом куске."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    yield buffer.getvalue().encode()
+
+    async for rows in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(_format_row(row) for row in rows)
+        yield buffer.getvalue().encode()
+
+
+EXPORT_ENCODERS = {
+    EXPORT_FORMAT_NDJSON: iter_ndjson,
+    EXPORT_FORMAT_CSV: iter_csv,
+}
@@ -0,0 +1,205 @@
+# Standart lib imports
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+# Thirdparty imports
+from fastapi import HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Projects imports
+from app.core.config import settings
+from app.core.db import AsyncSessionLocal
+from app.core.log import bind_log_context, get_log_context
+from app.core.metrics import histogram
+from app.services.payment.metrics import stage_timer
+
+logger = logging.getLogger(__name__)
+
+GROUP_SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+PAYMENT_GROUP_SIZE = histogram(
+    'payment_group_commit_size',
+    'Число платежей в одной транзакции группового commit',
+    buckets=GROUP_SIZE_BUCKETS,
+)
+
+GroupItem = Tuple[
+    int, Callable[[AsyncSession], Awaitable[Any]], asyncio.Future, dict
+]
+
+
+class GroupCommitter:
+    """Объединяет платежи, пришедшие в пределах окна, в одну транзакцию.
+
+    Первый платеж открывает окно длиной window секунд; все платежи,
+    пришедшие за это время (но не больше max_size), выполняются в одной
+    сессии, каждый в своем savepoint, и фиксируются одним commit.
+    Ошибка платежа откатывает только его savepoint. Вызывающий код
+    получает результат своего платежа после общего commit.
+    """
+
+    def __init__(self, window: float, max_size: int):
+        self.window = window
+        self.max_size = max_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None
+
+    def start(self):
+        """Запускает фоновую задачу сборки групп в текущем event loop."""
+        if self.is_running:
+            return
+
+        logger.info(
+            'Запуск группового commit: окно %.1f мс, до %s платежей',
+            self.window * 1000,
+            self.max_size,
+        )
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Останавливает сборку групп и отменяет ожидающие платежи."""
+        if not self.is_running:
+            return
+
+        logger.info('Остановка группового commit')
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        while not self._queue.empty():
+            _, _, future, _ = self._queue.get_nowait()
+            future.cancel()
+
+        self._task = None
+        self._queue = None
+
+    def enqueue(
+        self,
+        account_id: int,
+        func: Callable[[AsyncSession], Awaitable[Any]],
+    ) -> asyncio.Future:
+        """Ставит func(session) в ближайшую группу, не дожидаясь commit.
+
+        Возвращает future с результатом func после общего commit.
+        Платежи одного аккаунта выполняются в порядке постановки.
+        """
+        self.start()
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(
+            (account_id, func, future, get_log_context())
+        )
+        return future
+
+    async def submit(
+        self,
+        account_id: int,
+        func: Callable[[AsyncSession], Awaitable[Any]],
+    ) -> Any:
+        """Выполняет func(session) в ближайшей группе и ждет commit.
+
+        Исключения, выброшенные func, пробрасываются вызывающему коду.
+        """
+        return await self.enqueue(account_id=account_id, func=func)
+
+    async def _collect_group(self) -> List[GroupItem]:
+        group = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.window
+
+        while len(group) < self.max_size:
+            if not self._queue.empty():
+                group.append(self._queue.get_nowait())
+                continue
+
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                group.append(
+                    await asyncio.wait_for(self._queue.get(), timeout)
+                )
+            except asyncio.TimeoutError:
+                break
+
+        return group
+
+    async def _run(self):
+        while True:
+            group = await self._collect_group()
+            try:
+                await self._commit_group(group)
+            except Exception as e:
+                logger.exception('Ошибка группового commit')
+                for _, _, future, _ in group:
+                    if not future.done():
+                        future.set_exception(e)
+
+    async def _commit_group(self, group: List[GroupItem]):
+        PAYMENT_GROUP_SIZE.observe(len(group))
+        applied = []
+
+        async with AsyncSessionLocal() as session:
+            # Порядок блокировок по account_id одинаков у всех групп и
+            # воркеров, это исключает взаимные блокировки между ними.
+            for _, func, future, log_context in sorted(
+                group, key=lambda item: item[0]
+            ):
+                if future.cancelled():
+                    continue
+
+                bind_log_context(**log_context)
+                try:
+                    async with session.begin_nested():
+                        result = await func(session)
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    applied.append((future, result))
+
+            if not applied:
+                return
+
+            try:
+                with stage_timer('commit'):
+                    await session.commit()
+            except Exception:
+                logger.exception(
+                    'Ошибка commit группы из %s платежей', len(applied)
+                )
+                committed = False
+            else:
+                committed = True
+
+        # Результаты отдаются после закрытия сессии: вызывающий код
+        # может сразу остановить committer, не прервав закрытие.
+        if not committed:
+            for future, _ in applied:
+                if not future.done():
+                    future.set_exception(
+                        HTTPException(
+                            status.HTTP_500_INTERNAL_SERVER_ERROR,
+                            'Database operation failed',
+                        )
+                    )
+            return
+
+        logger.info('Группа из %s платежей зафиксирована', len(applied))
+        for future, result in applied:
+            if not future.done():
+                future.set_result(result)
+
+
+group_committer: Optional[GroupCommitter] = (
+    GroupCommitter(
+        window=settings.payment_group_commit_window_ms / 1000,
+        max_size=settings.payment_group_commit_max_size,
+    )
+    if settings.payment_group_commit_enabled
+    else None
+)
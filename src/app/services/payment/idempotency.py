@@ -0,0 +1,123 @@
+# Standart lib imports
+import hashlib
+import logging
+import math
+from typing import Optional
+
+# Thirdparty imports
+from sqlalchemy import select
+
+# Projects imports
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.core.db import AsyncSessionLocal
+from app.services.payment.config import Payment
+
+logger = logging.getLogger(__name__)
+
+WARM_UP_CHUNK_SIZE: int = 10000
+
+
+class BloomFilter:
+    """Фильтр Блума для строковых ключей.
+
+    Размер битового массива и число хеш-функций подбираются по
+    ожидаемому количеству ключей и допустимой доле ложных срабатываний.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(
+            8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        )
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self._bits)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.hash_count):
+            yield (first + i * second) % self.size
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+
+class TransactionIdIndex:
+    """Индекс уже обработанных transaction_id в памяти процесса.
+
+    LRU недавних transaction_id позволяет отклонить повторный webhook
+    без обращения к БД. Фильтр Блума, прогретый из таблицы payment,
+    позволяет пропустить SELECT на дубликаты для заведомо новых
+    transaction_id. Источником истины остается уникальный индекс
+    payment.transaction_id.
+    """
+
+    def __init__(
+        self, lru_size: int, bloom_capacity: int, bloom_error_rate: float
+    ):
+        self._recent = LRUCache(max_size=lru_size)
+        self._bloom = BloomFilter(
+            capacity=bloom_capacity, error_rate=bloom_error_rate
+        )
+        self.is_warm = False
+
+    def add(self, transaction_id: str):
+        transaction_id = str(transaction_id)
+        self._recent.set(transaction_id, True)
+        self._bloom.add(transaction_id)
+
+    def is_known_duplicate(self, transaction_id: str) -> bool:
+        """Транзакция точно уже обработана."""
+        return str(transaction_id) in self._recent
+
+    def might_exist(self, transaction_id: str) -> bool:
+        """Транзакция, возможно, уже обработана.
+
+        False гарантирует, что transaction_id не встречался, но только
+        после прогрева индекса из БД.
+        """
+        return not self.is_warm or str(transaction_id) in self._bloom
+
+    async def warm_up(self, chunk_size: int = WARM_UP_CHUNK_SIZE):
+        """Заполняет индекс transaction_id из таблицы payment."""
+        logger.info('Прогрев индекса transaction_id')
+        count = 0
+        async with AsyncSessionLocal() as session:
+            result = await session.stream_scalars(
+                select(Payment.transaction_id)
+                .order_by(Payment.id)
+                .execution_options(yield_per=chunk_size)
+            )
+            async for transaction_id in result:
+                self.add(transaction_id)
+                count += 1
+
+        self.is_warm = True
+        logger.info(
+            'Индекс transaction_id прогрет: %s записей, фильтр Блума %s байт',
+            count,
+            self._bloom.memory_bytes,
+        )
+
+
+transaction_index: Optional[TransactionIdIndex] = (
+    TransactionIdIndex(
+        lru_size=settings.idempotency_lru_size,
+        bloom_capacity=settings.idempotency_bloom_capacity,
+        bloom_error_rate=settings.idempotency_bloom_error_rate,
+    )
+    if settings.idempotency_enabled
+    else None
+)
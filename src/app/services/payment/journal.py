@@ -0,0 +1,361 @@
+# Standart lib imports
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# Thirdparty imports
+from fastapi import HTTPException
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+# Projects imports
+from app.core.config import settings
+from app.core.db import AsyncSessionLocal
+from app.core.journal import Position, WriteAheadJournal
+from app.core.log import bind_log_context
+from app.core.metrics import counter, gauge
+from app.services.payment.config import (
+    PAYMENT_STATUS_COMPLETED,
+    PAYMENT_STATUS_DUPLICATE,
+    PAYMENT_STATUS_LOCKED,
+    Account,
+)
+from app.services.payment.crud import AccountCRUD, account_cache
+from app.services.payment.idempotency import transaction_index
+from app.services.payment.metrics import (
+    PAYMENT_OUTCOME_ERROR,
+    outcome_from_exception,
+)
+from app.services.payment.schemas import PaymentSchema
+from app.services.payment.utils import PaymentService
+
+logger = logging.getLogger(__name__)
+
+DEAD_LETTER_FILE = 'dead_letter.ndjson'
+# Пауза перед повторной попыткой после временной ошибки БД.
+APPLY_RETRY_DELAY: float = 1.0
+
+PAYMENT_JOURNAL_APPLIED = counter(
+    'payment_journal_applied_total',
+    'Исходы применения записей журнала платежей',
+    labelnames=('outcome',),
+)
+
+
+def encode_payment(payment_dict: dict) -> bytes:
+    # Сумма хранится строкой: float исказил бы подписанное значение.
+    return json.dumps(
+        {**payment_dict, 'amount': str(payment_dict['amount'])},
+        separators=(',', ':'),
+    ).encode()
+
+
+def decode_payment(payload: bytes) -> dict:
+    return PaymentSchema(**json.loads(payload)).dict()
+
+
+def _parse_dead_letter(payload: bytes):
+    """Платеж для файла dead letter: разобранный JSON или, если запись
+    не разбирается, ее текст."""
+    try:
+        return json.loads(payload)
+    except ValueError:
+        return payload.decode('utf-8', errors='replace')
+
+
+def _is_db_unavailable(error: Exception) -> bool:
+    """Ошибка связана с недоступностью БД, а не с самими платежами."""
+    return isinstance(
+        error,
+        (OperationalError, InterfaceError, OSError, asyncio.TimeoutError),
+    ) or getattr(error, 'connection_invalidated', False)
+
+
+class PaymentJournal:
+    """Прием платежей через журнал предзаписи.
+
+    Эндпоинт проверяет подпись, добавляет платеж в журнал и отвечает
+    202 сразу после сохранения записи на диск, не дожидаясь БД. Фоновая
+    задача применяет записи журнала по порядку пачками: каждый платеж
+    проводится PaymentService в своем savepoint, пачка фиксируется одним
+    commit, после чего позиция журнала сдвигается.
+
+    После сбоя записи с контрольной точки применяются повторно;
+    transaction_id, уже записанные в payment, пропускаются как
+    дубликаты. Временные ошибки БД повторяются до max_attempts раз,
+    после чего платеж, как и платеж с постоянной ошибкой или запись,
+    которая не разбирается, уходит в файл dead_letter.ndjson в папке
+    журнала.
+
+    Если падает вся пачка (например, commit), записи этой пачки
+    применяются по одной. Запись, которая падает max_attempts раз
+    подряд, уходит в dead letter, чтобы не останавливать весь журнал.
+    Ошибки недоступности БД в этот счет не входят: они повторяются,
+    пока БД не вернется.
+    """
+
+    def __init__(
+        self,
+        journal: WriteAheadJournal,
+        batch_size: int,
+        max_attempts: int,
+    ):
+        self.journal = journal
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.dead_letter_path = os.path.join(
+            journal.directory, DEAD_LETTER_FILE
+        )
+        self.service = PaymentService(
+            secret_key=settings.secret_key,
+            fast_path=settings.payment_fast_path,
+            transaction_index=transaction_index,
+            outbox=settings.outbox_enabled,
+        )
+        self.crud = AccountCRUD(Account, account_cache=account_cache)
+        self._position: Position = (0, 0)
+        self._attempts: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None
+
+    def start(self):
+        """Восстанавливает журнал и запускает применение записей."""
+        if self.is_running:
+            return
+
+        self.journal.open()
+        self.journal.start()
+        self._position = self.journal.checkpoint
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if not self.is_running:
+            return
+
+        logger.info('Остановка применения журнала платежей')
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self.journal.stop()
+
+    async def append(self, payment_dict: dict):
+        """Сохраняет платеж в журнал и ждет записи на диск."""
+        await self.journal.append(encode_payment(payment_dict))
+
+    @property
+    def lag(self) -> int:
+        """Примерный объем журнала в байтах, еще не примененный к БД."""
+        segment, offset = self.journal.durable_position
+        return (
+            (segment - self._position[0]) * self.journal.segment_size
+            + offset
+            - self._position[1]
+        )
+
+    async def _run(self):
+        # Конец пачки, упавшей целиком: до него записи применяются по
+        # одной, чтобы найти запись, из-за которой падает пачка.
+        isolate_until: Optional[Position] = None
+        failures = 0
+        while True:
+            isolating = (
+                isolate_until is not None and self._position < isolate_until
+            )
+            records, position = await self.journal.read(
+                self._position, 1 if isolating else self.batch_size
+            )
+            if not records:
+                self._position = position
+                await self.journal.wait_for_records(position)
+                continue
+
+            try:
+                applied, retry = await self._apply_batch(records)
+            except Exception as e:
+                logger.exception('Ошибка применения пачки журнала')
+                if len(records) > 1:
+                    isolate_until = records[-1][1]
+                elif not _is_db_unavailable(e):
+                    failures += 1
+                    if failures >= self.max_attempts:
+                        failures = 0
+                        await self._skip_record(*records[0], error=e)
+                        continue
+                await asyncio.sleep(APPLY_RETRY_DELAY)
+                continue
+
+            failures = 0
+            if applied is not None:
+                await self.journal.commit(applied)
+                self._position = applied
+            if retry:
+                await asyncio.sleep(APPLY_RETRY_DELAY)
+
+    async def _skip_record(
+        self, payload: bytes, position: Position, error: Exception
+    ):
+        """Отправляет запись в dead letter и сдвигает позицию за нее."""
+        await self._write_dead_letter(payload, error)
+        await self.journal.commit(position)
+        self._position = position
+
+    def _is_transient(self, error: Exception) -> bool:
+        if not isinstance(error, HTTPException):
+            return True
+        outcome = outcome_from_exception(error)
+        return outcome == PAYMENT_STATUS_LOCKED or (
+            outcome == PAYMENT_OUTCOME_ERROR and error.status_code >= 500
+        )
+
+    async def _apply_batch(
+        self, records: List[Tuple[bytes, Position]]
+    ) -> Tuple[Optional[Position], bool]:
+        """Применяет пачку записей одной транзакцией.
+
+        Возвращает позицию после последней примененной записи и признак
+        того, что пачка прервана временной ошибкой.
+        """
+        applied_position = None
+        applied = []
+        dead_letters = []
+        retry = False
+
+        async with AsyncSessionLocal() as session:
+            for payload, position in records:
+                try:
+                    payment_dict = decode_payment(payload)
+                except Exception as e:
+                    logger.error('Запись журнала не разбирается: %r', e)
+                    dead_letters.append((payload, e))
+                    applied_position = position
+                    continue
+
+                transaction_id = payment_dict['transaction_id']
+                bind_log_context(
+                    account_id=payment_dict['account_id'],
+                    transaction_id=transaction_id,
+                )
+                try:
+                    async with session.begin_nested():
+                        account = await self.crud.get_or_create_account(
+                            session=session,
+                            user_id=payment_dict['user_id'],
+                            account_id=payment_dict['account_id'],
+                        )
+                        await self.service.apply_transaction(
+                            session=session,
+                            payment_dict=payment_dict,
+                            account=account,
+                        )
+                except Exception as e:
+                    if (
+                        isinstance(e, HTTPException)
+                        and outcome_from_exception(e)
+                        == PAYMENT_STATUS_DUPLICATE
+                    ):
+                        logger.info('Повтор записи журнала пропущен')
+                        PAYMENT_JOURNAL_APPLIED.labels(
+                            PAYMENT_STATUS_DUPLICATE
+                        ).inc()
+                    elif self._is_transient(e) and (
+                        self._attempts.get(transaction_id, 0) + 1
+                        < self.max_attempts
+                    ):
+                        self._attempts[transaction_id] = (
+                            self._attempts.get(transaction_id, 0) + 1
+                        )
+                        logger.warning(
+                            'Временная ошибка применения платежа, '
+                            'попытка %s: %s',
+                            self._attempts[transaction_id],
+                            e,
+                        )
+                        retry = True
+                        break
+                    else:
+                        dead_letters.append((payload, e))
+                else:
+                    applied.append(transaction_id)
+
+                applied_position = position
+
+            if applied_position is None:
+                return None, retry
+            await session.commit()
+
+        for transaction_id in applied:
+            self._attempts.pop(transaction_id, None)
+            self.service.remember_transaction(transaction_id)
+            PAYMENT_JOURNAL_APPLIED.labels(PAYMENT_STATUS_COMPLETED).inc()
+        for payload, error in dead_letters:
+            await self._write_dead_letter(payload, error)
+        if applied:
+            logger.info('Из журнала применено платежей: %s', len(applied))
+
+        return applied_position, retry
+
+    def _append_dead_letter(self, line: str):
+        with open(self.dead_letter_path, 'a', encoding='utf-8') as file:
+            file.write(line)
+            file.flush()
+            os.fsync(file.fileno())
+
+    async def _write_dead_letter(self, payload: bytes, error: Exception):
+        payment = _parse_dead_letter(payload)
+        transaction_id = (
+            payment.get('transaction_id')
+            if isinstance(payment, dict)
+            else None
+        )
+        self._attempts.pop(transaction_id, None)
+        logger.error(
+            'Платеж %s не применен и записан в %s: %r',
+            transaction_id,
+            self.dead_letter_path,
+            error,
+        )
+        PAYMENT_JOURNAL_APPLIED.labels(PAYMENT_OUTCOME_ERROR).inc()
+        line = json.dumps(
+            {
+                'payment': payment,
+                'error': getattr(error, 'detail', None) or repr(error),
+                'failed_at': datetime.utcnow().isoformat(),
+            },
+            ensure_ascii=False,
+        )
+        await asyncio.get_running_loop().run_in_executor(
+            None, self._append_dead_letter, line + '\n'
+        )
+
+
+payment_journal: Optional[PaymentJournal] = (
+    PaymentJournal(
+        journal=WriteAheadJournal(
+            directory=settings.payment_journal_dir,
+            segment_size=settings.payment_journal_segment_size,
+            flush_interval=settings.payment_journal_flush_interval_ms / 1000,
+        ),
+        batch_size=settings.payment_journal_apply_batch_size,
+        max_attempts=settings.payment_journal_max_attempts,
+    )
+    if settings.payment_journal_enabled
+    else None
+)
+
+
+def _collect_journal_lag():
+    if payment_journal is None or not payment_journal.is_running:
+        return []
+    return [((), payment_journal.lag)]
+
+
+gauge(
+    'payment_journal_lag_bytes',
+    'Объем журнала платежей, еще не примененный к БД',
+    callback=_collect_journal_lag,
+)
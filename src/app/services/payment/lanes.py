@@ -0,0 +1,171 @@
+# Standart lib imports
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, List
+
+# Thirdparty imports
+from fastapi import HTTPException, status
+
+# Projects imports
+from app.core.config import settings
+from app.core.log import bind_log_context, get_log_context
+from app.core.metrics import gauge
+
+logger = logging.getLogger(__name__)
+
+
+class AccountLaneScheduler:
+    """Планировщик, выполняющий платежи одного аккаунта последовательно.
+
+    account_id хешируется в одну из фиксированного числа очередей
+    ("дорожек"), каждую из которых разбирает отдельный asyncio-воркер.
+    Платежи одного аккаунта выполняются строго по очереди внутри
+    процесса и не конкурируют за блокировку строки в БД. Очереди
+    ограничены: при переполнении запрос сразу получает 503.
+    """
+
+    def __init__(self, lanes_count: int, queue_size: int):
+        self.lanes_count = lanes_count
+        self.queue_size = queue_size
+        self._queues: List[asyncio.Queue] = []
+        self._workers: List[asyncio.Task] = []
+        self._processed = [0] * lanes_count
+        self._rejected = [0] * lanes_count
+        self._max_depth = [0] * lanes_count
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self._workers)
+
+    def start(self):
+        """Запускает воркеры дорожек в текущем event loop."""
+        if self.is_running:
+            return
+
+        logger.info('Запуск %s дорожек обработки платежей', self.lanes_count)
+        self._queues = [
+            asyncio.Queue(maxsize=self.queue_size)
+            for _ in range(self.lanes_count)
+        ]
+        self._workers = [
+            asyncio.create_task(self._worker(lane))
+            for lane in range(self.lanes_count)
+        ]
+
+    async def stop(self):
+        """Останавливает воркеры и отменяет ожидающие платежи."""
+        if not self.is_running:
+            return
+
+        logger.info('Остановка дорожек обработки платежей')
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+        for queue in self._queues:
+            while not queue.empty():
+                _, future, _ = queue.get_nowait()
+                future.cancel()
+
+        self._workers = []
+        self._queues = []
+
+    def get_lane(self, account_id: int) -> int:
+        return hash(account_id) % self.lanes_count
+
+    async def submit(
+        self,
+        account_id: int,
+        func: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """Ставит обработку платежа в дорожку аккаунта и ждет результат.
+
+        Исключения, выброшенные func, пробрасываются вызывающему коду.
+        При отмене вызывающего кода уже начатый func выполняется до
+        конца, поэтому он не должен использовать ресурсы запроса,
+        например его сессию БД.
+        """
+        self.start()
+
+        lane = self.get_lane(account_id)
+        queue = self._queues[lane]
+        future = asyncio.get_running_loop().create_future()
+
+        try:
+            queue.put_nowait((func, future, get_log_context()))
+        except asyncio.QueueFull:
+            self._rejected[lane] += 1
+            logger.warning(
+                'Очередь дорожки %s переполнена, платеж отклонен', lane
+            )
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail='Payment queue is full',
+                headers={'Retry-After': '1'},
+            )
+
+        self._max_depth[lane] = max(self._max_depth[lane], queue.qsize())
+        return await future
+
+    async def _worker(self, lane: int):
+        queue = self._queues[lane]
+
+        while True:
+            func, future, log_context = await queue.get()
+            try:
+                if future.cancelled():
+                    continue
+
+                bind_log_context(**log_context)
+                try:
+                    result = await func()
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+
+                self._processed[lane] += 1
+
+            finally:
+                # Воркер отменен в stop() посреди платежа: ожидающий
+                # запрос получает отмену, а не ждет результата вечно.
+                if not future.done():
+                    future.cancel()
+                queue.task_done()
+
+    def stats(self) -> List[dict]:
+        """Возвращает глубину очереди и счетчики по каждой дорожке."""
+        return [
+            {
+                'lane': lane,
+                'depth': self._queues[lane].qsize() if self._queues else 0,
+                'max_depth': self._max_depth[lane],
+                'processed': self._processed[lane],
+                'rejected': self._rejected[lane],
+            }
+            for lane in range(self.lanes_count)
+        ]
+
+
+lane_scheduler = AccountLaneScheduler(
+    lanes_count=settings.payment_lanes_count,
+    queue_size=settings.payment_lane_queue_size,
+)
+
+
+def _collect_lane_depths():
+    if not lane_scheduler.is_running:
+        return []
+    return [
+        ((stats['lane'],), stats['depth']) for stats in lane_scheduler.stats()
+    ]
+
+
+gauge(
+    'payment_lane_queue_depth',
+    'Глубина очереди дорожки обработки платежей',
+    callback=_collect_lane_depths,
+    labelnames=('lane',),
+)
@@ -0,0 +1,131 @@
+# Standart lib imports
+import logging
+import random
+from typing import Optional
+
+# Thirdparty imports
+from sqlalchemy.exc import DBAPIError, OperationalError
+
+# Projects imports
+from app.core.config import settings
+from app.core.metrics import counter, gauge
+
+logger = logging.getLogger(__name__)
+
+# Вес нового наблюдения в скользящем среднем времени ожидания блокировки.
+LOCK_WAIT_EWMA_ALPHA: float = 0.2
+# Таймаут блокировки — во столько раз больше среднего ожидания.
+LOCK_TIMEOUT_MULTIPLIER: float = 4.0
+
+# SQLSTATE lock_not_available: postgres не дождался блокировки за
+# lock_timeout. asyncpg поднимает LockNotAvailableError, которую
+# SQLAlchemy передает как DBAPIError с тем же sqlstate.
+LOCK_NOT_AVAILABLE_SQLSTATE = '55P03'
+# sqlite не дождался блокировки БД за busy timeout соединения.
+SQLITE_LOCKED_MESSAGE = 'database is locked'
+
+PAYMENT_LOCK_RETRIES = counter(
+    'payment_lock_retries_total',
+    'Повторные попытки блокировки аккаунта внутри запроса',
+)
+
+
+def is_lock_timeout(error: Exception) -> bool:
+    """Ошибка вызвана тем, что блокировку не удалось получить вовремя."""
+    if not isinstance(error, DBAPIError):
+        return False
+    if getattr(error.orig, 'sqlstate', None) == LOCK_NOT_AVAILABLE_SQLSTATE:
+        return True
+    return (
+        isinstance(error, OperationalError)
+        and SQLITE_LOCKED_MESSAGE in str(error.orig).lower()
+    )
+
+
+class LockRetryPolicy:
+    """Политика повторов блокировки строки аккаунта.
+
+    Таймаут блокировки подстраивается под наблюдаемое время ожидания:
+    это LOCK_TIMEOUT_MULTIPLIER скользящих средних ожидания, но не
+    меньше min_timeout и не больше max_timeout. Пока ожидание короткое,
+    запрос, попавший в затор, быстро отпускает очередь и повторяет
+    попытку после паузы; при общей медленной работе БД таймаут растет,
+    и запросы не отваливаются зря.
+
+    Паузы между попытками растут экспоненциально от base_delay до
+    max_delay со случайным разбросом (full jitter), а все попытки
+    укладываются в budget секунд на запрос. Если enabled выключен,
+    таймаут постоянен и повторов нет.
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        lock_timeout: float,
+        min_timeout: float,
+        max_timeout: float,
+        base_delay: float,
+        max_delay: float,
+        budget: float,
+    ):
+        self.enabled = enabled
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self._initial_timeout = lock_timeout
+        self._avg_wait = lock_timeout / LOCK_TIMEOUT_MULTIPLIER
+
+    @property
+    def lock_timeout(self) -> float:
+        """Текущий таймаут блокировки в секундах."""
+        if not self.enabled:
+            return self._initial_timeout
+        return min(
+            self.max_timeout,
+            max(self.min_timeout, self._avg_wait * LOCK_TIMEOUT_MULTIPLIER),
+        )
+
+    def observe(self, wait: float):
+        """Учитывает время ожидания блокировки.
+
+        Для попытки, прерванной по таймауту, передается сам таймаут:
+        настоящее ожидание было бы не меньше.
+        """
+        self._avg_wait += LOCK_WAIT_EWMA_ALPHA * (wait - self._avg_wait)
+
+    def next_delay(self, attempt: int, elapsed: float) -> Optional[float]:
+        """Пауза перед повтором номер attempt (с нуля) или None, если
+        повторять нельзя: политика выключена или бюджет исчерпан."""
+        if not self.enabled:
+            return None
+
+        delay = random.uniform(
+            0, min(self.max_delay, self.base_delay * 2 ** attempt)
+        )
+        # Повтор имеет смысл, только если после паузы останется время
+        # хотя бы на одно ожидание блокировки.
+        if elapsed + delay + self.lock_timeout > self.budget:
+            return None
+
+        PAYMENT_LOCK_RETRIES.inc()
+        return delay
+
+
+lock_retry_policy = LockRetryPolicy(
+    enabled=settings.payment_lock_retry_enabled,
+    lock_timeout=settings.payment_lock_timeout_ms / 1000,
+    min_timeout=settings.payment_lock_timeout_min_ms / 1000,
+    max_timeout=settings.payment_lock_timeout_max_ms / 1000,
+    base_delay=settings.payment_lock_retry_base_delay_ms / 1000,
+    max_delay=settings.payment_lock_retry_max_delay_ms / 1000,
+    budget=settings.payment_lock_retry_budget_ms / 1000,
+)
+
+
+gauge(
+    'payment_lock_timeout_seconds',
+    'Текущий таймаут блокировки аккаунта',
+    callback=lambda: [((), lock_retry_policy.lock_timeout)],
+)
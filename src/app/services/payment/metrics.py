@@ -0,0 +1,51 @@
+from fastapi import HTTPException, status
+
+from app.core.metrics import counter, histogram
+from app.services.payment.config import (
+    PAYMENT_STATUS_ACCOUNT_NOT_FOUND,
+    PAYMENT_STATUS_DUPLICATE,
+    PAYMENT_STATUS_INVALID_SIGNATURE,
+    PAYMENT_STATUS_LOCKED,
+)
+
+PAYMENT_OUTCOME_OVERLOADED = 'overloaded'
+PAYMENT_OUTCOME_ERROR = 'error'
+
+PAYMENT_STAGE_SECONDS = histogram(
+    'payment_stage_seconds',
+    'Длительность этапов обработки платежа',
+    labelnames=('stage',),
+)
+PAYMENT_OUTCOMES = counter(
+    'payment_outcomes_total',
+    'Исходы обработки платежей',
+    labelnames=('outcome',),
+)
+
+
+def stage_timer(stage: str):
+    """Контекстный менеджер, измеряющий длительность этапа платежа."""
+    return PAYMENT_STAGE_SECONDS.labels(stage).time()
+
+
+def count_outcome(outcome: str):
+    PAYMENT_OUTCOMES.labels(outcome).inc()
+
+
+def outcome_from_exception(error: HTTPException) -> str:
+    """Определяет исход платежа по HTTPException сервиса."""
+    if error.status_code == status.HTTP_403_FORBIDDEN:
+        return PAYMENT_STATUS_INVALID_SIGNATURE
+    if error.status_code == status.HTTP_404_NOT_FOUND:
+        return PAYMENT_STATUS_ACCOUNT_NOT_FOUND
+    if error.status_code == status.HTTP_409_CONFLICT:
+        if isinstance(error.detail, dict):
+            return PAYMENT_STATUS_LOCKED
+        return PAYMENT_STATUS_DUPLICATE
+    if error.status_code in (
+        status.HTTP_429_TOO_MANY_REQUESTS,
+        status.HTTP_503_SERVICE_UNAVAILABLE,
+    ):
+        return PAYMENT_OUTCOME_OVERLOADED
+    return PAYMENT_OUTCOME_ERROR
+
@@ -0,0 +1,271 @@
+# Standart lib imports
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+# Thirdparty imports
+import httpx
+from sqlalchemy import delete, select, update
+
+# Projects imports
+from app.core.config import settings
+from app.core.db import AsyncSessionLocal
+from app.core.metrics import counter
+from app.services.payment.config import (
+    OUTBOX_EVENT_PAYMENT_COMPLETED,
+    Outbox,
+)
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_SINK_FILE = 'file'
+OUTBOX_SINK_HTTP = 'http'
+# Пауза перед повторной отправкой растет вдвое до этого предела.
+DISPATCH_MAX_BACKOFF: float = 30.0
+# Как часто удаляются события старше outbox_retention_hours.
+PURGE_INTERVAL: float = 60.0
+
+OUTBOX_EVENTS_SENT = counter(
+    'outbox_events_sent_total',
+    'События outbox, доставленные во внешнюю систему',
+    labelnames=('event_type',),
+)
+OUTBOX_DISPATCH_FAILURES = counter(
+    'outbox_dispatch_failures_total',
+    'Неудачные попытки доставки пачки событий outbox',
+)
+
+
+def payment_completed_event(
+    transaction_id: str, account_id: int, amount: int, new_balance: int
+) -> dict:
+    """Строка outbox о проведенном платеже; суммы в минорных единицах."""
+    return {
+        'event_type': OUTBOX_EVENT_PAYMENT_COMPLETED,
+        'payload': {
+            'transaction_id': transaction_id,
+            'account_id': account_id,
+            'amount': amount,
+            'new_balance': new_balance,
+        },
+    }
+
+
+def serialize_event(event: Outbox) -> dict:
+    """Событие в том виде, в каком его получает внешняя система.
+
+    id события неизменен при повторной доставке, по нему получатель
+    отбрасывает дубликаты.
+    """
+    return {
+        'id': event.id,
+        'type': event.event_type,
+        'created_at': event.created_at.isoformat(),
+        'payload': event.payload,
+    }
+
+
+class FileOutboxSink:
+    """Дописывает события в файл NDJSON и синхронизирует его с диском."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _write(self, events: List[dict]):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as file:
+            for event in events:
+                file.write(json.dumps(event, ensure_ascii=False) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+
+    async def send(self, events: List[dict]):
+        await asyncio.get_running_loop().run_in_executor(
+            None, self._write, events
+        )
+
+    async def close(self):
+        pass
+
+
+class HttpOutboxSink:
+    """Отправляет пачку событий одним POST с JSON-массивом; любой ответ,
+    кроме 2xx, считается неудачной доставкой."""
+
+    def __init__(self, url: str, timeout: float):
+        self.url = url
+        self._client = httpx.AsyncClient(timeout=timeout)
+
+    async def send(self, events: List[dict]):
+        response = await self._client.post(self.url, json=events)
+        response.raise_for_status()
+
+    async def close(self):
+        await self._client.aclose()
+
+
+OUTBOX_SINKS = {
+    OUTBOX_SINK_FILE: lambda: FileOutboxSink(path=settings.outbox_file_path),
+    OUTBOX_SINK_HTTP: lambda: HttpOutboxSink(
+        url=settings.outbox_http_url, timeout=settings.outbox_http_timeout
+    ),
+}
+
+
+class OutboxDispatcher:
+    """Доставляет события outbox во внешнюю систему.
+
+    Фоновая задача забирает неотправленные события пачками по порядку
+    id, отправляет пачку в sink и в той же транзакции отмечает события
+    отправленными. На postgres строки забираются через
+    FOR UPDATE SKIP LOCKED, поэтому несколько процессов приложения
+    делят очередь без повторной отправки одних и тех же событий.
+
+    Доставка — не менее одного раза: если отметка об отправке не
+    сохранилась, пачка будет отправлена снова. После ошибки sink
+    попытки повторяются с растущей паузой, а счетчик attempts событий
+    увеличивается.
+    """
+
+    def __init__(
+        self,
+        sink,
+        batch_size: int,
+        poll_interval: float,
+        retention: float,
+    ):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._task: Optional[asyncio.Task] = None
+        self._purged_at = 0.0
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None
+
+    def start(self):
+        if self.is_running:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if not self.is_running:
+            return
+
+        logger.info('Остановка отправки событий outbox')
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self.sink.close()
+
+    async def _run(self):
+        backoff = self.poll_interval
+        while True:
+            try:
+                dispatched = await self.dispatch_batch()
+                await self._purge_sent()
+            except Exception as e:
+                OUTBOX_DISPATCH_FAILURES.inc()
+                logger.error(
+                    'Ошибка отправки событий outbox, повтор через %.1f с: '
+                    '%r',
+                    backoff,
+                    e,
+                )
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, DISPATCH_MAX_BACKOFF)
+                continue
+
+            backoff = self.poll_interval
+            # Полная пачка — вероятно, есть еще события, паузы нет.
+            if dispatched < self.batch_size:
+                await asyncio.sleep(self.poll_interval)
+
+    async def dispatch_batch(self) -> int:
+        """Отправляет одну пачку событий; возвращает ее размер."""
+        async with AsyncSessionLocal() as session:
+            stmt = (
+                select(Outbox)
+                .where(Outbox.sent_at.is_(None))
+                .order_by(Outbox.id)
+                .limit(self.batch_size)
+            )
+            if session.bind.dialect.name == 'postgresql':
+                stmt = stmt.with_for_update(skip_locked=True)
+            events = (await session.execute(stmt)).scalars().all()
+            if not events:
+                return 0
+
+            ids = [event.id for event in events]
+            try:
+                await self.sink.send([serialize_event(e) for e in events])
+            except Exception:
+                await session.rollback()
+                await self._count_attempt(ids)
+                raise
+
+            await session.execute(
+                update(Outbox)
+                .where(Outbox.id.in_(ids))
+                .values(
+                    sent_at=datetime.utcnow(), attempts=Outbox.attempts + 1
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+
+        for event in events:
+            OUTBOX_EVENTS_SENT.labels(event.event_type).inc()
+        logger.info('Отправлено событий outbox: %s', len(events))
+        return len(events)
+
+    @staticmethod
+    async def _count_attempt(ids: List[int]):
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                update(Outbox)
+                .where(Outbox.id.in_(ids))
+                .values(attempts=Outbox.attempts + 1)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+
+    async def _purge_sent(self):
+        if time.monotonic() - self._purged_at < PURGE_INTERVAL:
+            return
+        self._purged_at = time.monotonic()
+
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                delete(Outbox)
+                .where(
+                    Outbox.sent_at
+                    < datetime.utcnow() - timedelta(seconds=self.retention)
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+        if result.rowcount:
+            logger.info(
+                'Удалено отправленных событий outbox: %s', result.rowcount
+            )
+
+
+outbox_dispatcher: Optional[OutboxDispatcher] = (
+    OutboxDispatcher(
+        sink=OUTBOX_SINKS[settings.outbox_sink](),
+        batch_size=settings.outbox_batch_size,
+        poll_interval=settings.outbox_poll_interval,
+        retention=settings.outbox_retention_hours * 3600,
+    )
+    if settings.outbox_enabled
+    else None
+)
@@ -1,13 +1,17 @@
 from datetime import datetime
 from decimal import Decimal
+from typing import List, Optional
 
 from pydantic import BaseModel, validator, Field
 
+from app.core.money import MoneyAmount
+from app.services.payment.config import TRANSACTION_ID_MAX_LENGTH
+
 
 class PaymentSchema(BaseModel):
     """pydantic-схема для получения данных о платеже."""
 
-    transaction_id: str
+    transaction_id: str = Field(..., max_length=TRANSACTION_ID_MAX_LENGTH)
     account_id: int
     user_id: int
     amount: Decimal = Field(..., gt=0)
@@ -24,7 +28,7 @@ class ReturnPaymentSchema(BaseModel):
     id: int
     transaction_id: str
     account_id: int
-    payment_amount: Decimal
+    payment_amount: MoneyAmount
 
     class Config:
         orm_mode = True
@@ -34,7 +38,7 @@ class ReturnAccountSchema(BaseModel):
 
     id: int
     user_id: int
-    balance: Decimal
+    balance: MoneyAmount
     created_at: datetime
     updated_at: datetime
 
@@ -44,15 +48,108 @@ class ReturnAccountSchema(BaseModel):
 
 class PaymentTransactionResponse(BaseModel):
     transaction_id: str
-    amount: Decimal
+    amount: MoneyAmount
 
 
 class PaymentAccountBalanceResponse(BaseModel):
     account_id: int
-    new_balance: Decimal
+    new_balance: MoneyAmount
 
 
 class PaymentResponse(BaseModel):
     status: str
     transaction: PaymentTransactionResponse
     account: PaymentAccountBalanceResponse
+
+
+class PaymentAcceptedResponse(BaseModel):
+    """Ответ на платеж, принятый в журнал и еще не проведенный."""
+
+    status: str
+    transaction_id: str
+
+
+class PaymentBatchItemResult(BaseModel):
+    """Результат обработки одного платежа из пакета."""
+
+    transaction_id: str
+    status: str
+    account_id: Optional[int]
+    new_balance: Optional[MoneyAmount]
+    detail: Optional[str]
+
+
+class PaymentBatchResponse(BaseModel):
+    results: List[PaymentBatchItemResult]
+
+
+class PaymentLaneStats(BaseModel):
+    lane: int
+    depth: int
+    max_depth: int
+    processed: int
+    rejected: int
+
+
+class DatabasePoolStats(BaseModel):
+    pool_class: str
+    checkouts: int
+    avg_checkout_wait: float
+    max_checkout_wait: float
+    size: Optional[int]
+    checked_in: Optional[int]
+    checked_out: Optional[int]
+    overflow: Optional[int]
+
+
+class PaymentAdmissionLimits(BaseModel):
+    """Новые лимиты контроля допуска; пустые поля не меняются."""
+
+    max_in_flight: Optional[int] = Field(None, ge=1)
+    max_per_account: Optional[int] = Field(None, ge=1)
+    queue_size: Optional[int] = Field(None, ge=0)
+    queue_timeout: Optional[float] = Field(None, ge=0)
+    retry_after: Optional[int] = Field(None, ge=0)
+
+
+class PaymentAdmissionStats(BaseModel):
+    max_in_flight: int
+    max_per_account: int
+    queue_size: int
+    queue_timeout: float
+    retry_after: int
+    in_flight: int
+    queued: int
+    accounts_in_flight: int
+    admitted: int
+    rejected: int
+
+
+class ProfileStart(BaseModel):
+    """Окно профилирования всех запросов."""
+
+    seconds: float = Field(..., gt=0)
+    reset: bool = True
+
+
+class ProfileRequestStats(BaseModel):
+    path: str
+    count: int
+    total_time: float
+    max_time: float
+
+
+class ProfileFunctionStats(BaseModel):
+    function: str
+    ncalls: int
+    primitive_calls: int
+    tottime: float
+    cumtime: float
+
+
+class ProfileSummary(BaseModel):
+    sample_rate: float
+    window_remaining: float
+    collecting_since: datetime
+    requests: List[ProfileRequestStats]
+    functions: List[ProfileFunctionStats]
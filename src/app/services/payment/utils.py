@@ -1,21 +1,51 @@
 # Standart lib imports
+import asyncio
 import hashlib
 import hmac
 import logging
 import os
-from decimal import Decimal
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Set
 
 # Thirdparty imports
 from dotenv import load_dotenv
 from fastapi import Depends, HTTPException, status
-from sqlalchemy import select
+from sqlalchemy import insert, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.exc import OperationalError
+from sqlalchemy.exc import DBAPIError, IntegrityError
 
 # Projects imports
-from app.services.payment.config import Account, Payment
+from app.core.config import settings
+from app.core.db import get_current_transaction, is_within_transaction
+from app.core.money import from_minor_units, to_minor_units
+from app.services.payment.config import (
+    PAYMENT_STATUS_ACCOUNT_NOT_FOUND,
+    PAYMENT_STATUS_COMPLETED,
+    PAYMENT_STATUS_DUPLICATE,
+    PAYMENT_STATUS_INVALID_SIGNATURE,
+    PAYMENT_STATUS_LOCKED,
+    Account,
+    Outbox,
+    Payment,
+)
+from app.services.payment.crud import AccountCRUD
+from app.services.payment.idempotency import (
+    TransactionIdIndex,
+    transaction_index,
+)
+from app.services.payment.lock_retry import (
+    LockRetryPolicy,
+    is_lock_timeout,
+    lock_retry_policy,
+)
+from app.services.payment.metrics import stage_timer
+from app.services.payment.outbox import payment_completed_event
 from app.services.payment.schemas import (
     PaymentAccountBalanceResponse,
+    PaymentBatchItemResult,
+    PaymentBatchResponse,
     PaymentResponse,
     PaymentSchema,
     PaymentTransactionResponse,
@@ -25,56 +55,122 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Ключ Session.info с транзакцией, в которой задан SET LOCAL lock_timeout.
+LOCK_TIMEOUT_TRANSACTION_KEY = 'lock_timeout_transaction'
+
+
+def generate_signature(data: dict, secret_key: str) -> str:
+    """Вычисляет подпись платежа.
+
+    Функция не зависит от состояния сервиса, поэтому ее можно вызывать
+    в пуле процессов (см. app.core.import_payments).
+    """
+    data_without_sign = {k: v for k, v in data.items() if k != 'signature'}
+
+    sorted_keys = sorted(data_without_sign.keys())
+    concatenated = ''.join(str(data_without_sign[key]) for key in sorted_keys)
+    message = concatenated + secret_key
+
+    return hashlib.sha256(message.encode()).hexdigest()
 
-class PaymentService:
 
-    postgres_lock_timeout: float = 1.0
+class PaymentService:
 
-    def __init__(self, secret_key: str):
+    def __init__(
+        self,
+        secret_key: str,
+        fast_path: bool = False,
+        transaction_index: Optional[TransactionIdIndex] = None,
+        lock_retry: LockRetryPolicy = lock_retry_policy,
+        outbox: bool = False,
+    ):
         self.secret_key = secret_key
+        self.fast_path = fast_path
+        self.transaction_index = transaction_index
+        self.lock_retry = lock_retry
+        self.outbox = outbox
 
     async def _generate_signature(self, data: dict) -> str:
         """Метод генерирует подпись."""
         logger.info('Генерация ожидаемой подписи')
-        data_without_sign = {k: v for k, v in data.items() if k != 'signature'}
-
-        sorted_keys = sorted(data_without_sign.keys())
-        concatenated = ''.join(
-            str(data_without_sign[key]) for key in sorted_keys
-        )
-        message = concatenated + self.secret_key
+        return generate_signature(data, self.secret_key)
 
-        return hashlib.sha256(message.encode()).hexdigest()
+    async def is_signature_valid(self, data: dict) -> bool:
+        """Метод сверяет подпись платежа с ожидаемой."""
+        expected_sign = await self._generate_signature(data)
+        return hmac.compare_digest(expected_sign, data['signature'])
 
     async def verify_signature(self, data: dict):
         """Метод проверяет подпись."""
         logger.info('Проверка подписи платежа')
-        expected_sign = await self._generate_signature(data)
 
-        if not hmac.compare_digest(expected_sign, data['signature']):
+        if not await self.is_signature_valid(data):
             logger.warning('Подпись невалидна')
             raise HTTPException(status.HTTP_403_FORBIDDEN, 'Invalid signature')
 
+    @staticmethod
+    async def _rollback(session: AsyncSession):
+        """Откатывает транзакцию сессии при ошибке платежа.
+
+        Внутри savepoint откат выполняет begin_nested() при выходе с
+        исключением, а внешняя транзакция с другими платежами группы
+        должна остаться нетронутой.
+        """
+        if not session.in_nested_transaction():
+            await session.rollback()
+
+    def remember_transaction(self, transaction_id: str):
+        if self.transaction_index is not None:
+            self.transaction_index.add(transaction_id)
+
+    def _raise_duplicate(self, transaction_id: str):
+        logger.warning('Данная транзакция уже обработана')
+        self.remember_transaction(transaction_id)
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail='Transaction already processed',
+        )
+
+    async def reject_known_duplicate(self, data: dict):
+        """Метод отклоняет повторный платеж без обращения к БД.
+
+        Срабатывает только для transaction_id из индекса недавних
+        транзакций. Подпись проверяется заранее, чтобы не раскрывать
+        наличие транзакции по неподписанному запросу.
+        """
+        if self.transaction_index is None:
+            return
+
+        if self.transaction_index.is_known_duplicate(data['transaction_id']):
+            await self.verify_signature(data)
+            self._raise_duplicate(data['transaction_id'])
+
     async def create_transaction(
         self,
         account_id: int,
         transaction_id: str,
-        amount: Decimal,
+        amount: int,
         session: AsyncSession,
     ) -> Payment:
-        """Метод создает запись о транзакции."""
-        instance = await session.execute(
-            select(Payment).where(Payment.transaction_id == transaction_id)
-        )
+        """Метод создает запись о транзакции.
+
+        amount передается в минорных единицах.
+        """
+        if (
+            self.transaction_index is None
+            or self.transaction_index.might_exist(transaction_id)
+        ):
+            with stage_timer('duplicate_check'):
+                instance = await session.execute(
+                    select(Payment).where(
+                        Payment.transaction_id == transaction_id
+                    )
+                )
 
-        logger.info('Проверка дубликатов')
-        if instance.scalars().first():
-            logger.warning('Данная транзакция уже обработана')
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail='Transaction already processed',
-            )
-        logger.info('Дубликатов не найдено')
+            logger.info('Проверка дубликатов')
+            if instance.scalars().first():
+                self._raise_duplicate(transaction_id)
+            logger.info('Дубликатов не найдено')
 
         transaction = Payment(
             account_id=account_id,
@@ -83,41 +179,35 @@ class PaymentService:
         )
 
         session.add(transaction)
-        await session.flush()
+        try:
+            with stage_timer('insert'):
+                await session.flush()
+        except IntegrityError:
+            await self._rollback(session)
+            self._raise_duplicate(transaction_id)
 
         return transaction
 
-    async def update_account_balance(
-        self, session: AsyncSession, account: Account, amount: Decimal
+    async def _handle_balance_error(
+        self, session: AsyncSession, account_id: int, error: Exception
     ):
-        """Метод обновляет баланс счета."""
-        try:
-            locked_account = await session.execute(
-                select(Account)
-                .where(Account.id == account.id)
-                .with_for_update(of=Account)
-                .execution_options(
-                    postgresql_lock_timeout=self.postgres_lock_timeout
-                )
-            )
-            locked_account = locked_account.scalars().one()
-
-            locked_account.balance += amount
+        """Метод откатывает транзакцию и пробрасывает ошибку обновления
+        баланса в виде HTTPException."""
+        await self._rollback(session)
 
-        except OperationalError as e:
-            await session.rollback()
-            if 'lock timeout' in str(e).lower():
+        if isinstance(error, DBAPIError):
+            if is_lock_timeout(error):
                 logger.error(
                     'Ошибка обновления баланса аккаунта '
-                    f'Account_id: {account.id} '
-                    '-- аккаунт временно заблокирован'
+                    'Account_id: %s -- аккаунт временно заблокирован',
+                    account_id,
                 )
                 raise HTTPException(
                     status_code=status.HTTP_409_CONFLICT,
                     detail={
                         'message': 'Account locked',
-                        'retry_after': self.postgres_lock_timeout,
-                        'account_id': account.id,
+                        'retry_after': self.lock_retry.lock_timeout,
+                        'account_id': account_id,
                     },
                 )
             raise HTTPException(
@@ -125,21 +215,125 @@ class PaymentService:
                 'Database operation failed',
             )
 
-        except Exception as e:
-            await session.rollback()
-            logger.critical(
-                f'Unexpected error updating account {account.id}: {str(e)}',
-                exc_info=True,
+        logger.critical(
+            'Unexpected error updating account %s: %s',
+            account_id,
+            error,
+            exc_info=True,
+        )
+        raise HTTPException(
+            status.HTTP_500_INTERNAL_SERVER_ERROR, 'Internal server error'
+        )
+
+    @staticmethod
+    async def _set_lock_timeout(session: AsyncSession, timeout: float):
+        """Задает таймаут ожидания блокировки до конца транзакции.
+
+        SET LOCAL выполняется один раз на транзакцию. Откат savepoint, в
+        котором он был выполнен, отменяет и таймаут, поэтому в другом
+        savepoint той же транзакции он задается заново.
+
+        В sqlite таймаута блокировки строк нет, там ожидание ограничено
+        busy timeout соединения.
+        """
+        if session.bind.dialect.name != 'postgresql':
+            return
+
+        set_in = session.info.get(LOCK_TIMEOUT_TRANSACTION_KEY)
+        current = get_current_transaction(session)
+        if set_in is not None and is_within_transaction(current, set_in):
+            return
+
+        await session.execute(
+            text(f"SET LOCAL lock_timeout = '{int(timeout * 1000)}ms'")
+        )
+        session.info[LOCK_TIMEOUT_TRANSACTION_KEY] = current
+
+    async def _run_locking_stage(self, session: AsyncSession, stage):
+        """Выполняет этап с блокировкой аккаунта, повторяя его по
+        таймауту блокировки согласно self.lock_retry.
+
+        Таймаут блокировки задается один раз на транзакцию. Если повторы
+        выключены, этап выполняется без savepoint, и таймаут откатывает
+        весь платеж. Иначе каждая попытка идет в своем savepoint, поэтому
+        таймаут откатывает только ее, а не уже созданную запись о
+        платеже. Возвращает результат stage(); если повторы исчерпаны,
+        пробрасывает последнюю ошибку.
+        """
+        lock_timeout = self.lock_retry.lock_timeout
+        await self._set_lock_timeout(session, lock_timeout)
+        if not self.lock_retry.enabled:
+            with stage_timer('lock_wait'):
+                return await stage()
+
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt_started = time.monotonic()
+            try:
+                with stage_timer('lock_wait'):
+                    async with session.begin_nested():
+                        result = await stage()
+            except DBAPIError as e:
+                if not is_lock_timeout(e):
+                    raise
+                self.lock_retry.observe(lock_timeout)
+                delay = self.lock_retry.next_delay(
+                    attempt, time.monotonic() - started
+                )
+                if delay is None:
+                    raise
+                logger.warning(
+                    'Аккаунт заблокирован, повтор через %.3f с', delay
+                )
+                attempt += 1
+                await asyncio.sleep(delay)
+            else:
+                self.lock_retry.observe(time.monotonic() - attempt_started)
+                return result
+
+    @staticmethod
+    async def _lock_account(session: AsyncSession, account_id: int) -> Account:
+        """Метод блокирует строку аккаунта и перечитывает ее."""
+        result = await session.execute(
+            select(Account)
+            .where(Account.id == account_id)
+            .with_for_update(of=Account)
+            .execution_options(populate_existing=True)
+        )
+        return result.scalars().one()
+
+    async def update_account_balance(
+        self, session: AsyncSession, account: Account, amount: int
+    ) -> Account:
+        """Метод обновляет баланс счета на amount минорных единиц.
+
+        Возвращает заблокированный аккаунт с новым балансом. Баланс
+        перечитывается под блокировкой (populate_existing), даже если
+        аккаунт уже загружен в сессию.
+        """
+
+        try:
+            locked_account = await self._run_locking_stage(
+                session,
+                lambda: self._lock_account(
+                    session=session, account_id=account.id
+                ),
             )
-            raise HTTPException(
-                status.HTTP_500_INTERNAL_SERVER_ERROR, 'Internal server error'
+            locked_account.balance += amount
+
+        except Exception as e:
+            await self._handle_balance_error(
+                session=session, account_id=account.id, error=e
             )
 
+        return locked_account
+
     def _build_response(
         self, account: Account, transaction: Payment
     ) -> PaymentResponse:
         return PaymentResponse(
-            status='completed',
+            status=PAYMENT_STATUS_COMPLETED,
             transaction=PaymentTransactionResponse(
                 transaction_id=transaction.transaction_id,
                 amount=transaction.payment_amount,
@@ -158,30 +352,405 @@ class PaymentService:
 
         logger.info('Начат процесс транзакции')
 
-        await self.verify_signature(payment_dict)
+        with stage_timer('signature'):
+            await self.verify_signature(payment_dict)
         logger.info('Подпись успешно проверена')
 
+        response = await self.apply_transaction(
+            session=session, payment_dict=payment_dict, account=account
+        )
+        with stage_timer('commit'):
+            await session.commit()
+        self.remember_transaction(payment_dict['transaction_id'])
+        logger.info('Баланс успешно обновлен')
+
+        return response
+
+    async def apply_transaction(
+        self,
+        session: AsyncSession,
+        payment_dict: dict,
+        account: Account,
+    ) -> PaymentResponse:
+        """Метод проводит платеж в текущей транзакции сессии.
+
+        Подпись не проверяется и commit не выполняется: это делает
+        вызывающий код, будь то process_transaction или групповой
+        commit, где платеж выполняется в своем savepoint. Событие
+        outbox о платеже добавляется в ту же транзакцию.
+        """
+        amount = to_minor_units(payment_dict['amount'])
+        if self.fast_path:
+            response = await self._apply_transaction_fast(
+                session=session,
+                transaction_id=payment_dict['transaction_id'],
+                amount=amount,
+                account_id=account.id,
+            )
+        else:
+            response = await self._apply_transaction_orm(
+                session=session,
+                transaction_id=payment_dict['transaction_id'],
+                amount=amount,
+                account=account,
+            )
+
+        if self.outbox:
+            session.add(
+                Outbox(
+                    **payment_completed_event(
+                        transaction_id=response.transaction.transaction_id,
+                        account_id=response.account.account_id,
+                        amount=amount,
+                        new_balance=to_minor_units(
+                            response.account.new_balance
+                        ),
+                    )
+                )
+            )
+        return response
+
+    async def _apply_transaction_orm(
+        self,
+        session: AsyncSession,
+        transaction_id: str,
+        amount: int,
+        account: Account,
+    ) -> PaymentResponse:
+        """Метод проводит платеж через ORM: проверка дубликатов,
+        создание записи и обновление баланса под блокировкой."""
         logger.info('Созданине записи о платеже')
         transaction = await self.create_transaction(
             session=session,
             account_id=account.id,
-            transaction_id=payment_dict['transaction_id'],
-            amount=payment_dict['amount'],
+            transaction_id=transaction_id,
+            amount=amount,
         )
         logger.info('Запись о платеже успешно создана')
 
         logger.info('Обновление баланса аккаунта')
-        await self.update_account_balance(
+        account = await self.update_account_balance(
             session=session,
             account=account,
             amount=transaction.payment_amount,
         )
-        await session.commit()
-        logger.info('Баланс успешно обновлен')
 
         logger.info('Генерация ответа')
         return self._build_response(account=account, transaction=transaction)
 
+    async def _insert_transaction_fast(
+        self,
+        session: AsyncSession,
+        account_id: int,
+        transaction_id: str,
+        amount: int,
+    ) -> bool:
+        """Метод атомарно создает запись о транзакции.
+
+        Проверка дубликатов выполняется самой БД через
+        INSERT ... ON CONFLICT (transaction_id) DO NOTHING, поэтому
+        параллельные запросы с одним transaction_id не гоняются друг с
+        другом. Возвращает False, если транзакция уже была обработана.
+        """
+        is_postgres = session.bind.dialect.name == 'postgresql'
+        dialect_insert = postgresql.insert if is_postgres else sqlite.insert
+        stmt = (
+            dialect_insert(Payment)
+            .values(
+                account_id=account_id,
+                transaction_id=transaction_id,
+                payment_amount=amount,
+            )
+            .on_conflict_do_nothing(index_elements=[Payment.transaction_id])
+        )
+
+        if is_postgres:
+            result = await session.execute(stmt.returning(Payment.id))
+            return result.scalar() is not None
+
+        # SQLAlchemy 1.4 не поддерживает RETURNING для sqlite.
+        result = await session.execute(stmt)
+        return result.rowcount > 0
+
+    async def _increment_balance_fast(
+        self, session: AsyncSession, account_id: int, amount: int
+    ) -> int:
+        """Метод атомарно увеличивает баланс счета и возвращает новый.
+
+        Суммы передаются и возвращаются в минорных единицах.
+        """
+        stmt = (
+            update(Account)
+            .where(Account.id == account_id)
+            .values(balance=Account.balance + amount)
+            .execution_options(synchronize_session=False)
+        )
+
+        if session.bind.dialect.name == 'postgresql':
+            result = await session.execute(stmt.returning(Account.balance))
+            return result.scalar_one()
+
+        await session.execute(stmt)
+        result = await session.execute(
+            select(Account.balance).where(Account.id == account_id)
+        )
+        return result.scalar_one()
+
+    async def _apply_transaction_fast(
+        self,
+        session: AsyncSession,
+        transaction_id: str,
+        amount: int,
+        account_id: int,
+    ) -> PaymentResponse:
+        """Метод проводит транзакцию за минимальное число запросов к БД.
+
+        Вместо SELECT на дубликаты, INSERT, SELECT ... FOR UPDATE и
+        UPDATE через ORM выполняются два запроса: INSERT ... ON CONFLICT
+        и UPDATE ... RETURNING.
+        """
+        logger.info('Созданине записи о платеже')
+        with stage_timer('insert'):
+            created = await self._insert_transaction_fast(
+                session=session,
+                account_id=account_id,
+                transaction_id=transaction_id,
+                amount=amount,
+            )
+        if not created:
+            await self._rollback(session)
+            self._raise_duplicate(transaction_id)
+
+        logger.info('Обновление баланса аккаунта')
+        try:
+            new_balance = await self._run_locking_stage(
+                session,
+                lambda: self._increment_balance_fast(
+                    session=session, account_id=account_id, amount=amount
+                ),
+            )
+        except Exception as e:
+            await self._handle_balance_error(
+                session=session, account_id=account_id, error=e
+            )
+
+        return PaymentResponse(
+            status=PAYMENT_STATUS_COMPLETED,
+            transaction=PaymentTransactionResponse(
+                transaction_id=transaction_id,
+                amount=amount,
+            ),
+            account=PaymentAccountBalanceResponse(
+                account_id=account_id, new_balance=new_balance
+            ),
+        )
+
+    async def _lock_accounts(
+        self, session: AsyncSession, account_ids: List[int]
+    ) -> Dict[int, Account]:
+        """Метод блокирует аккаунты пакета платежей.
+
+        Аккаунты блокируются по возрастанию id, чтобы параллельные пакеты
+        не попадали в deadlock. Каждая блокировка берется в savepoint:
+        аккаунт, который не удалось заблокировать за текущий таймаут
+        self.lock_retry, пропускается, не отменяя весь пакет.
+        """
+        locked = {}
+        await self._set_lock_timeout(session, self.lock_retry.lock_timeout)
+        for account_id in sorted(account_ids):
+            try:
+                async with session.begin_nested():
+                    locked[account_id] = await self._lock_account(
+                        session=session, account_id=account_id
+                    )
+
+            except DBAPIError as e:
+                if not is_lock_timeout(e):
+                    raise
+                logger.warning(
+                    'Аккаунт %s временно заблокирован, '
+                    'его платежи в пакете пропущены',
+                    account_id,
+                )
+
+        return locked
+
+    async def _insert_batch(
+        self, session: AsyncSession, rows: List[dict]
+    ) -> Set[str]:
+        """Метод создает записи о платежах пакета.
+
+        Запись с transaction_id, который параллельный запрос успел
+        провести после проверки дубликатов, пропускается через
+        ON CONFLICT (transaction_id) DO NOTHING, не отменяя остальные.
+        Возвращает transaction_id созданных записей.
+        """
+        is_postgres = session.bind.dialect.name == 'postgresql'
+        dialect_insert = postgresql.insert if is_postgres else sqlite.insert
+        stmt = dialect_insert(Payment).on_conflict_do_nothing(
+            index_elements=[Payment.transaction_id]
+        )
+
+        if is_postgres:
+            result = await session.execute(
+                stmt.values(rows).returning(Payment.transaction_id)
+            )
+            return set(result.scalars().all())
+
+        # SQLAlchemy 1.4 не поддерживает RETURNING для sqlite, поэтому
+        # созданные записи определяются по rowcount каждого INSERT.
+        inserted = set()
+        for row in rows:
+            result = await session.execute(stmt.values(row))
+            if result.rowcount > 0:
+                inserted.add(row['transaction_id'])
+        return inserted
+
+    async def process_batch(
+        self,
+        session: AsyncSession,
+        payment_dicts: List[dict],
+        crud: AccountCRUD,
+    ) -> PaymentBatchResponse:
+        """Метод обрабатывает пакет платежей.
+
+        Все платежи пакета проверяются по подписи, записываются в БД
+        одним INSERT, а баланс каждого затронутого аккаунта обновляется
+        одним UPDATE на всю сумму его платежей. Ошибка в отдельном
+        платеже не прерывает обработку пакета: для каждого платежа
+        возвращается свой статус. Платеж, который параллельный запрос
+        провел во время обработки пакета, получает статус duplicate,
+        остальные платежи пакета сохраняются.
+        """
+        logger.info('Начат процесс обработки пакета платежей')
+        results = [
+            PaymentBatchItemResult(
+                transaction_id=payment['transaction_id'],
+                status=PAYMENT_STATUS_COMPLETED,
+                account_id=payment['account_id'],
+            )
+            for payment in payment_dicts
+        ]
+
+        pending = []
+        seen_transactions = set()
+        for index, payment in enumerate(payment_dicts):
+            if not await self.is_signature_valid(payment):
+                results[index].status = PAYMENT_STATUS_INVALID_SIGNATURE
+                results[index].detail = 'Invalid signature'
+            elif payment['transaction_id'] in seen_transactions or (
+                self.transaction_index is not None
+                and self.transaction_index.is_known_duplicate(
+                    payment['transaction_id']
+                )
+            ):
+                results[index].status = PAYMENT_STATUS_DUPLICATE
+                results[index].detail = 'Transaction already processed'
+            else:
+                seen_transactions.add(payment['transaction_id'])
+                pending.append(index)
+        logger.info('Подписи пакета проверены')
+
+        if seen_transactions:
+            existing = await session.execute(
+                select(Payment.transaction_id).where(
+                    Payment.transaction_id.in_(seen_transactions)
+                )
+            )
+            existing = set(existing.scalars().all())
+            for index in pending:
+                if payment_dicts[index]['transaction_id'] in existing:
+                    results[index].status = PAYMENT_STATUS_DUPLICATE
+                    results[index].detail = 'Transaction already processed'
+            pending = [
+                index for index in pending
+                if results[index].status == PAYMENT_STATUS_COMPLETED
+            ]
+        logger.info('Проверка дубликатов пакета завершена')
+
+        if not pending:
+            return PaymentBatchResponse(results=results)
+
+        accounts = await crud.get_or_create_accounts(
+            session=session,
+            pairs=(
+                (
+                    payment_dicts[index]['user_id'],
+                    payment_dicts[index]['account_id'],
+                )
+                for index in pending
+            ),
+        )
+        locked_accounts = await self._lock_accounts(
+            session=session,
+            account_ids=list({account.id for account in accounts.values()}),
+        )
+
+        rows = {}
+        for index in pending:
+            payment = payment_dicts[index]
+            account = accounts.get((payment['user_id'], payment['account_id']))
+            if account is None:
+                results[index].status = PAYMENT_STATUS_ACCOUNT_NOT_FOUND
+                results[index].detail = 'Account not found'
+                continue
+            results[index].account_id = account.id
+
+            if account.id not in locked_accounts:
+                results[index].status = PAYMENT_STATUS_LOCKED
+                results[index].detail = 'Account locked'
+                continue
+
+            rows[index] = {
+                'account_id': account.id,
+                'transaction_id': payment['transaction_id'],
+                'payment_amount': to_minor_units(payment['amount']),
+            }
+
+        inserted = set()
+        if rows:
+            logger.info('Создание записей о платежах пакета: %s', len(rows))
+            inserted = await self._insert_batch(
+                session=session, rows=list(rows.values())
+            )
+
+        events = []
+        deltas = defaultdict(int)
+        for index, row in rows.items():
+            if row['transaction_id'] not in inserted:
+                # Платеж с тем же transaction_id провел параллельный
+                # запрос после проверки дубликатов выше.
+                results[index].status = PAYMENT_STATUS_DUPLICATE
+                results[index].detail = 'Transaction already processed'
+                continue
+
+            account_id = row['account_id']
+            deltas[account_id] += row['payment_amount']
+            new_balance = (
+                locked_accounts[account_id].balance + deltas[account_id]
+            )
+            results[index].new_balance = from_minor_units(new_balance)
+            events.append(
+                payment_completed_event(
+                    transaction_id=row['transaction_id'],
+                    account_id=account_id,
+                    amount=row['payment_amount'],
+                    new_balance=new_balance,
+                )
+            )
+
+        if events and self.outbox:
+            await session.execute(insert(Outbox).values(events))
+        for account_id, delta in deltas.items():
+            locked_accounts[account_id].balance += delta
+
+        await session.commit()
+        for row in rows.values():
+            self.remember_transaction(row['transaction_id'])
+        logger.info('Пакет платежей обработан')
+
+        return PaymentBatchResponse(results=results)
+
 
 async def get_secret_key():
     """Возвращает SECRET_KEY из переменных окружения."""
@@ -191,4 +760,9 @@ async def get_secret_key():
 async def get_payment_service(
     secret_key: str = Depends(get_secret_key),
 ) -> PaymentService:
-    return PaymentService(secret_key=secret_key)
+    return PaymentService(
+        secret_key=secret_key,
+        fast_path=settings.payment_fast_path,
+        transaction_index=transaction_index,
+        outbox=settings.outbox_enabled,
+    )
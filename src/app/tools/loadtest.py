@@ -0,0 +1,407 @@
+"""Нагрузочный тест платежного сервиса.
+
+Генерирует подписанные платежи (или воспроизводит их из NDJSON-файла),
+отправляет их в /api/payment и читающие эндпоинты с заданной
+конкурентностью и печатает пропускную способность, перцентили задержек
+и разбивку ответов по исходам.
+
+Примеры запуска из папки `src`:
+
+    python -m app.tools.loadtest --in-process --requests 2000
+    python -m app.tools.loadtest --base-url http://localhost:8000 \\
+        --concurrency 64 --skew zipf --duplicate-ratio 0.05 \\
+        --save-baseline baseline.json
+    python -m app.tools.loadtest --compare baseline.json
+"""
+# Standart lib imports
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import random
+import sys
+import time
+from collections import Counter, defaultdict, deque
+from decimal import Decimal
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Thirdparty imports
+import httpx
+
+# Projects imports
+from app.core.config import settings
+from app.services.payment.utils import generate_signature
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_FIELDS = ('transaction_id', 'account_id', 'user_id', 'amount')
+READ_PATHS = ('/api/payment', '/api/account')
+PERCENTILES = (50, 95, 99)
+RECENT_PAYMENTS_SIZE = 1000
+
+OUTCOME_COMPLETED = 'completed'
+OUTCOME_DUPLICATE = 'duplicate'
+OUTCOME_LOCK_TIMEOUT = 'lock_timeout'
+OUTCOME_INVALID_SIGNATURE = 'invalid_signature'
+OUTCOME_OVERLOADED = 'overloaded'
+OUTCOME_OK = 'ok'
+OUTCOME_ERROR = 'error'
+
+
+def parse_accounts(value: str) -> List[int]:
+    """Разбирает список аккаунтов вида `1-10` или `1,2,5`."""
+    accounts = []
+    for part in value.split(','):
+        if '-' in part:
+            first, last = part.split('-', 1)
+            accounts.extend(range(int(first), int(last) + 1))
+        else:
+            accounts.append(int(part))
+    return accounts
+
+
+def percentile(values: List[float], rank: float) -> float:
+    """Перцентиль по методу ближайшего ранга для отсортированного списка."""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, round(rank / 100 * len(values)) - 1))
+    return values[index]
+
+
+def classify_response(response: httpx.Response) -> str:
+    """Относит ответ сервиса к одному из исходов отчета."""
+    if response.status_code < 300:
+        if response.request.method == 'POST':
+            return OUTCOME_COMPLETED
+        return OUTCOME_OK
+    if response.status_code == 403:
+        return OUTCOME_INVALID_SIGNATURE
+    if response.status_code in (429, 503):
+        return OUTCOME_OVERLOADED
+    if response.status_code == 409:
+        try:
+            detail = response.json().get('detail')
+        except ValueError:
+            detail = None
+        if isinstance(detail, dict) and detail.get('message') == (
+            'Account locked'
+        ):
+            return OUTCOME_LOCK_TIMEOUT
+        return OUTCOME_DUPLICATE
+    return f'http_{response.status_code}'
+
+
+class PaymentGenerator:
+    """Источник платежей для нагрузки.
+
+    Платежи либо читаются из NDJSON-файла, либо генерируются: аккаунт
+    выбирается равномерно или по закону Ципфа (несколько "горячих"
+    аккаунтов получают большую часть платежей), а заданная доля
+    платежей повторяет уже отправленные transaction_id.
+    """
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.accounts = parse_accounts(args.accounts)
+        self.recent: deque = deque(maxlen=RECENT_PAYMENTS_SIZE)
+        self.transaction_ids = itertools.count(args.transaction_id_start)
+
+        self.cum_weights = None
+        if args.skew == 'zipf':
+            weights = [
+                1 / rank ** args.zipf_s
+                for rank in range(1, len(self.accounts) + 1)
+            ]
+            self.cum_weights = list(itertools.accumulate(weights))
+
+    def _pick_account(self) -> int:
+        if self.cum_weights is None:
+            return self.random.choice(self.accounts)
+        return self.random.choices(
+            self.accounts, cum_weights=self.cum_weights
+        )[0]
+
+    def _amount(self) -> Decimal:
+        return Decimal(self.random.randint(1, 100000)) / 100
+
+    def sign(self, payment: dict) -> dict:
+        payment = {key: payment[key] for key in PAYMENT_FIELDS}
+        payment['amount'] = Decimal(str(payment['amount'])).quantize(
+            Decimal('0.00')
+        )
+        payment['transaction_id'] = str(payment['transaction_id'])
+        payment['signature'] = generate_signature(
+            payment, self.args.secret_key
+        )
+        payment['amount'] = str(payment['amount'])
+        return payment
+
+    def _iter_replay(self) -> Iterator[dict]:
+        with open(self.args.replay, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    payment = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(payment, dict) and all(
+                    field in payment for field in PAYMENT_FIELDS
+                ):
+                    yield payment
+
+    def _iter_generated(self) -> Iterator[dict]:
+        while True:
+            yield {
+                'transaction_id': next(self.transaction_ids),
+                'account_id': self._pick_account(),
+                'user_id': self.args.user_id,
+                'amount': self._amount(),
+            }
+
+    async def __aiter__(self):
+        source = (
+            self._iter_replay() if self.args.replay else self._iter_generated()
+        )
+        for payment in source:
+            if self.recent and (
+                self.random.random() < self.args.duplicate_ratio
+            ):
+                yield self.random.choice(self.recent)
+                continue
+
+            if 'signature' not in payment or self.args.resign:
+                payment = self.sign(payment)
+            self.recent.append(payment)
+            yield payment
+
+
+class LoadTest:
+
+    def __init__(self, args: argparse.Namespace, client: httpx.AsyncClient):
+        self.args = args
+        self.client = client
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.outcomes: Dict[str, Counter] = defaultdict(Counter)
+        self.token: Optional[str] = None
+
+    async def login(self):
+        response = await self.client.post(
+            '/api/auth/jwt/login',
+            data={'username': self.args.email, 'password': self.args.password},
+        )
+        response.raise_for_status()
+        self.token = response.json()['access_token']
+
+    async def _send(self, operation: str, method: str, path: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, **kwargs)
+        except httpx.HTTPError as e:
+            logger.warning('Ошибка запроса %s %s: %s', method, path, e)
+            outcome = OUTCOME_ERROR
+        else:
+            outcome = classify_response(response)
+        self.latencies[operation].append(time.perf_counter() - started)
+        self.outcomes[operation][outcome] += 1
+
+    async def _worker(self, jobs):
+        async for kind, payload in jobs:
+            if kind == 'read':
+                await self._send(
+                    'read',
+                    'GET',
+                    payload,
+                    headers={'Authorization': f'Bearer {self.token}'},
+                )
+            else:
+                await self._send(
+                    'payment', 'POST', '/api/payment', json=payload
+                )
+
+    async def _jobs(self, generator: PaymentGenerator):
+        rng = random.Random(self.args.seed)
+        sent = 0
+        async for payment in generator:
+            if sent >= self.args.requests:
+                return
+            sent += 1
+            if self.token and rng.random() < self.args.read_ratio:
+                yield 'read', rng.choice(READ_PATHS)
+            else:
+                yield 'payment', payment
+
+    async def run(self) -> dict:
+        if self.args.read_ratio > 0:
+            await self.login()
+
+        jobs = _SharedAsyncIterator(self._jobs(PaymentGenerator(self.args)))
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(self._worker(jobs) for _ in range(self.args.concurrency))
+        )
+        return self.report(time.perf_counter() - started)
+
+    def report(self, duration: float) -> dict:
+        total = sum(len(values) for values in self.latencies.values())
+        report = {
+            'requests': total,
+            'duration': round(duration, 3),
+            'throughput': round(total / duration, 2) if duration else 0.0,
+            'operations': {},
+        }
+        for operation, values in self.latencies.items():
+            values.sort()
+            report['operations'][operation] = {
+                'count': len(values),
+                **{
+                    f'p{rank}_ms': round(percentile(values, rank) * 1000, 2)
+                    for rank in PERCENTILES
+                },
+                'max_ms': round(values[-1] * 1000, 2),
+                'outcomes': dict(self.outcomes[operation]),
+            }
+        return report
+
+
+class _SharedAsyncIterator:
+    """Асинхронный итератор, который безопасно читают несколько воркеров."""
+
+    def __init__(self, iterator):
+        self._iterator = iterator
+        self._lock = asyncio.Lock()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        async with self._lock:
+            return await self._iterator.__anext__()
+
+
+def print_report(report: dict):
+    print(
+        f"requests: {report['requests']}  "
+        f"duration: {report['duration']}s  "
+        f"throughput: {report['throughput']} req/s"
+    )
+    for operation, stats in report['operations'].items():
+        latencies = '  '.join(
+            f'{key}: {stats[key]}'
+            for key in [f'p{rank}_ms' for rank in PERCENTILES] + ['max_ms']
+        )
+        print(f"  {operation} ({stats['count']}): {latencies}")
+        for outcome, count in sorted(stats['outcomes'].items()):
+            print(f'    {outcome}: {count}')
+
+
+def _compare_rows(
+    baseline: dict, report: dict
+) -> List[Tuple[str, float, float]]:
+    rows = [('throughput', baseline['throughput'], report['throughput'])]
+    for operation, stats in report['operations'].items():
+        base_stats = baseline['operations'].get(operation)
+        if base_stats is None:
+            continue
+        for rank in PERCENTILES:
+            key = f'p{rank}_ms'
+            rows.append(
+                (f'{operation}.{key}', base_stats[key], stats[key])
+            )
+    return rows
+
+
+def print_comparison(baseline: dict, report: dict):
+    print('comparison with baseline:')
+    for name, before, after in _compare_rows(baseline, report):
+        delta = (after - before) / before * 100 if before else 0.0
+        print(f'  {name}: {before} -> {after} ({delta:+.1f}%)')
+
+
+async def main(args: argparse.Namespace):
+    if args.in_process:
+        from main import app
+
+        logging.getLogger().setLevel(args.log_level)
+        await app.router.startup()
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url='http://loadtest'
+        )
+    else:
+        client = httpx.AsyncClient(
+            base_url=args.base_url, timeout=args.timeout
+        )
+
+    try:
+        async with client:
+            report = await LoadTest(args, client).run()
+    finally:
+        if args.in_process:
+            await app.router.shutdown()
+
+    print_report(report)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            print_comparison(json.load(file), report)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+        print(f'baseline saved to {args.save_baseline}')
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description='Нагрузочный тест платежного сервиса'
+    )
+    parser.add_argument('--base-url', default='http://localhost:8000')
+    parser.add_argument(
+        '--in-process',
+        action='store_true',
+        help='запустить приложение в этом же процессе без HTTP-сервера',
+    )
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument(
+        '--replay',
+        help='NDJSON-файл с платежами (transaction_id, account_id, '
+        'user_id, amount и необязательная signature)',
+    )
+    parser.add_argument(
+        '--resign',
+        action='store_true',
+        help='переподписать платежи из --replay, даже если подпись есть',
+    )
+    parser.add_argument('--secret-key', default=settings.secret_key)
+    parser.add_argument('--user-id', type=int, default=1)
+    parser.add_argument(
+        '--accounts',
+        default='1',
+        help='существующие аккаунты пользователя: `1-10` или `1,2,5`',
+    )
+    parser.add_argument(
+        '--skew', choices=('uniform', 'zipf'), default='uniform'
+    )
+    parser.add_argument('--zipf-s', type=float, default=1.1)
+    parser.add_argument('--duplicate-ratio', type=float, default=0.0)
+    parser.add_argument('--read-ratio', type=float, default=0.0)
+    parser.add_argument('--email', default=settings.test_user_email)
+    parser.add_argument('--password', default=settings.test_user_password)
+    # Наносекунды, а не секунды: запуски, начатые в одну секунду или
+    # сразу друг за другом, не должны выдавать одинаковые transaction_id.
+    parser.add_argument(
+        '--transaction-id-start', type=int, default=time.time_ns()
+    )
+    parser.add_argument('--seed', type=int)
+    parser.add_argument(
+        '--log-level',
+        default='WARNING',
+        help='уровень логов приложения в режиме --in-process',
+    )
+    parser.add_argument('--save-baseline', metavar='PATH')
+    parser.add_argument('--compare', metavar='PATH')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    asyncio.run(main(parse_args(sys.argv[1:])))
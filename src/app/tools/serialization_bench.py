@@ -0,0 +1,172 @@
+"""Сравнение сериализации списков через response_model и быстрый путь.
+
+Заполняет in-memory sqlite аккаунтами и платежами, выполняет те же
+Core-запросы, что и эндпоинты списков, и сериализует страницу двумя
+способами: как FastAPI с response_model (валидация pydantic, затем
+jsonable_encoder и JSONResponse) и через app.core.serialization.
+Перед замером проверяется, что тела ответов совпадают побайтно.
+
+Пример запуска из папки `src`:
+
+    python -m app.tools.serialization_bench --rows 500 --repeat 200
+"""
+# Standart lib imports
+import argparse
+import asyncio
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+# Thirdparty imports
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from sqlalchemy import create_engine, insert, select
+
+# Projects imports
+from app.core.base import Base
+from app.core.serialization import render_page
+from app.models import User
+from app.schemas.pagination import CursorPage
+from app.services.payment.config import Account, Payment
+from app.services.payment.schemas import (
+    ReturnAccountSchema,
+    ReturnPaymentSchema,
+)
+
+USERS_COUNT = 10
+
+
+def fill_database(engine, rows: int):
+    started = datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(User),
+            [
+                {
+                    'id': user_id,
+                    'email': f'user{user_id}@example.com',
+                    'hashed_password': 'x',
+                    'is_active': True,
+                    'is_superuser': False,
+                    'is_verified': False,
+                }
+                for user_id in range(1, USERS_COUNT + 1)
+            ],
+        )
+        conn.execute(
+            insert(Account),
+            [
+                {
+                    'id': account_id,
+                    'user_id': 1,
+                    'balance': random.randint(0, 10 ** 10),
+                    'created_at': started + timedelta(seconds=account_id),
+                    'updated_at': started + timedelta(
+                        seconds=account_id, microseconds=account_id
+                    ),
+                }
+                for account_id in range(1, rows + 1)
+            ],
+        )
+        conn.execute(
+            insert(Payment),
+            [
+                {
+                    'id': payment_id,
+                    'transaction_id': str(payment_id),
+                    'account_id': payment_id,
+                    'payment_amount': random.randint(1, 10 ** 8),
+                }
+                for payment_id in range(1, rows + 1)
+            ],
+        )
+
+
+def load_pages(engine) -> dict:
+    with engine.connect() as conn:
+        accounts = conn.execute(
+            select(
+                Account.id,
+                Account.user_id,
+                Account.balance,
+                Account.created_at,
+                Account.updated_at,
+            ).order_by(Account.id)
+        ).all()
+        payments = conn.execute(
+            select(
+                Payment.id,
+                Payment.transaction_id,
+                Payment.account_id,
+                Payment.payment_amount,
+            ).order_by(Payment.id)
+        ).all()
+
+    return {
+        'account': ({'items': accounts, 'next_cursor': 'MTA='},
+                    ReturnAccountSchema),
+        'payment': ({'items': payments, 'next_cursor': None},
+                    ReturnPaymentSchema),
+    }
+
+
+async def render_with_response_model(page: dict, field) -> bytes:
+    content = await serialize_response(field=field, response_content=page)
+    return JSONResponse(content).body
+
+
+async def render_fast(page: dict, schema) -> bytes:
+    return render_page(page, schema).body
+
+
+async def measure(func, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await func()
+    return (time.perf_counter() - started) / repeat
+
+
+async def compare(pages: dict, repeat: int) -> int:
+    for name, (page, schema) in pages.items():
+        field = create_response_field(
+            name=f'Response_{name}', type_=CursorPage[schema]
+        )
+        expected = await render_with_response_model(page, field)
+        actual = await render_fast(page, schema)
+        if expected != actual:
+            print(f'{name}: тела ответов различаются', file=sys.stderr)
+            return 1
+
+        slow = await measure(
+            lambda: render_with_response_model(page, field), repeat
+        )
+        fast = await measure(lambda: render_fast(page, schema), repeat)
+        print(
+            f'{name:<8} rows={len(page["items"])} '
+            f'response_model={slow * 1000:.2f}ms '
+            f'fast={fast * 1000:.2f}ms '
+            f'speedup=x{slow / fast:.1f}'
+        )
+
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=500,
+                        help='строк на странице')
+    parser.add_argument('--repeat', type=int, default=200,
+                        help='число повторов на замер')
+    args = parser.parse_args(argv)
+
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    fill_database(engine, args.rows)
+
+    return asyncio.run(compare(load_pages(engine), args.repeat))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
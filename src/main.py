@@ -1,20 +1,69 @@
 from fastapi import FastAPI
 
+from app.api.endpoints import metrics_router
 from app.api.routers import main_router
-from app.core.db__init__ import create_first_superuser, create_user
+from app.core.db__init__ import (
+    create_first_superuser,
+    create_user,
+    warm_up_db_pool,
+)
 from app.core.config import settings, setup_logging
+from app.core.db import query_stats_enabled
+from app.core.log import RequestContextMiddleware
+from app.core.profiling import ProfilingMiddleware, request_profiler
+from app.core.query_stats import QueryStatsMiddleware
+from app.services.payment.group_commit import group_committer
+from app.services.payment.idempotency import transaction_index
+from app.services.payment.journal import payment_journal
+from app.services.payment.lanes import lane_scheduler
+from app.services.payment.outbox import outbox_dispatcher
 
 app = FastAPI()
 app.include_router(main_router)
+app.include_router(metrics_router)
+if query_stats_enabled:
+    app.add_middleware(
+        QueryStatsMiddleware,
+        add_headers=bool(settings.debug_mode),
+        n_plus_one_threshold=settings.db_n_plus_one_threshold,
+        strict_budget=settings.db_query_budget_strict,
+    )
+app.add_middleware(ProfilingMiddleware, profiler=request_profiler)
+app.add_middleware(
+    RequestContextMiddleware, sample_rate=settings.log_hot_path_sample_rate
+)
 
 
 @app.on_event('startup')
 async def startup():
+    if settings.db_pool_warm_up:
+        await warm_up_db_pool()
     await create_user(
         email=settings.test_user_email,
         password=settings.test_user_password,
         make_account=True,
     )
     await create_first_superuser()
+    if transaction_index is not None:
+        await transaction_index.warm_up()
+    if settings.payment_lanes_enabled:
+        lane_scheduler.start()
+    if group_committer is not None:
+        group_committer.start()
+    if payment_journal is not None:
+        payment_journal.start()
+    if outbox_dispatcher is not None:
+        outbox_dispatcher.start()
+
+
+@app.on_event('shutdown')
+async def shutdown():
+    await lane_scheduler.stop()
+    if group_committer is not None:
+        await group_committer.stop()
+    if payment_journal is not None:
+        await payment_journal.stop()
+    if outbox_dispatcher is not None:
+        await outbox_dispatcher.stop()
 
 logger = setup_logging()
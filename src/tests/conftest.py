@@ -0,0 +1,192 @@
+"""Общие фикстуры тестов.
+
+Настройки приложения читаются при импорте, поэтому окружение задается
+до импорта app: тесты работают в debug-режиме на sqlite во временном
+каталоге, все необязательные режимы выключены. Бюджет SQL-запросов
+эндпоинтов проверяется в строгом режиме: превышение роняет запрос.
+"""
+# Standart lib imports
+import os
+import sqlite3
+import tempfile
+
+TEST_DIR = tempfile.mkdtemp(prefix='payment-tests-')
+os.environ.update(
+    DEBUG='True',
+    SECRET_KEY='test-secret',
+    TEST_USER_EMAIL='user@test.ru',
+    TEST_USER_PASSWORD='qwerasdf',
+    FIRST_SUPERUSER_EMAIL='admin@test.ru',
+    FIRST_SUPERUSER_PASSWORD='qwerasdf',
+    PASSWORD_BCRYPT_ROUNDS='4',
+    DB_POOL_WARM_UP='False',
+    DB_QUERY_BUDGET_STRICT='True',
+    PAYMENT_JOURNAL_DIR=os.path.join(TEST_DIR, 'journal'),
+    OUTBOX_FILE_PATH=os.path.join(TEST_DIR, 'outbox', 'events.ndjson'),
+)
+# Путь к файлу БД sqlite и каталог логов относительны и фиксируются при
+# импорте app, поэтому на время импорта каталог меняется на временный.
+# Затем он возвращается, чтобы pytest искал testpaths от каталога
+# запуска.
+START_DIR = os.getcwd()
+os.chdir(TEST_DIR)
+
+# Thirdparty imports
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+from sqlalchemy import func, select  # noqa: E402
+from sqlalchemy.dialects.postgresql.asyncpg import (  # noqa: E402
+    AsyncAdapt_asyncpg_dbapi,
+)
+from sqlalchemy.exc import DBAPIError  # noqa: E402
+from sqlalchemy.ext.asyncio import create_async_engine  # noqa: E402
+
+# Projects imports
+import app.core.base  # noqa: E402, F401
+from app.core.db import AsyncSessionLocal, Base, engine  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.core.db__init__ import create_user  # noqa: E402
+from app.services.payment.config import Account, Payment  # noqa: E402
+from app.services.payment.lanes import lane_scheduler  # noqa: E402
+from app.services.payment.utils import generate_signature  # noqa: E402
+from main import app as fastapi_app  # noqa: E402
+
+os.chdir(START_DIR)
+
+SECRET_KEY = os.environ['SECRET_KEY']
+USER_EMAIL = os.environ['TEST_USER_EMAIL']
+SUPERUSER_EMAIL = os.environ['FIRST_SUPERUSER_EMAIL']
+PASSWORD = os.environ['TEST_USER_PASSWORD']
+# Адрес пустой БД postgres для проверок, зависящих от postgres;
+# без него такие тесты пропускаются.
+POSTGRES_URL = os.environ.get('TEST_POSTGRES_URL')
+
+
+def make_payment(
+    transaction_id: str,
+    account_id: int = 1,
+    user_id: int = 1,
+    amount: str = '1.50',
+) -> dict:
+    """Подписанный платеж в том виде, в каком его присылает клиент."""
+    payment = {
+        'transaction_id': transaction_id,
+        'account_id': account_id,
+        'user_id': user_id,
+        'amount': amount,
+    }
+    payment['signature'] = generate_signature(payment, SECRET_KEY)
+    return payment
+
+
+async def get_balance(account_id: int = 1) -> int:
+    """Баланс аккаунта в минорных единицах."""
+    async with AsyncSessionLocal() as session:
+        return (
+            await session.execute(
+                select(Account.balance).where(Account.id == account_id)
+            )
+        ).scalar_one()
+
+
+async def count_payments() -> int:
+    """Число проведенных платежей."""
+    async with AsyncSessionLocal() as session:
+        return (
+            await session.execute(select(func.count()).select_from(Payment))
+        ).scalar_one()
+
+
+def asyncpg_lock_timeout_error() -> DBAPIError:
+    """Таймаут блокировки postgres в том виде, в каком его передает
+    SQLAlchemy: LockNotAvailableError asyncpg, обернутая в DBAPIError."""
+    orig = AsyncAdapt_asyncpg_dbapi.Error(
+        "<class 'asyncpg.exceptions.LockNotAvailableError'>: "
+        'canceling statement due to lock timeout'
+    )
+    orig.pgcode = orig.sqlstate = '55P03'
+    return DBAPIError.instance(
+        'SELECT', {}, orig, AsyncAdapt_asyncpg_dbapi.Error
+    )
+
+
+def sqlite_locked_error() -> DBAPIError:
+    """Ошибка sqlite, не дождавшегося блокировки БД."""
+    return DBAPIError.instance(
+        'UPDATE',
+        {},
+        sqlite3.OperationalError('database is locked'),
+        sqlite3.Error,
+    )
+
+
+@pytest.fixture
+async def db():
+    """Пустая схема БД на каждый тест."""
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.drop_all)
+        await connection.run_sync(Base.metadata.create_all)
+    yield engine
+
+
+@pytest.fixture
+async def client(db):
+    transport = httpx.ASGITransport(app=fastapi_app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url='http://test'
+    ) as async_client:
+        yield async_client
+
+
+async def _login(client: httpx.AsyncClient, email: str) -> dict:
+    response = await client.post(
+        '/api/auth/jwt/login', data={'username': email, 'password': PASSWORD}
+    )
+    assert response.status_code == 200, response.text
+    return {'Authorization': f'Bearer {response.json()["access_token"]}'}
+
+
+@pytest.fixture
+async def user_headers(client):
+    """Заголовки пользователя с id 1 и его аккаунтом с id 1."""
+    await create_user(email=USER_EMAIL, password=PASSWORD, make_account=True)
+    return await _login(client, USER_EMAIL)
+
+
+@pytest.fixture
+async def superuser_headers(client, user_headers):
+    await create_user(
+        email=SUPERUSER_EMAIL, password=PASSWORD, is_superuser=True
+    )
+    return await _login(client, SUPERUSER_EMAIL)
+
+
+@pytest.fixture
+async def payment_lanes(monkeypatch):
+    """Платежи через дорожки; воркеры останавливаются после теста,
+    потому что у каждого теста свой event loop."""
+    monkeypatch.setattr(settings, 'payment_lanes_enabled', True)
+    yield lane_scheduler
+    await lane_scheduler.stop()
+
+
+@pytest.fixture
+async def postgres_engine():
+    """Движок пустой БД из TEST_POSTGRES_URL со схемой приложения."""
+    if POSTGRES_URL is None:
+        pytest.skip('TEST_POSTGRES_URL не задан')
+
+    postgres = create_async_engine(POSTGRES_URL)
+    try:
+        async with postgres.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+    except (OSError, DBAPIError) as e:
+        await postgres.dispose()
+        pytest.skip(f'postgres недоступен: {e!r}')
+
+    try:
+        yield postgres
+    finally:
+        async with postgres.begin() as connection:
+            await connection.run_sync(Base.metadata.drop_all)
+        await postgres.dispose()
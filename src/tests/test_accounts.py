@@ -0,0 +1,188 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import event, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import LRUCache
+from app.core.db import AsyncSessionLocal, engine
+from app.core.db__init__ import create_user
+from app.models import User
+from app.services.payment.config import Account
+from app.services.payment import crud as crud_module
+from app.services.payment.crud import AccountCRUD
+from tests.conftest import make_payment
+
+
+class StatementCounter:
+    def __init__(self, bind):
+        self.bind = bind.sync_engine
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.bind, 'before_cursor_execute', self)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.bind, 'before_cursor_execute', self)
+
+
+async def test_account_is_created_on_first_payment(db):
+    crud = AccountCRUD(Account)
+    async with AsyncSessionLocal() as session:
+        account = await crud.get_or_create_account(
+            user_id=1, session=session, account_id=5
+        )
+        again = await crud.get_or_create_account(
+            user_id=1, session=session, account_id=5
+        )
+        await session.commit()
+
+    assert (account.id, account.user_id) == (5, 1)
+    assert again.id == 5
+
+
+async def test_account_of_another_user_is_not_found(db):
+    crud = AccountCRUD(Account)
+    async with AsyncSessionLocal() as session:
+        await crud.create(session=session, user_id=1, account_id=5)
+        assert (
+            await crud.create(session=session, user_id=2, account_id=5)
+            is None
+        )
+        with pytest.raises(HTTPException) as error:
+            await crud.get_or_create_account(
+                user_id=2, session=session, account_id=5
+            )
+
+    assert error.value.status_code == 404
+
+
+async def test_cached_account_skips_lookup(db):
+    crud = AccountCRUD(Account, account_cache=LRUCache(max_size=10))
+    async with AsyncSessionLocal() as session:
+        await crud.get_or_create_account(
+            user_id=1, session=session, account_id=5
+        )
+        await session.commit()
+
+        with StatementCounter(engine) as counter:
+            account = await crud.get_or_create_account(
+                user_id=1, session=session, account_id=5
+            )
+
+    assert counter.count == 0
+    assert (account.id, account.user_id) == (5, 1)
+
+
+async def test_account_is_cached_only_after_commit(db):
+    cache = LRUCache(max_size=10)
+    crud = AccountCRUD(Account, account_cache=cache)
+    async with AsyncSessionLocal() as session:
+        await crud.get_or_create_account(
+            user_id=1, session=session, account_id=5
+        )
+        assert (1, 5) not in cache
+        await session.rollback()
+
+        assert (1, 5) not in cache
+        await crud.get_or_create_accounts(session=session, pairs=[(1, 6)])
+        await session.commit()
+
+    assert (1, 5) not in cache
+    assert (1, 6) in cache
+
+
+async def test_account_created_in_rolled_back_savepoint_is_not_cached(db):
+    cache = LRUCache(max_size=10)
+    crud = AccountCRUD(Account, account_cache=cache)
+    async with AsyncSessionLocal() as session:
+        await crud.get_or_create_account(
+            user_id=1, session=session, account_id=5
+        )
+        with pytest.raises(ValueError):
+            async with session.begin_nested():
+                await crud.get_or_create_account(
+                    user_id=1, session=session, account_id=6
+                )
+                raise ValueError
+        await session.commit()
+
+    assert (1, 5) in cache
+    assert (1, 6) not in cache
+
+
+async def test_account_of_closed_session_is_not_cached(db):
+    cache = LRUCache(max_size=10)
+    crud = AccountCRUD(Account, account_cache=cache)
+    async with AsyncSessionLocal() as session:
+        await crud.create(session=session, user_id=1, account_id=5)
+
+    async with AsyncSessionLocal() as session:
+        await session.commit()
+
+    assert (1, 5) not in cache
+
+
+async def test_rejected_first_payment_does_not_cache_account(
+    client, user_headers, monkeypatch
+):
+    monkeypatch.setattr(crud_module, 'account_cache', LRUCache(max_size=10))
+    payment = make_payment('tx-1', account_id=77)
+    response = await client.post(
+        '/api/payment', json={**payment, 'signature': 'invalid'}
+    )
+    assert response.status_code == 403
+
+    response = await client.post('/api/payment', json=payment)
+    assert response.status_code == 200, response.text
+    assert (1, 77) in crud_module.account_cache
+
+
+async def test_batch_lookup_skips_foreign_accounts(db):
+    crud = AccountCRUD(Account)
+    async with AsyncSessionLocal() as session:
+        await crud.create(session=session, user_id=2, account_id=3)
+        accounts = await crud.get_or_create_accounts(
+            session=session, pairs=[(1, 1), (1, 2), (1, 3), (1, 1)]
+        )
+
+    assert sorted(accounts) == [(1, 1), (1, 2)]
+
+
+async def test_user_account_does_not_collide_with_explicit_ids(db):
+    async with AsyncSessionLocal() as session:
+        await AccountCRUD(Account).create(
+            session=session, user_id=100, account_id=1
+        )
+        await session.commit()
+
+    await create_user(
+        email='new@test.ru', password='qwerasdf', make_account=True
+    )
+
+    async with AsyncSessionLocal() as session:
+        ids = (await session.execute(select(Account.id))).scalars().all()
+    assert sorted(ids) == [1, 2]
+
+
+async def test_explicit_id_advances_postgres_sequence(postgres_engine):
+    async with AsyncSession(postgres_engine) as session:
+        await session.execute(
+            insert(User).values(
+                id=1, email='user@test.ru', hashed_password='x'
+            )
+        )
+        await AccountCRUD(Account).create(
+            session=session, user_id=1, account_id=5
+        )
+        await AccountCRUD(Account).create(
+            session=session, user_id=1, account_id=3
+        )
+        account = Account(user_id=1)
+        session.add(account)
+        await session.flush()
+
+        assert account.id == 6
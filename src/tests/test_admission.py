@@ -0,0 +1,189 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.payment import admin_endpoints
+from app.services.payment import admission as admission_module
+from app.services.payment.admission import AdmissionController
+from tests.conftest import make_payment
+
+
+def make_controller(**limits) -> AdmissionController:
+    options = {
+        'max_in_flight': 1,
+        'max_per_account': 10,
+        'queue_size': 10,
+        'queue_timeout': 5.0,
+        'retry_after': 3,
+    }
+    options.update(limits)
+    return AdmissionController(**options)
+
+
+@pytest.fixture
+def controller(monkeypatch):
+    controller = make_controller(queue_size=0)
+    monkeypatch.setattr(admission_module, 'admission_controller', controller)
+    monkeypatch.setattr(admin_endpoints, 'admission_controller', controller)
+    return controller
+
+
+async def hold(controller, account_id, started, release):
+    async with controller.admit(account_id):
+        started.append(account_id)
+        await release.wait()
+
+
+async def test_waiters_are_admitted_in_order():
+    controller = make_controller(max_in_flight=2)
+    started, release = [], asyncio.Event()
+    tasks = [
+        asyncio.create_task(hold(controller, account_id, started, release))
+        for account_id in range(1, 5)
+    ]
+    await asyncio.sleep(0.01)
+
+    assert started == [1, 2]
+    assert controller.stats()['queued'] == 2
+
+    release.set()
+    await asyncio.gather(*tasks)
+    assert started == [1, 2, 3, 4]
+    stats = controller.stats()
+    assert (stats['in_flight'], stats['queued']) == (0, 0)
+    assert stats['accounts_in_flight'] == 0
+    assert stats['admitted'] == 4
+
+
+async def test_full_queue_is_rejected_with_retry_after():
+    controller = make_controller(queue_size=1)
+    started, release = [], asyncio.Event()
+    tasks = [
+        asyncio.create_task(hold(controller, account_id, started, release))
+        for account_id in (1, 2)
+    ]
+    await asyncio.sleep(0.01)
+
+    with pytest.raises(HTTPException) as error:
+        async with controller.admit(3):
+            pass
+
+    assert error.value.status_code == 429
+    assert error.value.headers == {'Retry-After': '3'}
+    release.set()
+    await asyncio.gather(*tasks)
+    assert controller.stats()['rejected'] == 1
+
+
+async def test_queue_timeout_is_rejected():
+    controller = make_controller(queue_timeout=0.01)
+    started, release = [], asyncio.Event()
+    task = asyncio.create_task(hold(controller, 1, started, release))
+    await asyncio.sleep(0)
+
+    with pytest.raises(HTTPException):
+        async with controller.admit(2):
+            pass
+
+    release.set()
+    await task
+    assert controller.stats()['in_flight'] == 0
+
+
+async def test_account_limit():
+    controller = make_controller(max_in_flight=10, max_per_account=1)
+    started, release = [], asyncio.Event()
+    task = asyncio.create_task(hold(controller, 1, started, release))
+    await asyncio.sleep(0)
+
+    with pytest.raises(HTTPException):
+        async with controller.admit(1):
+            pass
+    async with controller.admit(2):
+        pass
+
+    release.set()
+    await task
+    assert controller.stats()['accounts_in_flight'] == 0
+
+
+async def test_cancelled_waiter_frees_its_slot():
+    controller = make_controller()
+    started, release = [], asyncio.Event()
+    release.set()
+    first = controller.admit(1)
+    await first.__aenter__()
+    waiter = asyncio.create_task(hold(controller, 2, started, release))
+    await asyncio.sleep(0)
+
+    # Место передается ожидающему, и тот отменяется раньше, чем успевает
+    # продолжить работу.
+    await first.__aexit__(None, None, None)
+    waiter.cancel()
+    await asyncio.gather(waiter, return_exceptions=True)
+
+    assert controller.stats()['in_flight'] == 0
+    async with controller.admit(3):
+        pass
+
+
+async def test_raised_limit_admits_waiters():
+    controller = make_controller()
+    started, release = [], asyncio.Event()
+    tasks = [
+        asyncio.create_task(hold(controller, account_id, started, release))
+        for account_id in (1, 2, 3)
+    ]
+    await asyncio.sleep(0.01)
+    assert started == [1]
+
+    controller.update_limits(max_in_flight=3, queue_size=None)
+    await asyncio.sleep(0.01)
+
+    assert started == [1, 2, 3]
+    assert controller.queue_size == 10
+    release.set()
+    await asyncio.gather(*tasks)
+
+
+async def test_overloaded_payment_gets_429(client, user_headers, controller):
+    started, release = [], asyncio.Event()
+    task = asyncio.create_task(hold(controller, 99, started, release))
+    await asyncio.sleep(0)
+
+    response = await client.post('/api/payment', json=make_payment('tx-1'))
+    assert response.status_code == 429
+    assert response.headers['retry-after'] == '3'
+
+    release.set()
+    await task
+    response = await client.post('/api/payment', json=make_payment('tx-1'))
+    assert response.status_code == 200
+
+
+async def test_admin_can_read_and_change_limits(
+    client, superuser_headers, controller
+):
+    response = await client.patch(
+        '/api/admin/payment-admission',
+        headers=superuser_headers,
+        json={'max_in_flight': 5},
+    )
+    assert response.status_code == 200
+    assert response.json()['max_in_flight'] == 5
+    assert response.json()['queue_size'] == 0
+
+    response = await client.get(
+        '/api/admin/payment-admission', headers=superuser_headers
+    )
+    assert response.json()['max_in_flight'] == 5
+
+
+async def test_admin_stats_when_admission_is_disabled(
+    client, superuser_headers
+):
+    response = await client.get(
+        '/api/admin/payment-admission', headers=superuser_headers
+    )
+    assert response.status_code == 404
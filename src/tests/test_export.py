@@ -0,0 +1,100 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+from app.core.db import AsyncSessionLocal
+from app.services.payment.config import Account, Payment
+from app.services.payment.crud import PaymentCRUD
+
+STARTED = datetime(2024, 1, 1)
+
+
+async def seed_payments():
+    """Платежи пользователя 1 по одному в день и чужой платеж."""
+    async with AsyncSessionLocal() as session:
+        session.add(Account(id=2, user_id=2, balance=0))
+        session.add_all(
+            Payment(
+                account_id=1,
+                transaction_id=f'tx-{day}',
+                payment_amount=100 * day + 5,
+                created_at=STARTED + timedelta(days=day),
+            )
+            for day in range(5)
+        )
+        session.add(
+            Payment(
+                account_id=2,
+                transaction_id='tx-other',
+                payment_amount=1,
+                created_at=STARTED,
+            )
+        )
+        await session.commit()
+
+
+async def test_ndjson_export(client, user_headers):
+    await seed_payments()
+
+    response = await client.get('/api/payment/export', headers=user_headers)
+
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    assert 'payments.ndjson' in response.headers['content-disposition']
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row['transaction_id'] for row in rows] == [
+        f'tx-{day}' for day in range(5)
+    ]
+    assert rows[1] == {
+        'id': 2,
+        'transaction_id': 'tx-1',
+        'account_id': 1,
+        'payment_amount': '1.05',
+        'created_at': '2024-01-02T00:00:00',
+    }
+
+
+async def test_csv_export_with_date_range(client, user_headers):
+    await seed_payments()
+
+    response = await client.get(
+        '/api/payment/export',
+        params={
+            'format': 'csv',
+            'from': '2024-01-02T00:00:00',
+            'to': '2024-01-04T00:00:00',
+        },
+        headers=user_headers,
+    )
+
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/csv')
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row['transaction_id'] for row in rows] == ['tx-1', 'tx-2']
+    assert rows[1]['payment_amount'] == '2.05'
+
+
+async def test_unknown_format_is_rejected(client, user_headers):
+    response = await client.get(
+        '/api/payment/export', params={'format': 'xml'}, headers=user_headers
+    )
+
+    assert response.status_code == 422
+
+
+async def test_payments_are_streamed_in_chunks(db):
+    async with AsyncSessionLocal() as session:
+        session.add(Account(id=1, user_id=1, balance=0))
+        await session.commit()
+    await seed_payments()
+
+    async with AsyncSessionLocal() as session:
+        chunks = [
+            [row.transaction_id for row in rows]
+            async for rows in PaymentCRUD(Payment).stream_payments(
+                session=session, user_id=1, chunk_size=2
+            )
+        ]
+
+    assert chunks == [['tx-0', 'tx-1'], ['tx-2', 'tx-3'], ['tx-4']]
@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from app.core.db import AsyncSessionLocal
+from app.services.payment import endpoints
+from app.services.payment.config import Account, Payment
+from app.services.payment.group_commit import GroupCommitter
+from tests.conftest import count_payments, make_payment
+
+
+@pytest.fixture
+async def committer():
+    group_committer = GroupCommitter(window=0.05, max_size=100)
+    yield group_committer
+    await group_committer.stop()
+
+
+def recording_groups(committer: GroupCommitter, monkeypatch) -> list:
+    sizes = []
+    commit_group = committer._commit_group
+
+    async def record_group(group):
+        sizes.append(len(group))
+        return await commit_group(group)
+
+    monkeypatch.setattr(committer, '_commit_group', record_group)
+    return sizes
+
+
+def insert_payment(transaction_id: str, fail: bool = False):
+    async def apply(session):
+        session.add(
+            Payment(
+                account_id=1, transaction_id=transaction_id, payment_amount=1
+            )
+        )
+        await session.flush()
+        if fail:
+            raise HTTPException(400, 'failed')
+        return transaction_id
+
+    return apply
+
+
+async def test_payments_in_window_share_one_commit(
+    db, committer, monkeypatch
+):
+    sizes = recording_groups(committer, monkeypatch)
+
+    results = await asyncio.gather(
+        *(
+            committer.submit(account_id=1, func=insert_payment(f'tx-{i}'))
+            for i in range(5)
+        )
+    )
+
+    assert results == [f'tx-{i}' for i in range(5)]
+    assert sizes == [5]
+    assert await count_payments() == 5
+
+
+async def test_failed_payment_rolls_back_only_its_savepoint(db, committer):
+    results = await asyncio.gather(
+        committer.submit(account_id=1, func=insert_payment('tx-1')),
+        committer.submit(
+            account_id=1, func=insert_payment('tx-2', fail=True)
+        ),
+        committer.submit(account_id=1, func=insert_payment('tx-3')),
+        return_exceptions=True,
+    )
+
+    assert results[0] == 'tx-1' and results[2] == 'tx-3'
+    assert isinstance(results[1], HTTPException)
+    assert await count_payments() == 2
+
+
+async def test_commit_failure_fails_whole_group(db, committer, monkeypatch):
+    async def failing_commit(self):
+        raise RuntimeError('commit failed')
+
+    monkeypatch.setattr(
+        'sqlalchemy.ext.asyncio.AsyncSession.commit', failing_commit
+    )
+    results = await asyncio.gather(
+        *(
+            committer.submit(account_id=1, func=insert_payment(f'tx-{i}'))
+            for i in range(2)
+        ),
+        return_exceptions=True,
+    )
+
+    assert [error.status_code for error in results] == [500, 500]
+
+
+async def test_lanes_do_not_wait_for_group_commit(
+    client, user_headers, payment_lanes, committer, monkeypatch
+):
+    monkeypatch.setattr(endpoints, 'group_committer', committer)
+    sizes = recording_groups(committer, monkeypatch)
+
+    responses = await asyncio.gather(
+        *(
+            client.post(
+                '/api/payment',
+                json=make_payment(f'tx-{i}'),
+                headers=user_headers,
+            )
+            for i in range(6)
+        )
+    )
+
+    assert [response.status_code for response in responses] == [200] * 6
+    # Все платежи одного аккаунта идут через одну дорожку, но она не
+    # ждет commit, поэтому они попадают в одну группу.
+    assert sizes == [6]
+    balances = [
+        response.json()['account']['new_balance'] for response in responses
+    ]
+    assert sorted(balances) == [1.5 * i for i in range(1, 7)]
+    async with AsyncSessionLocal() as session:
+        balance = (
+            await session.execute(
+                select(Account.balance).where(Account.id == 1)
+            )
+        ).scalar_one()
+    assert balance == 900
@@ -0,0 +1,158 @@
+import pytest
+from sqlalchemy import event
+
+from app.core.cache import LRUCache
+from app.core.db import AsyncSessionLocal, engine
+from app.services.payment import utils
+from app.services.payment.config import Payment
+from app.services.payment.idempotency import BloomFilter, TransactionIdIndex
+from tests.conftest import make_payment
+
+
+def make_index(lru_size: int = 100) -> TransactionIdIndex:
+    return TransactionIdIndex(
+        lru_size=lru_size, bloom_capacity=1000, bloom_error_rate=0.01
+    )
+
+
+class DuplicateChecks:
+    """Считает SELECT по payment.transaction_id."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, *args):
+        if statement.startswith('SELECT') and (
+            'WHERE payment.transaction_id' in statement
+        ):
+            self.count += 1
+
+    def __enter__(self):
+        event.listen(engine.sync_engine, 'before_cursor_execute', self)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(engine.sync_engine, 'before_cursor_execute', self)
+
+
+@pytest.fixture
+def index(monkeypatch):
+    transaction_index = make_index()
+    transaction_index.is_warm = True
+    monkeypatch.setattr(utils, 'transaction_index', transaction_index)
+    return transaction_index
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    keys = [f'tx-{i}' for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+
+    assert all(key in bloom for key in keys)
+    false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+    assert false_positives < 10000 * 0.03
+    assert bloom.memory_bytes < 1300
+
+
+def test_lru_cache_evicts_and_expires(monkeypatch):
+    cache = LRUCache(max_size=2, ttl=10)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert 'b' not in cache
+    assert cache.get('a') == 1
+
+    now = cache._data['a'][0]
+    monkeypatch.setattr('app.core.cache.time.monotonic', lambda: now)
+    assert 'a' not in cache
+
+
+def test_recent_ids_are_bounded_but_stay_in_bloom_filter():
+    transaction_index = make_index(lru_size=2)
+    transaction_index.is_warm = True
+    for transaction_id in ('tx-1', 'tx-2', 'tx-3'):
+        transaction_index.add(transaction_id)
+
+    assert not transaction_index.is_known_duplicate('tx-1')
+    assert transaction_index.is_known_duplicate('tx-3')
+    assert transaction_index.might_exist('tx-1')
+    assert not transaction_index.might_exist('tx-new')
+
+
+def test_cold_index_assumes_any_id_might_exist():
+    assert make_index().might_exist('tx-new')
+
+
+async def test_warm_up_loads_existing_ids(db):
+    async with AsyncSessionLocal() as session:
+        session.add_all(
+            Payment(account_id=1, transaction_id=f'tx-{i}', payment_amount=1)
+            for i in range(3)
+        )
+        await session.commit()
+    transaction_index = make_index()
+
+    await transaction_index.warm_up(chunk_size=2)
+
+    assert transaction_index.is_warm
+    assert transaction_index.is_known_duplicate('tx-2')
+    assert not transaction_index.might_exist('tx-new')
+
+
+async def test_known_duplicate_is_rejected_without_query(
+    client, user_headers, index
+):
+    await client.post(
+        '/api/payment', json=make_payment('tx-1'), headers=user_headers
+    )
+
+    with DuplicateChecks() as checks:
+        response = await client.post(
+            '/api/payment', json=make_payment('tx-1'), headers=user_headers
+        )
+
+    assert response.status_code == 409
+    assert checks.count == 0
+
+
+async def test_unsigned_duplicate_gets_403(client, user_headers, index):
+    await client.post(
+        '/api/payment', json=make_payment('tx-1'), headers=user_headers
+    )
+    forged = make_payment('tx-1')
+    forged['amount'] = '100.00'
+
+    response = await client.post(
+        '/api/payment', json=forged, headers=user_headers
+    )
+
+    assert response.status_code == 403
+
+
+async def test_new_id_skips_duplicate_check(client, user_headers, index):
+    with DuplicateChecks() as checks:
+        response = await client.post(
+            '/api/payment', json=make_payment('tx-1'), headers=user_headers
+        )
+
+    assert response.status_code == 200
+    assert checks.count == 0
+    assert index.is_known_duplicate('tx-1')
+
+
+async def test_batch_rejects_known_duplicates(client, user_headers, index):
+    index.add('tx-old')
+
+    response = await client.post(
+        '/api/payment/batch',
+        json=[make_payment('tx-old'), make_payment('tx-new')],
+        headers=user_headers,
+    )
+
+    assert [result['status'] for result in response.json()['results']] == [
+        'duplicate',
+        'completed',
+    ]
@@ -0,0 +1,143 @@
+import io
+import json
+
+import pytest
+from sqlalchemy import select
+
+from app.core.db import AsyncSessionLocal
+from app.core.import_payments import (
+    Checkpoint,
+    ImportStats,
+    PaymentImporter,
+    import_payments,
+    iter_chunks,
+    parse_args,
+    verify_lines,
+)
+from app.services.payment.config import Account, Payment
+from tests.conftest import SECRET_KEY, make_payment
+
+
+def to_line(payment: dict) -> bytes:
+    return json.dumps(payment).encode() + b'\n'
+
+
+def write_source(path, payments) -> str:
+    with open(path, 'wb') as file:
+        for payment in payments:
+            file.write(
+                payment if isinstance(payment, bytes) else to_line(payment)
+            )
+    return str(path)
+
+
+async def get_balances() -> dict:
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(Account.id, Account.balance))
+        return dict(result.all())
+
+
+async def get_transaction_ids() -> list:
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(Payment.transaction_id).order_by(Payment.transaction_id)
+        )
+        return result.scalars().all()
+
+
+def test_verify_lines():
+    forged = make_payment('tx-forged')
+    forged['amount'] = '100.00'
+    lines = [
+        to_line(make_payment('tx-1', amount='1.01')),
+        b'\n',
+        b'not json\n',
+        to_line({'transaction_id': 'tx-no-fields'}),
+        to_line(forged),
+    ]
+
+    payments, malformed, invalid_signature = verify_lines(lines, SECRET_KEY)
+
+    assert payments == [('tx-1', 1, 1, 101)]
+    assert malformed == 2
+    assert invalid_signature == 1
+
+
+def test_iter_chunks_reports_offsets():
+    data = b'a\nbb\nccc\n'
+    chunks = list(iter_chunks(io.BytesIO(data), chunk_size=2))
+
+    assert chunks == [([b'a\n', b'bb\n'], 5), ([b'ccc\n'], len(data))]
+
+
+def test_checkpoint_round_trip(tmp_path):
+    source = str(tmp_path / 'payments.ndjson')
+    checkpoint = Checkpoint(str(tmp_path / 'import.checkpoint'), source)
+    assert checkpoint.load() == (0, ImportStats())
+
+    checkpoint.save(42, ImportStats(lines=3, imported=2))
+
+    assert checkpoint.load() == (42, ImportStats(lines=3, imported=2))
+    assert not (tmp_path / 'import.checkpoint.tmp').exists()
+    checkpoint.remove()
+    assert checkpoint.load() == (0, ImportStats())
+
+
+def test_checkpoint_of_another_file_is_rejected(tmp_path):
+    path = str(tmp_path / 'import.checkpoint')
+    Checkpoint(path, 'first.ndjson').save(10, ImportStats())
+
+    with pytest.raises(SystemExit):
+        Checkpoint(path, 'second.ndjson').load()
+
+
+async def test_import_chunk(db):
+    async with AsyncSessionLocal() as session:
+        session.add(Account(id=1, user_id=1, balance=1000))
+        session.add(Account(id=3, user_id=2, balance=0))
+        await session.commit()
+    importer = PaymentImporter()
+
+    imported, unknown_account = await importer.import_chunk(
+        [
+            ('tx-1', 1, 1, 100),
+            ('tx-2', 1, 1, 200),
+            ('tx-2', 1, 1, 200),
+            ('tx-3', 1, 2, 50),
+            ('tx-4', 1, 3, 70),
+        ]
+    )
+
+    assert (imported, unknown_account) == (3, 1)
+    assert await get_balances() == {1: 1300, 2: 50, 3: 0}
+
+    imported, _ = await importer.import_chunk(
+        [('tx-1', 1, 1, 100), ('tx-5', 1, 1, 5)]
+    )
+    assert imported == 1
+    assert (await get_balances())[1] == 1305
+
+
+async def test_import_payments_resumes_from_checkpoint(db, tmp_path):
+    payments = [make_payment(f'tx-{i}', amount='1.00') for i in range(5)]
+    source = write_source(
+        tmp_path / 'payments.ndjson', payments + [b'broken\n', payments[0]]
+    )
+    args = parse_args(
+        [source, '--chunk-size', '2', '--workers', '1']
+        + ['--secret-key', SECRET_KEY]
+    )
+    # Первые две строки уже загружены прерванным импортом.
+    await PaymentImporter().import_chunk([('tx-0', 1, 1, 100)])
+    Checkpoint(source + '.checkpoint', source).save(
+        len(to_line(payments[0])), ImportStats(lines=1, imported=1)
+    )
+
+    stats = await import_payments(args)
+
+    assert stats == ImportStats(
+        lines=7, malformed=1, duplicates=1, imported=5
+    )
+    assert await get_transaction_ids() == [f'tx-{i}' for i in range(5)]
+    assert await get_balances() == {1: 500}
+    assert Checkpoint(source + '.checkpoint', source).load()[1] == stats
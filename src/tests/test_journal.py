@@ -0,0 +1,216 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from app.core.journal import CHECKPOINT_FILE, RECORD_HEADER, WriteAheadJournal
+from app.services.payment import journal as journal_module
+from app.services.payment.journal import (
+    DEAD_LETTER_FILE,
+    PaymentJournal,
+    encode_payment,
+)
+from tests.conftest import count_payments, get_balance, make_payment
+
+SEGMENT_SIZE = 4096
+
+
+def make_journal(directory) -> WriteAheadJournal:
+    return WriteAheadJournal(
+        directory=str(directory),
+        segment_size=SEGMENT_SIZE,
+        flush_interval=0.001,
+    )
+
+
+def make_payment_journal(directory, **options) -> PaymentJournal:
+    return PaymentJournal(
+        journal=make_journal(directory),
+        batch_size=options.get('batch_size', 10),
+        max_attempts=options.get('max_attempts', 3),
+    )
+
+
+async def wait_applied(payment_journal: PaymentJournal, timeout=5.0):
+    """Ждет, пока все сохраненные записи журнала будут применены."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while payment_journal.journal.checkpoint < (
+        payment_journal.journal.durable_position
+    ):
+        assert loop.time() < deadline, 'журнал не применен'
+        await asyncio.sleep(0.01)
+
+
+async def read_all(journal: WriteAheadJournal):
+    records, _ = await journal.read(journal.checkpoint, 1000)
+    return [payload for payload, _ in records]
+
+
+@pytest.fixture(autouse=True)
+def no_retry_delay(monkeypatch):
+    monkeypatch.setattr(journal_module, 'APPLY_RETRY_DELAY', 0.01)
+
+
+async def test_append_read_and_rotation(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.open()
+    journal.start()
+    payloads = [f'record-{i}'.encode() * 20 for i in range(100)]
+    await asyncio.gather(*(journal.append(p) for p in payloads))
+
+    records, position = await journal.read(journal.checkpoint, 1000)
+    await journal.stop()
+
+    assert [payload for payload, _ in records] == payloads
+    assert position == journal.durable_position
+    assert len(os.listdir(tmp_path)) > 2, 'сегменты не ротировались'
+
+
+async def test_torn_tail_is_zeroed_on_recovery(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.open()
+    journal.start()
+    for payload in (b'first', b'second'):
+        await journal.append(payload)
+    segment, offset = journal.durable_position
+    await journal.stop()
+
+    # Сбой посреди записи: заголовок есть, данные дописаны не полностью.
+    segment_path = journal._segment_path(segment)
+    with open(segment_path, 'r+b') as file:
+        file.seek(offset)
+        file.write(RECORD_HEADER.pack(100, 12345) + b'torn')
+
+    recovered = make_journal(tmp_path)
+    recovered.open()
+    recovered.start()
+    assert recovered.durable_position == (segment, offset)
+    with open(segment_path, 'rb') as file:
+        file.seek(offset)
+        assert not file.read(64).strip(b'\0')
+
+    await recovered.append(b'third')
+    assert await read_all(recovered) == [b'first', b'second', b'third']
+    await recovered.stop()
+
+
+async def test_commit_moves_checkpoint_and_removes_segments(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.open()
+    journal.start()
+    for i in range(50):
+        await journal.append(b'x' * 200)
+    end = journal.durable_position
+    await journal.commit(end)
+    await journal.stop()
+
+    with open(tmp_path / CHECKPOINT_FILE) as file:
+        assert json.load(file) == {'segment': end[0], 'offset': end[1]}
+    segments = [name for name in os.listdir(tmp_path) if name.endswith('.seg')]
+    assert len(segments) == 1
+
+    reopened = make_journal(tmp_path)
+    reopened.open()
+    assert reopened.checkpoint == end
+
+
+async def test_payments_are_applied(db, tmp_path):
+    payment_journal = make_payment_journal(tmp_path)
+    payment_journal.start()
+    for i in range(5):
+        await payment_journal.append(make_payment(f'tx-{i}', amount='2.00'))
+    await wait_applied(payment_journal)
+    await payment_journal.stop()
+
+    assert await get_balance() == 1000
+    assert await count_payments() == 5
+
+
+async def test_duplicate_transaction_is_skipped(db, tmp_path):
+    payment_journal = make_payment_journal(tmp_path)
+    payment_journal.start()
+    for transaction_id in ('tx-1', 'tx-2', 'tx-1'):
+        await payment_journal.append(make_payment(transaction_id))
+    await wait_applied(payment_journal)
+    await payment_journal.stop()
+
+    assert await get_balance() == 300
+    assert await count_payments() == 2
+    assert not (tmp_path / DEAD_LETTER_FILE).exists()
+
+
+async def test_replay_after_crash_is_idempotent(db, tmp_path):
+    payment_journal = make_payment_journal(tmp_path)
+    payment_journal.start()
+    for i in range(5):
+        await payment_journal.append(make_payment(f'tx-{i}'))
+    await wait_applied(payment_journal)
+    await payment_journal.stop()
+
+    # Сбой после commit в БД, но до сохранения контрольной точки:
+    # при запуске все записи применяются повторно.
+    os.remove(tmp_path / CHECKPOINT_FILE)
+    replayed = make_payment_journal(tmp_path)
+    replayed.start()
+    assert replayed.journal.checkpoint == (1, 0)
+    await replayed.append(make_payment('tx-new'))
+    await wait_applied(replayed)
+    await replayed.stop()
+
+    assert await get_balance() == 900
+    assert await count_payments() == 6
+
+
+async def test_undecodable_record_goes_to_dead_letter(db, tmp_path):
+    payment_journal = make_payment_journal(tmp_path)
+    payment_journal.start()
+    await payment_journal.journal.append(b'{"transaction_id": "broken"}')
+    await payment_journal.journal.append(b'not json')
+    await payment_journal.append(make_payment('tx-ok'))
+    await wait_applied(payment_journal)
+    await payment_journal.stop()
+
+    assert await get_balance() == 150
+    with open(tmp_path / DEAD_LETTER_FILE, encoding='utf-8') as file:
+        dead_letters = [json.loads(line) for line in file]
+    assert [letter['payment'] for letter in dead_letters] == [
+        {'transaction_id': 'broken'},
+        'not json',
+    ]
+
+
+async def test_failing_batch_is_isolated_and_capped(
+    db, tmp_path, monkeypatch
+):
+    payment_journal = make_payment_journal(tmp_path, max_attempts=3)
+    apply_batch = payment_journal._apply_batch
+    calls = []
+
+    async def failing_apply_batch(records):
+        calls.append(len(records))
+        if any(b'poison' in payload for payload, _ in records):
+            raise ValueError('commit failed')
+        return await apply_batch(records)
+
+    monkeypatch.setattr(payment_journal, '_apply_batch', failing_apply_batch)
+    payment_journal.start()
+    for transaction_id in ('tx-1', 'poison', 'tx-2'):
+        await payment_journal.append(make_payment(transaction_id))
+    await wait_applied(payment_journal)
+    await payment_journal.stop()
+
+    assert await get_balance() == 300
+    with open(tmp_path / DEAD_LETTER_FILE, encoding='utf-8') as file:
+        dead_letters = [json.loads(line) for line in file]
+    assert [
+        letter['payment']['transaction_id'] for letter in dead_letters
+    ] == ['poison']
+    assert calls.count(1) >= 3
+
+
+def test_encoded_amount_survives_round_trip():
+    payment = make_payment('tx', amount='0.10')
+    decoded = journal_module.decode_payment(encode_payment(payment))
+    assert str(decoded['amount']) == '0.10'
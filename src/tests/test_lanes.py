@@ -0,0 +1,141 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from app.core.db import AsyncSessionLocal
+from app.services.payment.config import Account
+from app.services.payment.lanes import AccountLaneScheduler
+from tests.conftest import make_payment
+
+
+async def noop():
+    return None
+
+
+@pytest.fixture
+async def scheduler():
+    lane_scheduler = AccountLaneScheduler(lanes_count=4, queue_size=2)
+    yield lane_scheduler
+    await lane_scheduler.stop()
+
+
+async def test_payments_of_one_account_run_in_order(scheduler):
+    running = []
+    order = []
+
+    async def job(number):
+        running.append(number)
+        assert len(running) == 1, 'платежи аккаунта выполняются параллельно'
+        await asyncio.sleep(0.01)
+        order.append(number)
+        running.remove(number)
+        return number
+
+    results = await asyncio.gather(
+        *(
+            scheduler.submit(account_id=7, func=lambda n=n: job(n))
+            for n in range(2)
+        )
+    )
+
+    assert results == [0, 1]
+    assert order == [0, 1]
+    assert scheduler.stats()[scheduler.get_lane(7)]['processed'] == 2
+
+
+async def test_exception_is_raised_to_caller(scheduler):
+    async def job():
+        raise ValueError('boom')
+
+    with pytest.raises(ValueError):
+        await scheduler.submit(account_id=1, func=job)
+
+    assert await scheduler.submit(account_id=1, func=noop) is None
+
+
+async def test_full_queue_is_rejected_with_503(scheduler):
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def job():
+        started.set()
+        await release.wait()
+
+    # Один платеж выполняется, два ждут в очереди размера 2.
+    waiting = [asyncio.create_task(scheduler.submit(account_id=1, func=job))]
+    await started.wait()
+    waiting += [
+        asyncio.create_task(scheduler.submit(account_id=1, func=job))
+        for _ in range(2)
+    ]
+    await asyncio.sleep(0)
+
+    with pytest.raises(HTTPException) as error:
+        await scheduler.submit(account_id=1, func=job)
+    assert error.value.status_code == 503
+
+    release.set()
+    await asyncio.gather(*waiting)
+    assert scheduler.stats()[scheduler.get_lane(1)]['rejected'] == 1
+
+
+async def test_cancelled_caller_does_not_stop_started_job(scheduler):
+    started = asyncio.Event()
+    finished = []
+
+    async def job():
+        started.set()
+        await asyncio.sleep(0.01)
+        finished.append(True)
+
+    caller = asyncio.create_task(scheduler.submit(account_id=1, func=job))
+    await started.wait()
+    caller.cancel()
+    await asyncio.gather(caller, return_exceptions=True)
+
+    await scheduler.submit(account_id=1, func=noop)
+    assert finished == [True]
+
+
+async def test_stop_cancels_running_and_queued_payments(scheduler):
+    started = asyncio.Event()
+
+    async def job():
+        started.set()
+        await asyncio.Event().wait()
+
+    running = asyncio.create_task(scheduler.submit(account_id=1, func=job))
+    queued = asyncio.create_task(scheduler.submit(account_id=1, func=job))
+    await started.wait()
+
+    await asyncio.wait_for(scheduler.stop(), timeout=1)
+
+    for caller in (running, queued):
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(caller, timeout=1)
+
+
+async def test_payment_endpoint_through_lanes(
+    client, user_headers, payment_lanes
+):
+    responses = await asyncio.gather(
+        *(
+            client.post(
+                '/api/payment',
+                json=make_payment(f'tx-{i}'),
+                headers=user_headers,
+            )
+            for i in range(5)
+        )
+    )
+
+    assert [response.status_code for response in responses] == [200] * 5
+    async with AsyncSessionLocal() as session:
+        balance = (
+            await session.execute(
+                select(Account.balance).where(Account.id == 1)
+            )
+        ).scalar_one()
+    assert balance == 750
@@ -0,0 +1,182 @@
+import json
+
+import httpx
+import pytest
+
+from app.services.payment.utils import generate_signature
+from app.tools.loadtest import (
+    OUTCOME_COMPLETED,
+    OUTCOME_DUPLICATE,
+    OUTCOME_INVALID_SIGNATURE,
+    OUTCOME_LOCK_TIMEOUT,
+    OUTCOME_OK,
+    OUTCOME_OVERLOADED,
+    LoadTest,
+    PaymentGenerator,
+    _compare_rows,
+    classify_response,
+    parse_accounts,
+    parse_args,
+    percentile,
+)
+from tests.conftest import SECRET_KEY
+
+
+def make_args(*argv):
+    return parse_args(['--secret-key', SECRET_KEY, '--seed', '1', *argv])
+
+
+async def take(generator: PaymentGenerator, count: int):
+    payments = []
+    async for payment in generator:
+        payments.append(payment)
+        if len(payments) == count:
+            break
+    return payments
+
+
+def make_response(status_code: int, method: str = 'POST', json=None):
+    return httpx.Response(
+        status_code,
+        json=json,
+        request=httpx.Request(method, 'http://test/api/payment'),
+    )
+
+
+def test_parse_accounts():
+    assert parse_accounts('3') == [3]
+    assert parse_accounts('1-3,7') == [1, 2, 3, 7]
+
+
+@pytest.mark.parametrize(
+    'rank, expected', [(50, 5), (95, 10), (99, 10), (1, 1)]
+)
+def test_percentile(rank, expected):
+    assert percentile(list(range(1, 11)), rank) == expected
+
+
+def test_percentile_of_empty_list():
+    assert percentile([], 99) == 0.0
+
+
+@pytest.mark.parametrize(
+    'response, outcome',
+    [
+        (make_response(200), OUTCOME_COMPLETED),
+        (make_response(200, method='GET'), OUTCOME_OK),
+        (make_response(403), OUTCOME_INVALID_SIGNATURE),
+        (make_response(429), OUTCOME_OVERLOADED),
+        (make_response(503), OUTCOME_OVERLOADED),
+        (
+            make_response(
+                409, json={'detail': {'message': 'Account locked'}}
+            ),
+            OUTCOME_LOCK_TIMEOUT,
+        ),
+        (make_response(409, json={'detail': 'exists'}), OUTCOME_DUPLICATE),
+        (make_response(500), 'http_500'),
+    ],
+)
+def test_classify_response(response, outcome):
+    assert classify_response(response) == outcome
+
+
+async def test_generated_payments_are_signed():
+    args = make_args('--accounts', '1-5', '--transaction-id-start', '10')
+    payments = await take(PaymentGenerator(args), 20)
+
+    assert [p['transaction_id'] for p in payments] == [
+        str(i) for i in range(10, 30)
+    ]
+    for payment in payments:
+        assert 1 <= payment['account_id'] <= 5
+        signed = {k: v for k, v in payment.items() if k != 'signature'}
+        assert payment['signature'] == generate_signature(signed, SECRET_KEY)
+
+
+def test_consecutive_runs_start_with_different_transaction_ids():
+    first, second = make_args(), make_args()
+
+    assert second.transaction_id_start > first.transaction_id_start
+
+
+async def test_zipf_skew_prefers_first_accounts():
+    args = make_args('--accounts', '1-20', '--skew', 'zipf')
+    payments = await take(PaymentGenerator(args), 2000)
+
+    hits = [p['account_id'] for p in payments]
+    assert hits.count(1) > hits.count(20) * 5
+
+
+async def test_duplicate_ratio_repeats_sent_payments():
+    args = make_args('--duplicate-ratio', '0.5')
+    payments = await take(PaymentGenerator(args), 200)
+
+    transaction_ids = [p['transaction_id'] for p in payments]
+    duplicates = len(transaction_ids) - len(set(transaction_ids))
+    assert 50 < duplicates < 150
+
+
+async def test_replay_skips_broken_lines(tmp_path):
+    replay = tmp_path / 'payments.ndjson'
+    lines = [
+        json.dumps(
+            {
+                'transaction_id': 'a',
+                'account_id': 1,
+                'user_id': 1,
+                'amount': '2.5',
+            }
+        ),
+        'not json',
+        json.dumps({'transaction_id': 'no-amount'}),
+    ]
+    replay.write_text('\n'.join(lines), encoding='utf-8')
+
+    args = make_args('--replay', str(replay))
+    payments = await take(PaymentGenerator(args), 10)
+
+    assert [p['transaction_id'] for p in payments] == ['a']
+    assert payments[0]['amount'] == '2.50'
+
+
+def test_compare_rows_skips_new_operations():
+    baseline = {
+        'throughput': 10.0,
+        'operations': {'payment': {'p50_ms': 1, 'p95_ms': 2, 'p99_ms': 3}},
+    }
+    report = {
+        'throughput': 20.0,
+        'operations': {
+            'payment': {'p50_ms': 2, 'p95_ms': 3, 'p99_ms': 4},
+            'read': {'p50_ms': 1, 'p95_ms': 1, 'p99_ms': 1},
+        },
+    }
+    assert _compare_rows(baseline, report) == [
+        ('throughput', 10.0, 20.0),
+        ('payment.p50_ms', 1, 2),
+        ('payment.p95_ms', 2, 3),
+        ('payment.p99_ms', 3, 4),
+    ]
+
+
+async def test_load_test_against_app(client, user_headers):
+    args = make_args(
+        '--requests',
+        '30',
+        '--concurrency',
+        '4',
+        '--duplicate-ratio',
+        '0.2',
+        '--read-ratio',
+        '0.3',
+    )
+    report = await LoadTest(args, client).run()
+
+    assert report['requests'] == 30
+    payment = report['operations']['payment']
+    read = report['operations']['read']
+    assert payment['count'] + read['count'] == 30
+    assert set(payment['outcomes']) <= {OUTCOME_COMPLETED, OUTCOME_DUPLICATE}
+    assert read['outcomes'] == {OUTCOME_OK: read['count']}
+    assert payment['p50_ms'] <= payment['p99_ms'] <= payment['max_ms']
@@ -0,0 +1,262 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import event, insert, update
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.db import AsyncSessionLocal
+from app.models import User
+from app.services.payment.config import Account, Payment
+from app.services.payment.lock_retry import (
+    PAYMENT_LOCK_RETRIES,
+    LockRetryPolicy,
+    is_lock_timeout,
+    lock_retry_policy,
+)
+from app.services.payment.utils import PaymentService
+from tests.conftest import (
+    SECRET_KEY,
+    asyncpg_lock_timeout_error,
+    count_payments,
+    get_balance,
+    make_payment,
+    sqlite_locked_error,
+)
+
+
+def sqlite_error(message: str) -> DBAPIError:
+    return DBAPIError.instance(
+        'UPDATE', {}, sqlite3.OperationalError(message), sqlite3.Error
+    )
+
+
+def make_policy(**options) -> LockRetryPolicy:
+    params = {
+        'enabled': True,
+        'lock_timeout': 0.4,
+        'min_timeout': 0.05,
+        'max_timeout': 2.0,
+        'base_delay': 0.001,
+        'max_delay': 0.01,
+        'budget': 3.0,
+    }
+    params.update(options)
+    return LockRetryPolicy(**params)
+
+
+@pytest.fixture(params=[False, True], ids=['orm', 'fast_path'])
+def fast_path(request, monkeypatch):
+    monkeypatch.setattr(settings, 'payment_fast_path', request.param)
+    return request.param
+
+
+@pytest.fixture
+def locked_attempts(monkeypatch):
+    """Попытки блокировки аккаунта: первые failing из них упираются в
+    таймаут блокировки postgres."""
+    attempts = {'failing': 0, 'made': 0}
+
+    def failing(stage):
+        async def locking_stage(*args, **kwargs):
+            attempts['made'] += 1
+            if attempts['made'] <= attempts['failing']:
+                raise asyncpg_lock_timeout_error()
+            return await stage(*args, **kwargs)
+
+        return locking_stage
+
+    monkeypatch.setattr(
+        PaymentService,
+        '_lock_account',
+        staticmethod(failing(PaymentService._lock_account)),
+    )
+    monkeypatch.setattr(
+        PaymentService,
+        '_increment_balance_fast',
+        failing(PaymentService._increment_balance_fast),
+    )
+    return attempts
+
+
+async def get_balance_and_payments():
+    return await get_balance(), await count_payments()
+
+
+@pytest.mark.parametrize(
+    'error, expected',
+    [
+        (asyncpg_lock_timeout_error(), True),
+        (sqlite_locked_error(), True),
+        (sqlite_error('disk I/O error'), False),
+        (
+            IntegrityError('INSERT', {}, Exception('lock timeout')),
+            False,
+        ),
+        (ValueError('database is locked'), False),
+    ],
+)
+def test_is_lock_timeout(error, expected):
+    assert is_lock_timeout(error) is expected
+
+
+def test_disabled_policy_keeps_timeout_and_never_retries():
+    policy = make_policy(enabled=False)
+    policy.observe(10.0)
+
+    assert policy.lock_timeout == 0.4
+    assert policy.next_delay(0, 0.0) is None
+
+
+def test_timeout_follows_observed_wait_within_bounds():
+    policy = make_policy()
+    assert policy.lock_timeout == pytest.approx(0.4)
+
+    for _ in range(50):
+        policy.observe(0.0)
+    assert policy.lock_timeout == 0.05
+
+    for _ in range(50):
+        policy.observe(0.2)
+    assert policy.lock_timeout == pytest.approx(0.8, rel=0.01)
+
+    for _ in range(50):
+        policy.observe(5.0)
+    assert policy.lock_timeout == 2.0
+
+
+def test_delay_grows_and_respects_budget():
+    policy = make_policy(base_delay=0.01, max_delay=0.05, budget=1.0)
+
+    for attempt in range(10):
+        delay = policy.next_delay(attempt, elapsed=0.0)
+        assert 0 <= delay <= min(0.05, 0.01 * 2 ** attempt)
+    assert policy.next_delay(0, elapsed=0.7) is None
+
+
+async def test_failed_attempt_rolls_back_only_its_savepoint(db):
+    service = PaymentService(secret_key=SECRET_KEY, lock_retry=make_policy())
+    attempts = []
+
+    async def stage():
+        attempts.append(len(attempts))
+        await session.execute(
+            update(Account)
+            .where(Account.id == 1)
+            .values(balance=Account.balance + 100)
+        )
+        if len(attempts) < 3:
+            raise asyncpg_lock_timeout_error()
+        return len(attempts)
+
+    async with AsyncSessionLocal() as session:
+        session.add(Account(id=1, user_id=1, balance=0))
+        await session.commit()
+        session.add(Payment(account_id=1, transaction_id='tx-1'))
+        await session.flush()
+
+        assert await service._run_locking_stage(session, stage) == 3
+        await session.commit()
+
+    assert attempts == [0, 1, 2]
+    assert await get_balance_and_payments() == (100, 1)
+
+
+async def test_other_errors_are_not_retried(db):
+    service = PaymentService(secret_key=SECRET_KEY, lock_retry=make_policy())
+    calls = []
+
+    async def stage():
+        calls.append(1)
+        raise sqlite_error('disk I/O error')
+
+    async with AsyncSessionLocal() as session:
+        with pytest.raises(DBAPIError):
+            await service._run_locking_stage(session, stage)
+
+    assert calls == [1]
+
+
+async def test_locked_account_gets_409(
+    client, user_headers, fast_path, locked_attempts
+):
+    locked_attempts['failing'] = 100
+
+    response = await client.post('/api/payment', json=make_payment('tx-1'))
+
+    assert response.status_code == 409
+    detail = response.json()['detail']
+    assert detail['message'] == 'Account locked'
+    assert detail['account_id'] == 1
+    assert detail['retry_after'] == lock_retry_policy.lock_timeout
+    assert locked_attempts['made'] == 1
+    assert await get_balance_and_payments() == (0, 0)
+
+
+async def test_lock_is_retried_within_request(
+    client, user_headers, fast_path, locked_attempts, monkeypatch
+):
+    monkeypatch.setattr(lock_retry_policy, 'enabled', True)
+    monkeypatch.setattr(lock_retry_policy, 'base_delay', 0.001)
+    # Попытки меняют среднее ожидание общей политики, оно восстанавливается
+    # после теста.
+    monkeypatch.setattr(
+        lock_retry_policy, '_avg_wait', lock_retry_policy._avg_wait
+    )
+    retries = PAYMENT_LOCK_RETRIES.labels().value
+    locked_attempts['failing'] = 2
+
+    response = await client.post('/api/payment', json=make_payment('tx-1'))
+
+    assert response.status_code == 200, response.text
+    assert locked_attempts['made'] == 3
+    assert PAYMENT_LOCK_RETRIES.labels().value == retries + 2
+    assert await get_balance_and_payments() == (150, 1)
+
+
+async def test_lock_timeout_is_set_once_per_transaction(postgres_engine):
+    service = PaymentService(
+        secret_key=SECRET_KEY, lock_retry=make_policy(enabled=False)
+    )
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    async def lock_account():
+        await service._run_locking_stage(
+            session,
+            lambda: service._lock_account(session=session, account_id=1),
+        )
+
+    async with AsyncSession(postgres_engine) as session:
+        await session.execute(
+            insert(User).values(
+                id=1, email='user@test.ru', hashed_password='x'
+            )
+        )
+        await session.execute(insert(Account).values(id=1, user_id=1))
+        await session.commit()
+
+        event.listen(
+            postgres_engine.sync_engine,
+            'before_cursor_execute',
+            before_cursor_execute,
+        )
+        try:
+            await lock_account()
+            await lock_account()
+            await session.commit()
+            # Новая транзакция: таймаут задается заново.
+            await lock_account()
+            await session.commit()
+        finally:
+            event.remove(
+                postgres_engine.sync_engine,
+                'before_cursor_execute',
+                before_cursor_execute,
+            )
+
+    assert sum('lock_timeout' in statement for statement in statements) == 2
+    assert not any('SAVEPOINT' in statement for statement in statements)
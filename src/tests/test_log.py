@@ -0,0 +1,109 @@
+import asyncio
+import contextvars
+import json
+import logging
+import queue
+import sys
+
+from app.core.log import (
+    HOT_PATH_LOGGER,
+    REQUEST_ID_HEADER,
+    ContextFilter,
+    JsonFormatter,
+    LocalQueueHandler,
+    _sampled_var,
+    bind_log_context,
+    get_log_context,
+)
+
+
+def make_record(
+    name: str = HOT_PATH_LOGGER,
+    level: int = logging.INFO,
+    msg: str = 'Платеж %s',
+    args=('tx-1',),
+    exc_info=None,
+) -> logging.LogRecord:
+    return logging.LogRecord(name, level, __file__, 1, msg, args, exc_info)
+
+
+def in_context(func, *args):
+    """Вызывает func в копии контекста, не затрагивая контекст теста."""
+    return contextvars.copy_context().run(func, *args)
+
+
+def test_filter_adds_context_fields():
+    def run():
+        bind_log_context(request_id='req', account_id=5)
+        record = make_record()
+        assert ContextFilter().filter(record)
+        return record
+
+    record = in_context(run)
+    assert record.request_id == 'req'
+    assert record.account_id == 5
+    assert record.transaction_id is None
+
+
+def test_unsampled_request_drops_only_hot_path_info():
+    def run(name, level):
+        _sampled_var.set(False)
+        return ContextFilter().filter(make_record(name=name, level=level))
+
+    assert not in_context(run, f'{HOT_PATH_LOGGER}.utils', logging.INFO)
+    assert not in_context(run, HOT_PATH_LOGGER, logging.DEBUG)
+    assert in_context(run, HOT_PATH_LOGGER, logging.WARNING)
+    assert in_context(run, 'app.core.db', logging.INFO)
+
+
+async def test_context_is_isolated_between_tasks():
+    async def handle(request_id: str):
+        bind_log_context(request_id=request_id)
+        await asyncio.sleep(0)
+        return get_log_context()['request_id']
+
+    assert await asyncio.gather(handle('a'), handle('b')) == ['a', 'b']
+    assert get_log_context()['request_id'] is None
+
+
+def test_json_formatter():
+    record = make_record()
+    record.request_id = 'req'
+    record.account_id = None
+
+    payload = json.loads(JsonFormatter().format(record))
+
+    assert payload['message'] == 'Платеж tx-1'
+    assert payload['level'] == 'INFO'
+    assert payload['logger'] == HOT_PATH_LOGGER
+    assert payload['request_id'] == 'req'
+    assert 'account_id' not in payload
+
+
+def test_queue_handler_formats_message_in_caller():
+    try:
+        raise ValueError('boom')
+    except ValueError:
+        record = make_record(exc_info=sys.exc_info())
+
+    log_queue = queue.SimpleQueue()
+    LocalQueueHandler(log_queue).handle(record)
+    queued = log_queue.get_nowait()
+
+    assert queued.msg == 'Платеж tx-1'
+    assert queued.args is None
+    assert queued.exc_info is None
+    assert 'ValueError: boom' in queued.exc_text
+    payload = json.loads(JsonFormatter().format(queued))
+    assert 'ValueError: boom' in payload['exc_info']
+
+
+async def test_middleware_returns_request_id(client):
+    response = await client.get('/api/payment')
+    generated = response.headers[REQUEST_ID_HEADER]
+    assert len(generated) == 32
+
+    response = await client.get(
+        '/api/payment', headers={REQUEST_ID_HEADER: 'client-id'}
+    )
+    assert response.headers[REQUEST_ID_HEADER] == 'client-id'
@@ -0,0 +1,107 @@
+import pytest
+from fastapi import HTTPException
+
+from app.core.metrics import Counter, Gauge, Histogram, Registry, _Metric
+from app.services.payment.metrics import (
+    PAYMENT_OUTCOMES,
+    outcome_from_exception,
+)
+from tests.conftest import make_payment
+
+
+def test_counter_renders_labeled_values():
+    metric = Counter('requests_total', 'Запросы', labelnames=('path',))
+    metric.labels('/a').inc()
+    metric.labels('/a').inc(2)
+    metric.labels('/"b"').inc()
+
+    assert metric.collect() == [
+        '# HELP requests_total Запросы',
+        '# TYPE requests_total counter',
+        'requests_total{path="/a"} 3.0',
+        'requests_total{path="/\\"b\\""} 1.0',
+    ]
+
+
+def test_histogram_renders_cumulative_buckets():
+    metric = Histogram('latency', 'Время', buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        metric.observe(value)
+
+    assert metric.collect()[2:] == [
+        'latency_bucket{le="0.1"} 2',
+        'latency_bucket{le="1.0"} 3',
+        'latency_bucket{le="+Inf"} 4',
+        'latency_sum 2.65',
+        'latency_count 4',
+    ]
+
+
+def test_labels_count_is_checked():
+    metric = Counter('errors_total', 'Ошибки', labelnames=('kind',))
+
+    with pytest.raises(ValueError):
+        metric.labels('a', 'b')
+
+
+def test_gauge_skips_missing_values():
+    metric = Gauge(
+        'depth',
+        'Глубина',
+        callback=lambda: [(('0',), 3), (('1',), None)],
+        labelnames=('lane',),
+    )
+
+    assert metric.collect()[2:] == ['depth{lane="0"} 3.0']
+
+
+def test_metric_base_is_abstract():
+    with pytest.raises(TypeError):
+        _Metric('base', 'Базовая')
+
+
+def test_registry_rejects_duplicate_names():
+    registry = Registry()
+    registry.register(Counter('dup_total', 'Первая'))
+
+    with pytest.raises(ValueError):
+        registry.register(Counter('dup_total', 'Вторая'))
+
+
+@pytest.mark.parametrize(
+    'status_code, detail, outcome',
+    [
+        (403, 'Invalid signature', 'invalid_signature'),
+        (404, 'Account not found', 'account_not_found'),
+        (409, 'Transaction already processed', 'duplicate'),
+        (409, {'reason': 'locked'}, 'locked'),
+        (429, 'Too many requests', 'overloaded'),
+        (503, 'Payment queue is full', 'overloaded'),
+        (500, 'Database operation failed', 'error'),
+    ],
+)
+def test_outcome_from_exception(status_code, detail, outcome):
+    error = HTTPException(status_code, detail)
+
+    assert outcome_from_exception(error) == outcome
+
+
+async def test_payment_outcomes_are_exported(client, user_headers):
+    not_found = PAYMENT_OUTCOMES.labels('account_not_found')
+    before = not_found.value
+
+    await client.post(
+        '/api/payment', json=make_payment('tx-1'), headers=user_headers
+    )
+    response = await client.post(
+        '/api/payment',
+        json=make_payment('tx-2', account_id=1, user_id=2),
+        headers=user_headers,
+    )
+    assert response.status_code == 404
+    assert not_found.value == before + 1
+
+    response = await client.get('/metrics')
+    assert response.status_code == 200
+    assert 'payment_outcomes_total{outcome="completed"}' in response.text
+    assert 'payment_stage_seconds_bucket{stage=' in response.text
@@ -0,0 +1,70 @@
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import select
+
+from app.core.db import AsyncSessionLocal
+from app.core.money import from_minor_units, to_minor_units
+from app.services.payment.config import Account
+from app.services.payment.schemas import (
+    PaymentAccountBalanceResponse,
+    ReturnAccountSchema,
+)
+from tests.conftest import make_payment
+
+
+@pytest.mark.parametrize(
+    'amount, minor_units',
+    [
+        (Decimal('1.50'), 150),
+        ('0.1', 10),
+        (3, 300),
+        ('0.005', 1),
+        ('-0.005', -1),
+        ('123456789.99', 12345678999),
+    ],
+)
+def test_to_minor_units(amount, minor_units):
+    assert to_minor_units(amount) == minor_units
+
+
+def test_from_minor_units_keeps_two_digits():
+    assert str(from_minor_units(150)) == '1.50'
+    assert str(from_minor_units(5)) == '0.05'
+    assert to_minor_units(from_minor_units(12345)) == 12345
+
+
+@pytest.mark.parametrize(
+    'value, expected',
+    [
+        (150, Decimal('1.50')),
+        (Decimal('2.5'), Decimal('2.5')),
+        ('0.10', Decimal('0.10')),
+        (0.1, Decimal('0.1')),
+    ],
+)
+def test_money_amount_validation(value, expected):
+    response = PaymentAccountBalanceResponse(account_id=1, new_balance=value)
+    assert response.new_balance == expected
+
+
+def test_money_amount_schema_is_number():
+    schema = ReturnAccountSchema.schema()
+    assert schema['properties']['balance']['type'] == 'number'
+
+
+async def test_small_payments_add_up_exactly(client, user_headers):
+    for i in range(10):
+        response = await client.post(
+            '/api/payment', json=make_payment(f'tx-{i}', amount='0.10')
+        )
+        assert response.status_code == 200
+
+    assert response.json()['account']['new_balance'] == 1.0
+    async with AsyncSessionLocal() as session:
+        balance = (
+            await session.execute(
+                select(Account.balance).where(Account.id == 1)
+            )
+        ).scalar_one()
+    assert balance == 100
@@ -0,0 +1,202 @@
+import json
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from sqlalchemy import select, update
+
+from app.core.config import settings
+from app.core.db import AsyncSessionLocal
+from app.core.import_payments import PaymentImporter
+from app.services.payment.config import Account, Outbox
+from app.services.payment.outbox import (
+    FileOutboxSink,
+    HttpOutboxSink,
+    OutboxDispatcher,
+)
+from tests.conftest import make_payment
+
+
+@pytest.fixture
+def outbox_enabled(monkeypatch):
+    monkeypatch.setattr(settings, 'outbox_enabled', True)
+
+
+async def get_events():
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(Outbox).order_by(Outbox.id))
+        return result.scalars().all()
+
+
+async def add_events(count: int):
+    async with AsyncSessionLocal() as session:
+        for i in range(count):
+            session.add(
+                Outbox(event_type='test', payload={'number': i})
+            )
+        await session.commit()
+
+
+class FailingSink:
+    async def send(self, events):
+        raise RuntimeError('sink is down')
+
+    async def close(self):
+        pass
+
+
+@pytest.mark.parametrize('fast_path', [False, True])
+async def test_payment_writes_one_event(
+    client, user_headers, outbox_enabled, monkeypatch, fast_path
+):
+    monkeypatch.setattr(settings, 'payment_fast_path', fast_path)
+    for transaction_id in ('tx-1', 'tx-2', 'tx-1'):
+        await client.post(
+            '/api/payment',
+            json=make_payment(transaction_id),
+            headers=user_headers,
+        )
+
+    events = await get_events()
+    assert [event.event_type for event in events] == ['payment.completed'] * 2
+    assert [event.payload for event in events] == [
+        {
+            'transaction_id': 'tx-1',
+            'account_id': 1,
+            'amount': 150,
+            'new_balance': 150,
+        },
+        {
+            'transaction_id': 'tx-2',
+            'account_id': 1,
+            'amount': 150,
+            'new_balance': 300,
+        },
+    ]
+
+
+async def test_batch_writes_events_for_completed_payments(
+    client, user_headers, outbox_enabled
+):
+    forged = make_payment('tx-forged')
+    forged['amount'] = '100.00'
+    await client.post(
+        '/api/payment/batch',
+        json=[make_payment('tx-1'), forged, make_payment('tx-2')],
+        headers=user_headers,
+    )
+
+    events = await get_events()
+    assert [event.payload['transaction_id'] for event in events] == [
+        'tx-1',
+        'tx-2',
+    ]
+    assert events[-1].payload['new_balance'] == 300
+
+
+async def test_import_writes_events_with_running_balance(db):
+    async with AsyncSessionLocal() as session:
+        session.add(Account(id=1, user_id=1, balance=1000))
+        await session.commit()
+    importer = PaymentImporter(outbox=True)
+
+    imported, _ = await importer.import_chunk(
+        [('tx-1', 1, 1, 100), ('tx-2', 1, 2, 50), ('tx-3', 1, 1, 200)]
+    )
+    assert imported == 3
+    imported, _ = await importer.import_chunk([('tx-1', 1, 1, 100)])
+    assert imported == 0
+
+    events = await get_events()
+    assert [
+        (
+            event.payload['transaction_id'],
+            event.payload['account_id'],
+            event.payload['new_balance'],
+        )
+        for event in events
+    ] == [('tx-1', 1, 1100), ('tx-2', 2, 50), ('tx-3', 1, 1300)]
+
+
+async def test_import_without_outbox_writes_no_events(db):
+    await PaymentImporter().import_chunk([('tx-1', 1, 1, 100)])
+
+    assert await get_events() == []
+
+
+async def test_dispatcher_sends_batches_to_file(db, tmp_path):
+    path = tmp_path / 'events.ndjson'
+    dispatcher = OutboxDispatcher(
+        sink=FileOutboxSink(str(path)),
+        batch_size=2,
+        poll_interval=0.01,
+        retention=3600,
+    )
+    await add_events(3)
+
+    assert await dispatcher.dispatch_batch() == 2
+    assert await dispatcher.dispatch_batch() == 1
+    assert await dispatcher.dispatch_batch() == 0
+
+    with open(path, encoding='utf-8') as file:
+        sent = [json.loads(line) for line in file]
+    assert [event['payload']['number'] for event in sent] == [0, 1, 2]
+    assert len({event['id'] for event in sent}) == 3
+    events = await get_events()
+    assert all(event.sent_at is not None for event in events)
+    assert [event.attempts for event in events] == [1, 1, 1]
+
+
+async def test_failed_delivery_keeps_events_and_counts_attempt(db):
+    dispatcher = OutboxDispatcher(
+        sink=FailingSink(), batch_size=10, poll_interval=0.01, retention=3600
+    )
+    await add_events(2)
+
+    with pytest.raises(RuntimeError):
+        await dispatcher.dispatch_batch()
+
+    events = await get_events()
+    assert [event.sent_at for event in events] == [None, None]
+    assert [event.attempts for event in events] == [1, 1]
+
+
+async def test_http_sink_treats_error_status_as_failure():
+    requests = []
+
+    def handler(request):
+        requests.append(json.loads(request.content))
+        return httpx.Response(503 if len(requests) == 1 else 200)
+
+    sink = HttpOutboxSink(url='http://events.test/', timeout=1.0)
+    sink._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await sink.send([{'id': 1}])
+    await sink.send([{'id': 1}])
+    await sink.close()
+
+    assert requests == [[{'id': 1}], [{'id': 1}]]
+
+
+async def test_sent_events_are_purged_after_retention(db, tmp_path):
+    dispatcher = OutboxDispatcher(
+        sink=FileOutboxSink(str(tmp_path / 'events.ndjson')),
+        batch_size=10,
+        poll_interval=0.01,
+        retention=3600,
+    )
+    await add_events(2)
+    await dispatcher.dispatch_batch()
+    await add_events(1)
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            update(Outbox)
+            .where(Outbox.id == 1)
+            .values(sent_at=datetime.utcnow() - timedelta(hours=2))
+        )
+        await session.commit()
+
+    await dispatcher._purge_sent()
+
+    assert [event.id for event in await get_events()] == [2, 3]
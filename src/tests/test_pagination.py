@@ -0,0 +1,118 @@
+import pytest
+from fastapi import HTTPException
+
+from app.core.db import AsyncSessionLocal
+from app.core.pagination import decode_cursor, encode_cursor
+from app.services.payment.config import Account, Payment
+
+
+async def seed_payments():
+    """Пять платежей пользователя 1 и один платеж пользователя 2."""
+    async with AsyncSessionLocal() as session:
+        session.add_all(
+            [
+                Account(id=2, user_id=1, balance=0),
+                Account(id=3, user_id=2, balance=0),
+            ]
+        )
+        session.add_all(
+            Payment(
+                account_id=1 + i % 2,
+                transaction_id=f'tx-{i}',
+                payment_amount=100 * i,
+            )
+            for i in range(1, 6)
+        )
+        session.add(
+            Payment(account_id=3, transaction_id='tx-other', payment_amount=1)
+        )
+        await session.commit()
+
+
+async def read_all_pages(client, path, headers, limit):
+    items, cursor, pages = [], None, 0
+    while True:
+        params = {'limit': limit}
+        if cursor is not None:
+            params['cursor'] = cursor
+        response = await client.get(path, params=params, headers=headers)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        assert len(page['items']) <= limit
+        items += page['items']
+        pages += 1
+        cursor = page['next_cursor']
+        if cursor is None:
+            return items, pages
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(12345)) == 12345
+    assert decode_cursor(None) is None
+
+
+# 'bm90LWFuLWlk' — base64 от 'not-an-id'.
+@pytest.mark.parametrize('cursor', ['bm90LWFuLWlk', '!!!', '_w=='])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+
+    assert error.value.status_code == 400
+
+
+async def test_payments_are_paged_by_id(client, user_headers):
+    await seed_payments()
+
+    items, pages = await read_all_pages(
+        client, '/api/payment', user_headers, limit=2
+    )
+
+    assert pages == 3
+    assert [item['transaction_id'] for item in items] == [
+        f'tx-{i}' for i in range(1, 6)
+    ]
+    assert items[0] == {
+        'id': 1,
+        'transaction_id': 'tx-1',
+        'account_id': 2,
+        'payment_amount': 1.0,
+    }
+
+
+async def test_accounts_are_paged_by_id(client, user_headers):
+    await seed_payments()
+
+    items, pages = await read_all_pages(
+        client, '/api/account', user_headers, limit=1
+    )
+
+    assert [item['id'] for item in items] == [1, 2]
+    assert {item['user_id'] for item in items} == {1}
+
+
+async def test_limit_is_bounded(client, user_headers):
+    for limit in (0, 501):
+        response = await client.get(
+            '/api/payment', params={'limit': limit}, headers=user_headers
+        )
+        assert response.status_code == 422
+
+
+async def test_bad_cursor_returns_400(client, user_headers):
+    response = await client.get(
+        '/api/payment', params={'cursor': 'bm90LWFuLWlk'}, headers=user_headers
+    )
+
+    assert response.status_code == 400
+
+
+async def test_admin_user_list_is_paged(client, superuser_headers):
+    items, pages = await read_all_pages(
+        client, '/api/admin/users', superuser_headers, limit=1
+    )
+
+    assert [item['email'] for item in items] == [
+        'user@test.ru',
+        'admin@test.ru',
+    ]
+    assert pages == 2
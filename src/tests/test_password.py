@@ -0,0 +1,89 @@
+import threading
+
+import pytest
+
+from app.core.password import AsyncPasswordHelper, password_helper
+from tests.conftest import PASSWORD, USER_EMAIL
+
+
+@pytest.fixture
+def hashed_passwords(monkeypatch):
+    """Пароли, переданные в hash_async."""
+    hashed = []
+    hash_async = password_helper.hash_async
+
+    async def recording_hash_async(password: str) -> str:
+        hashed.append(password)
+        return await hash_async(password)
+
+    monkeypatch.setattr(password_helper, 'hash_async', recording_hash_async)
+    return hashed
+
+
+def test_helper_uses_configured_rounds():
+    helper = AsyncPasswordHelper(rounds=5, max_workers=1)
+    assert helper.hash('secret').startswith('$2b$05$')
+
+
+async def test_hashing_runs_in_password_pool(monkeypatch):
+    threads = []
+    hash_password = password_helper.hash
+
+    def recording_hash(password: str) -> str:
+        threads.append(threading.current_thread().name)
+        return hash_password(password)
+
+    monkeypatch.setattr(password_helper, 'hash', recording_hash)
+    hashed = await password_helper.hash_async('secret')
+
+    assert threads and threads[0].startswith('password')
+    assert threads[0] != threading.current_thread().name
+    verified, updated = await password_helper.verify_and_update_async(
+        'secret', hashed
+    )
+    assert verified
+    assert updated is None
+
+
+async def test_wrong_password_is_rejected():
+    hashed = await password_helper.hash_async('secret')
+    verified, _ = await password_helper.verify_and_update_async(
+        'other', hashed
+    )
+    assert not verified
+
+
+async def test_login_with_wrong_password(client, user_headers):
+    response = await client.post(
+        '/api/auth/jwt/login',
+        data={'username': USER_EMAIL, 'password': 'wrong-password'},
+    )
+    assert response.status_code == 400
+
+
+async def test_unknown_user_login_still_hashes(client, hashed_passwords):
+    response = await client.post(
+        '/api/auth/jwt/login',
+        data={'username': 'nobody@test.ru', 'password': PASSWORD},
+    )
+
+    assert response.status_code == 400
+    assert hashed_passwords == [PASSWORD]
+
+
+async def test_password_change_is_hashed_in_pool(
+    client, user_headers, hashed_passwords
+):
+    response = await client.patch(
+        '/api/users/me',
+        headers=user_headers,
+        json={'password': 'new-password'},
+    )
+    assert response.status_code == 200, response.text
+    assert hashed_passwords == ['new-password']
+
+    response = await client.post(
+        '/api/auth/jwt/login',
+        data={'username': USER_EMAIL, 'password': 'new-password'},
+    )
+    assert response.status_code == 200
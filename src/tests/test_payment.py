@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+from sqlalchemy import event
+
+from app.core.config import settings
+from app.core.db import engine
+from tests.conftest import count_payments, get_balance, make_payment
+
+
+@pytest.fixture(params=[False, True], ids=['orm', 'fast_path'])
+def fast_path(request, monkeypatch):
+    monkeypatch.setattr(settings, 'payment_fast_path', request.param)
+    return request.param
+
+
+async def test_payment_is_applied(client, user_headers, fast_path):
+    response = await client.post(
+        '/api/payment',
+        json=make_payment('tx-1', amount='10.25'),
+        headers=user_headers,
+    )
+
+    assert response.status_code == 200, response.text
+    assert response.json() == {
+        'status': 'completed',
+        'transaction': {'transaction_id': 'tx-1', 'amount': 10.25},
+        'account': {'account_id': 1, 'new_balance': 10.25},
+    }
+    assert await get_balance() == 1025
+
+
+async def test_new_account_is_created(client, user_headers, fast_path):
+    response = await client.post(
+        '/api/payment',
+        json=make_payment('tx-1', account_id=42),
+        headers=user_headers,
+    )
+
+    assert response.status_code == 200, response.text
+    assert await get_balance(42) == 150
+
+
+async def test_duplicate_is_rejected(client, user_headers, fast_path):
+    for expected in (200, 409):
+        response = await client.post(
+            '/api/payment', json=make_payment('tx-1'), headers=user_headers
+        )
+        assert response.status_code == expected
+
+    assert await get_balance() == 150
+    assert await count_payments() == 1
+
+
+async def test_invalid_signature_is_rejected(
+    client, user_headers, fast_path
+):
+    payment = make_payment('tx-1')
+    payment['amount'] = '100.00'
+
+    response = await client.post(
+        '/api/payment', json=payment, headers=user_headers
+    )
+
+    assert response.status_code == 403
+    assert await count_payments() == 0
+
+
+async def test_foreign_account_is_not_found(client, user_headers, fast_path):
+    response = await client.post(
+        '/api/payment',
+        json=make_payment('tx-1', account_id=1, user_id=2),
+        headers=user_headers,
+    )
+
+    assert response.status_code == 404
+    assert await count_payments() == 0
+
+
+async def test_concurrent_duplicates_apply_once(
+    client, user_headers, fast_path
+):
+    responses = await asyncio.gather(
+        *(
+            client.post(
+                '/api/payment',
+                json=make_payment('tx-1'),
+                headers=user_headers,
+            )
+            for _ in range(5)
+        )
+    )
+
+    assert sorted(response.status_code for response in responses) == [
+        200,
+        409,
+        409,
+        409,
+        409,
+    ]
+    assert await get_balance() == 150
+
+
+async def test_fast_path_writes_with_two_statements(
+    client, user_headers, monkeypatch
+):
+    monkeypatch.setattr(settings, 'payment_fast_path', True)
+    await client.post(
+        '/api/payment', json=make_payment('tx-1'), headers=user_headers
+    )
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(' '.join(statement.split()))
+
+    event.listen(
+        engine.sync_engine, 'before_cursor_execute', before_cursor_execute
+    )
+    try:
+        response = await client.post(
+            '/api/payment', json=make_payment('tx-2'), headers=user_headers
+        )
+    finally:
+        event.remove(
+            engine.sync_engine, 'before_cursor_execute', before_cursor_execute
+        )
+
+    assert response.status_code == 200
+    # Поиск аккаунта, две записи и, только на sqlite без RETURNING,
+    # чтение нового баланса; без savepoint, пока повторы блокировки
+    # выключены.
+    expected = [
+        'SELECT account.id,',
+        'INSERT INTO payment ',
+        'UPDATE account SET ',
+        'SELECT account.balance FROM account ',
+    ]
+    assert len(statements) == len(expected), statements
+    assert all(map(str.startswith, statements, expected)), statements
@@ -0,0 +1,144 @@
+from decimal import Decimal
+
+from app.core.db import AsyncSessionLocal
+from app.services.payment import endpoints
+from app.services.payment.config import Account, Payment
+from app.services.payment.crud import AccountCRUD
+from app.services.payment.utils import PaymentService
+from tests.conftest import (
+    SECRET_KEY,
+    asyncpg_lock_timeout_error,
+    get_balance,
+    make_payment,
+)
+
+
+async def test_batch_reports_status_per_payment(client, user_headers):
+    await client.post(
+        '/api/payment', json=make_payment('tx-old'), headers=user_headers
+    )
+    forged = make_payment('tx-forged')
+    forged['amount'] = '100.00'
+
+    response = await client.post(
+        '/api/payment/batch',
+        json=[
+            make_payment('tx-1', amount='2.00'),
+            forged,
+            make_payment('tx-1'),
+            make_payment('tx-old'),
+            make_payment('tx-2', amount='3.00'),
+        ],
+        headers=user_headers,
+    )
+
+    assert response.status_code == 200, response.text
+    results = response.json()['results']
+    assert [result['status'] for result in results] == [
+        'completed',
+        'invalid_signature',
+        'duplicate',
+        'duplicate',
+        'completed',
+    ]
+    assert Decimal(results[0]['new_balance']) == Decimal('3.50')
+    assert Decimal(results[4]['new_balance']) == Decimal('6.50')
+    assert await get_balance() == 650
+
+
+async def test_concurrently_processed_payment_is_duplicate(db, monkeypatch):
+    async with AsyncSessionLocal() as session:
+        session.add(Account(id=1, user_id=1, balance=0))
+        await session.commit()
+
+    service = PaymentService(secret_key=SECRET_KEY)
+    lock_accounts = service._lock_accounts
+
+    async def lock_after_concurrent_payment(session, account_ids):
+        # Параллельный запрос проводит tx-2 после проверки дубликатов.
+        async with AsyncSessionLocal() as other:
+            other.add(
+                Payment(account_id=1, transaction_id='tx-2', payment_amount=1)
+            )
+            await other.commit()
+        return await lock_accounts(session=session, account_ids=account_ids)
+
+    monkeypatch.setattr(
+        service, '_lock_accounts', lock_after_concurrent_payment
+    )
+    async with AsyncSessionLocal() as session:
+        response = await service.process_batch(
+            session=session,
+            payment_dicts=[
+                make_payment('tx-1', amount='1.00'),
+                make_payment('tx-2', amount='2.00'),
+                make_payment('tx-3', amount='3.00'),
+            ],
+            crud=AccountCRUD(Account),
+        )
+
+    assert [result.status for result in response.results] == [
+        'completed',
+        'duplicate',
+        'completed',
+    ]
+    assert response.results[2].new_balance == Decimal('4.00')
+    assert await get_balance() == 400
+
+
+async def test_lock_timeout_skips_only_contended_account(db, monkeypatch):
+    async with AsyncSessionLocal() as session:
+        session.add_all(
+            [
+                Account(id=1, user_id=1, balance=0),
+                Account(id=2, user_id=1, balance=0),
+            ]
+        )
+        await session.commit()
+
+    lock_account = PaymentService._lock_account
+
+    async def lock_or_time_out(session, account_id):
+        if account_id == 2:
+            raise asyncpg_lock_timeout_error()
+        return await lock_account(session=session, account_id=account_id)
+
+    monkeypatch.setattr(
+        PaymentService, '_lock_account', staticmethod(lock_or_time_out)
+    )
+    async with AsyncSessionLocal() as session:
+        response = await PaymentService(secret_key=SECRET_KEY).process_batch(
+            session=session,
+            payment_dicts=[
+                make_payment('tx-1', account_id=1, amount='1.00'),
+                make_payment('tx-2', account_id=2, amount='2.00'),
+                make_payment('tx-3', account_id=1, amount='3.00'),
+            ],
+            crud=AccountCRUD(Account),
+        )
+
+    assert [result.status for result in response.results] == [
+        'completed',
+        'locked',
+        'completed',
+    ]
+    assert await get_balance(1) == 400
+    assert await get_balance(2) == 0
+
+
+async def test_only_completed_payments_mark_user_write(
+    client, user_headers, monkeypatch
+):
+    marked = []
+    monkeypatch.setattr(endpoints, 'mark_user_write', marked.append)
+    forged = make_payment('tx-forged', user_id=2)
+    forged['amount'] = '100.00'
+
+    response = await client.post(
+        '/api/payment/batch',
+        json=[make_payment('tx-1'), forged],
+        headers=user_headers,
+    )
+
+    assert response.status_code == 200, response.text
+    assert marked == [1]
@@ -0,0 +1,142 @@
+import marshal
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.core.profiling import RequestProfiler, request_profiler
+from tests.conftest import make_payment
+
+
+def profiled_function():
+    return sum(range(1000))
+
+
+@pytest.fixture
+def profiler():
+    """Общий профилировщик приложения; окно закрывается после теста."""
+    yield request_profiler
+    request_profiler.stop()
+    request_profiler.reset()
+
+
+def test_disabled_profiler_skips_requests():
+    profiler = RequestProfiler(sample_rate=0)
+
+    assert not profiler.is_enabled
+    assert not profiler.should_profile()
+    assert RequestProfiler(sample_rate=1).should_profile()
+
+
+def test_window_closes_after_timeout():
+    profiler = RequestProfiler(sample_rate=0)
+    profiler.start(seconds=0.01)
+    assert profiler.is_enabled and profiler.should_profile()
+    assert 0 < profiler.window_remaining <= 0.01
+
+    time.sleep(0.02)
+
+    assert not profiler.should_profile()
+    assert not profiler.is_enabled
+    assert profiler.window_remaining == 0.0
+
+
+def test_summary_lists_requests_and_functions():
+    profiler = RequestProfiler(sample_rate=0)
+    for duration in (0.1, 0.3):
+        profiler.begin_request()
+        profiled_function()
+        profiler.end_request('/api/payment', duration)
+
+    summary = profiler.summary(top=100, sort='tottime')
+
+    assert summary['requests'] == [
+        {
+            'path': '/api/payment',
+            'count': 2,
+            'total_time': pytest.approx(0.4),
+            'max_time': 0.3,
+        }
+    ]
+    function = next(
+        func
+        for func in summary['functions']
+        if func['function'].endswith('(profiled_function)')
+    )
+    assert function['ncalls'] == 2
+
+
+def test_reset_keeps_profiling_active_requests():
+    profiler = RequestProfiler(sample_rate=0)
+    profiler.begin_request()
+    profiled_function()
+    profiler.reset()
+    profiled_function()
+    profiler.end_request('/api/payment', 0.1)
+
+    functions = profiler.summary(top=100, sort='ncalls')['functions']
+    [function] = [
+        func
+        for func in functions
+        if func['function'].endswith('(profiled_function)')
+    ]
+    assert function['ncalls'] == 1
+
+
+def test_empty_dump():
+    assert marshal.loads(RequestProfiler(sample_rate=0).dump()) == {}
+
+
+async def test_profiling_window_via_admin_api(
+    client, user_headers, superuser_headers, profiler
+):
+    response = await client.post(
+        '/api/admin/profile',
+        headers=superuser_headers,
+        json={'seconds': settings.profiling_max_seconds * 10},
+    )
+    assert response.status_code == 200
+    assert 0 < response.json()['window_remaining'] <= (
+        settings.profiling_max_seconds
+    )
+
+    await client.post('/api/payment', json=make_payment('tx-1'))
+    response = await client.get(
+        '/api/admin/profile',
+        headers=superuser_headers,
+        params={'top': 5, 'sort': 'cumulative'},
+    )
+    summary = response.json()
+    assert '/api/payment' in [item['path'] for item in summary['requests']]
+    assert len(summary['functions']) == 5
+
+    response = await client.get(
+        '/api/admin/profile/dump', headers=superuser_headers
+    )
+    assert response.headers['content-type'] == 'application/octet-stream'
+    assert marshal.loads(response.content)
+
+    response = await client.delete(
+        '/api/admin/profile', headers=superuser_headers
+    )
+    assert response.status_code == 204
+    assert not profiler.is_enabled
+    # Сам запрос DELETE начался в окне и учитывается уже после сброса.
+    summary = profiler.summary(top=5, sort='cumulative')
+    assert [item['path'] for item in summary['requests']] == [
+        '/api/admin/profile'
+    ]
+
+
+async def test_profile_requires_superuser(client, user_headers):
+    response = await client.get('/api/admin/profile', headers=user_headers)
+    assert response.status_code == 403
+
+
+async def test_unknown_sort_key_is_rejected(client, superuser_headers):
+    response = await client.get(
+        '/api/admin/profile',
+        headers=superuser_headers,
+        params={'sort': 'name'},
+    )
+    assert response.status_code == 422
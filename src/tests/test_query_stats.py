@@ -0,0 +1,126 @@
+import httpx
+import pytest
+from fastapi import Depends, FastAPI
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.db import AsyncSessionLocal, install_query_stats
+from app.core.query_stats import (
+    QUERY_COUNT_HEADER,
+    QueryBudgetExceeded,
+    QueryStats,
+    QueryStatsMiddleware,
+    parameters_shape,
+    _query_stats_var,
+    query_budget,
+)
+from tests.conftest import make_payment
+
+
+def make_app(strict_budget: bool) -> FastAPI:
+    """Приложение с эндпоинтом, выполняющим больше запросов, чем бюджет."""
+    app = FastAPI()
+
+    @app.get('/over-budget', dependencies=(Depends(query_budget(1)),))
+    async def over_budget():
+        async with AsyncSessionLocal() as session:
+            for _ in range(2):
+                await session.execute(text('SELECT 1'))
+        return {}
+
+    app.add_middleware(
+        QueryStatsMiddleware,
+        add_headers=True,
+        n_plus_one_threshold=5,
+        strict_budget=strict_budget,
+    )
+    return app
+
+
+def make_client(app: FastAPI) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url='http://test'
+    )
+
+
+@pytest.mark.parametrize(
+    'path',
+    ['/api/payment', '/api/account'],
+)
+async def test_user_lists_fit_query_budget(client, user_headers, path):
+    for i in range(3):
+        response = await client.post(
+            '/api/payment', json=make_payment(f'tx-{i}'), headers=user_headers
+        )
+        assert response.status_code == 200, response.text
+
+    response = await client.get(path, headers=user_headers)
+
+    assert response.status_code == 200, response.text
+    assert response.json()['items']
+    assert int(response.headers[QUERY_COUNT_HEADER]) <= 3
+
+
+@pytest.mark.parametrize(
+    'path',
+    ['/api/admin/users', '/api/admin/users/1/accounts'],
+)
+async def test_admin_lists_fit_query_budget(client, superuser_headers, path):
+    response = await client.get(path, headers=superuser_headers)
+
+    assert response.status_code == 200, response.text
+    assert int(response.headers[QUERY_COUNT_HEADER]) <= 3
+
+
+async def test_over_budget_raises_in_strict_mode(db):
+    async with make_client(make_app(strict_budget=True)) as client:
+        with pytest.raises(QueryBudgetExceeded):
+            await client.get('/over-budget')
+
+
+async def test_over_budget_is_only_counted_by_default(db):
+    async with make_client(make_app(strict_budget=False)) as client:
+        response = await client.get('/over-budget')
+
+    assert response.status_code == 200
+    assert response.headers[QUERY_COUNT_HEADER] == '2'
+
+
+async def test_failed_statements_leave_no_timing_state():
+    engine = create_async_engine('sqlite+aiosqlite://')
+    install_query_stats(engine)
+    stats = QueryStats(strict_budget=True)
+    stats.budget = 2
+    token = _query_stats_var.set(stats)
+    try:
+        async with engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                await conn.execute(text('SELECT * FROM missing'))
+            await conn.execute(text('SELECT 1'))
+            with pytest.raises(QueryBudgetExceeded):
+                await conn.execute(text('SELECT 2'))
+            info = conn.sync_connection.info
+    finally:
+        _query_stats_var.reset(token)
+        await engine.dispose()
+
+    assert not info.get('query_started')
+    assert stats.count == 3
+    assert stats.statements == {'SELECT 1': 1}
+
+
+def test_repeated_statements_reported_from_threshold():
+    stats = QueryStats()
+    for statement in ['SELECT a'] * 5 + ['SELECT b'] * 4:
+        stats.before_query()
+        stats.after_query(statement, 0.001)
+
+    assert stats.count == 9
+    assert stats.repeated_statements(5) == [('SELECT a', 5)]
+
+
+def test_parameters_shape_hides_values():
+    assert parameters_shape({'id': 1, 'name': 'x'}) == '{id: int, name: str}'
+    assert parameters_shape((1, 'secret')) == '(int, str)'
+    assert parameters_shape([(1,), (2,)], executemany=True) == '2 x (int)'
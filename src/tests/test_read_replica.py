@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core import db as db_module
+from app.core.base import Base
+from app.core.db import (
+    AsyncSessionLocal,
+    RecentWriters,
+    get_read_session_factory,
+    mark_user_write,
+)
+from tests.conftest import make_payment
+
+READ_YOUR_WRITES_WINDOW = 0.2
+
+
+@pytest.fixture
+async def replica(tmp_path, monkeypatch):
+    """Пустая БД-реплика: чтение с нее не видит записей основной БД."""
+    replica_engine = create_async_engine(
+        'sqlite+aiosqlite:///' + str(tmp_path / 'replica.db')
+    )
+    async with replica_engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    replica_session = sessionmaker(
+        replica_engine, class_=AsyncSession, expire_on_commit=False
+    )
+    monkeypatch.setattr(db_module, 'ReadSessionLocal', replica_session)
+    yield replica_session
+    await replica_engine.dispose()
+
+
+@pytest.fixture
+def recent_writers(monkeypatch):
+    writers = RecentWriters(window=READ_YOUR_WRITES_WINDOW, max_size=10)
+    monkeypatch.setattr(db_module, 'recent_writers', writers)
+    return writers
+
+
+def test_recent_writers_are_bounded():
+    writers = RecentWriters(window=60, max_size=2)
+    for user_id in (1, 2, 3):
+        writers.mark(user_id)
+
+    assert 1 not in writers
+    assert 2 in writers and 3 in writers
+
+
+def test_reads_go_to_replica_without_recent_writers(replica):
+    assert get_read_session_factory(1) is replica
+    mark_user_write(1)
+    assert get_read_session_factory(1) is replica
+
+
+def test_recent_writer_reads_from_primary(replica, recent_writers):
+    mark_user_write(1)
+
+    assert get_read_session_factory(1) is AsyncSessionLocal
+    assert get_read_session_factory(2) is replica
+    assert get_read_session_factory() is replica
+
+
+async def test_user_reads_own_payment_until_window_ends(
+    client, user_headers, replica, recent_writers
+):
+    response = await client.post('/api/payment', json=make_payment('tx-1'))
+    assert response.status_code == 200
+
+    response = await client.get('/api/payment', headers=user_headers)
+    assert [item['transaction_id'] for item in response.json()['items']] == [
+        'tx-1'
+    ]
+
+    await asyncio.sleep(READ_YOUR_WRITES_WINDOW)
+    response = await client.get('/api/payment', headers=user_headers)
+    assert response.json()['items'] == []
+
+
+async def test_admin_lists_read_from_replica(
+    client, superuser_headers, replica, recent_writers
+):
+    response = await client.get('/api/admin/users', headers=superuser_headers)
+
+    assert response.status_code == 200
+    assert response.json()['items'] == []
@@ -0,0 +1,82 @@
+import pytest
+from fastapi.utils import create_response_field
+from pydantic import BaseModel
+from sqlalchemy import create_engine
+
+from app.core.base import Base
+from app.core.config import settings
+from app.core.serialization import encode_rows, get_row_encoder
+from app.schemas.pagination import CursorPage
+from app.tools.serialization_bench import (
+    fill_database,
+    load_pages,
+    render_fast,
+    render_with_response_model,
+)
+from tests.conftest import make_payment
+
+
+@pytest.fixture(scope='module')
+def pages():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    fill_database(engine, rows=50)
+    return load_pages(engine)
+
+
+@pytest.mark.parametrize('name', ['account', 'payment'])
+async def test_fast_path_matches_response_model(pages, name):
+    page, schema = pages[name]
+    field = create_response_field(
+        name=f'Response_{name}', type_=CursorPage[schema]
+    )
+
+    assert await render_fast(page, schema) == (
+        await render_with_response_model(page, field)
+    )
+
+
+def test_none_values_are_kept():
+    class Schema(BaseModel):
+        id: int
+        comment: str = None
+
+    class Row:
+        id = 1
+        comment = None
+
+    assert encode_rows([Row()], Schema) == [{'id': 1, 'comment': None}]
+
+
+def test_unsupported_field_type_is_rejected():
+    class Schema(BaseModel):
+        data: dict
+
+    with pytest.raises(TypeError):
+        get_row_encoder(Schema)
+
+
+@pytest.mark.parametrize(
+    'path',
+    [
+        '/api/payment',
+        '/api/account',
+        '/api/admin/users',
+        '/api/admin/users/1/accounts',
+    ],
+)
+async def test_endpoints_return_same_body(
+    client, superuser_headers, user_headers, monkeypatch, path
+):
+    for i in range(3):
+        await client.post('/api/payment', json=make_payment(f'tx-{i}'))
+    headers = superuser_headers if '/admin/' in path else user_headers
+
+    monkeypatch.setattr(settings, 'fast_list_serialization', False)
+    expected = await client.get(path, headers=headers)
+    monkeypatch.setattr(settings, 'fast_list_serialization', True)
+    actual = await client.get(path, headers=headers)
+
+    assert expected.status_code == actual.status_code == 200
+    assert actual.json()['items']
+    assert actual.content == expected.content
@@ -0,0 +1,82 @@
+import pytest
+
+from app.core import user as user_module
+from app.core.query_stats import QUERY_COUNT_HEADER
+from app.core.user import UserCache
+from app.models import User
+
+
+@pytest.fixture
+def user_cache(monkeypatch):
+    cache = UserCache(max_size=10, ttl=60)
+    monkeypatch.setattr(user_module, 'user_cache', cache)
+    return cache
+
+
+def make_user(user_id: int = 1, email: str = 'user@test.ru') -> User:
+    return User(
+        id=user_id,
+        email=email,
+        hashed_password='x',
+        is_active=True,
+        is_superuser=False,
+        is_verified=False,
+    )
+
+
+async def get_me(client, headers):
+    return await client.get('/api/users/me', headers=headers)
+
+
+def test_cache_returns_separate_copies():
+    cache = UserCache(max_size=10, ttl=60)
+    cache.set(make_user(), cache.version)
+
+    first, second = cache.get(1), cache.get(1)
+
+    assert first is not second
+    assert first.email == second.email == 'user@test.ru'
+    assert cache.get(2) is None
+
+
+def test_stale_read_is_not_cached():
+    cache = UserCache(max_size=10, ttl=60)
+    version = cache.version
+    cache.invalidate(1)
+
+    cache.set(make_user(), version)
+
+    assert cache.get(1) is None
+
+
+async def test_cached_user_skips_query(client, user_headers, user_cache):
+    response = await get_me(client, user_headers)
+    assert response.status_code == 200
+    assert int(response.headers[QUERY_COUNT_HEADER]) == 1
+
+    response = await get_me(client, user_headers)
+    assert response.status_code == 200
+    assert response.json()['email'] == 'user@test.ru'
+    assert response.headers[QUERY_COUNT_HEADER] == '0'
+
+
+async def test_update_invalidates_cached_user(
+    client, user_headers, superuser_headers, user_cache
+):
+    user_id = (await get_me(client, user_headers)).json()['id']
+    assert user_cache.get(user_id) is not None
+
+    response = await client.patch(
+        f'/api/users/{user_id}',
+        headers=superuser_headers,
+        json={'is_active': False},
+    )
+    assert response.status_code == 200, response.text
+
+    assert user_cache.get(user_id) is None
+    assert (await get_me(client, user_headers)).status_code == 401
+
+
+async def test_invalid_token_is_rejected(client, user_cache):
+    response = await get_me(client, {'Authorization': 'Bearer x'})
+    assert response.status_code == 401